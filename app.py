@@ -5,20 +5,29 @@ import json
 import argparse
 import asyncio
 import time
+import shutil
 import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 from modules.prompt import PromptGenerator
 from modules.image import ImageGenerator
+from modules.comfy import get_backend_urls
 from modules.audio_my import MoyinAudioGenerator
 from modules.audio import AudioGenerator
 from modules.audio_ali import AudioGenerator_ali
+from modules.tts_router import TtsRouter
 from modules.video import VideoGenerator
-from modules.srt import SrtGenerator
+from modules.caption import CaptionCompositor
+from modules.srt import SrtGenerator, SubtitleTrackBuilder
 # from modules.draft import DraftGenerator
 from modules.config import ConfigManager
+from modules.artifacts import Artifact, ArtifactBus
+from modules.combine import IncrementalCombiner
+from modules.ffmpeg_pool import FFmpegError
+from modules.manifest import WordManifest, atomic_write_json, file_signature, hash_inputs
+from modules.cache import CachedAudioGenerator, FileCache, PromptCache
+from modules.pipeline import ProviderLimiter, Stage, StagePipeline, run_blocking
 from modules.logger import get_logger, COLORS
-import subprocess
 
 # 初始化日志记录器
 logger = get_logger("app")
@@ -48,182 +57,694 @@ def print_banner():
     """
     logger.info(banner)
 
-async def process_single_word(word, args, config_manager, task_id, total_steps=5):
-    """处理单个单词的视频生成流程"""
-    results = {
-        'task_id': task_id,
-        'word': word
-    }
-    start_time = time.time()
+STAGE_NAMES = ['prompt', 'image', 'audio', 'subtitle', 'video']
+
+# 所有单词共享的提供方并发限制器
+_provider_limiter = None
+
+# 所有单词共享的图像生成器，统一控制ComfyUI队列深度
+_image_generator = None
+
+def get_image_generator(args):
+    """获取全局的图像生成器"""
+    global _image_generator
+    if _image_generator is None:
+        _image_generator = ImageGenerator(cache=get_image_cache(args))
+    return _image_generator
+
+# 所有单词共享的语音缓存
+_audio_cache = None
+
+def get_audio_cache(args):
+    """获取语音缓存，未启用时返回None"""
+    global _audio_cache
+    cache_config = ConfigManager().get_cache_config()
+    if args.no_cache or not cache_config.get('enabled', True):
+        return None
+    if _audio_cache is None:
+        _audio_cache = FileCache(
+            Path(cache_config['dir']) / 'audio',
+            max_bytes=int(cache_config['audio_max_mb']) * 1024 * 1024,
+            name="语音"
+        )
+    return _audio_cache
+
+# 所有单词共享的图像缓存
+_image_cache = None
+
+def get_image_cache(args):
+    """获取图像缓存，未启用时返回None"""
+    global _image_cache
+    cache_config = ConfigManager().get_cache_config()
+    if args.no_cache or not cache_config.get('enabled', True):
+        return None
+    if _image_cache is None:
+        _image_cache = FileCache(
+            Path(cache_config['dir']) / 'images',
+            max_bytes=int(cache_config['image_max_mb']) * 1024 * 1024,
+            name="图像"
+        )
+    return _image_cache
+
+# 所有单词共享的提示词缓存
+_prompt_cache = None
+
+def get_prompt_cache(args):
+    """获取提示词缓存，未启用时返回None"""
+    global _prompt_cache
+    cache_config = ConfigManager().get_cache_config()
+    if args.no_cache or not cache_config.get('enabled', True):
+        return None
+    if _prompt_cache is None:
+        ttl_hours = cache_config.get('prompt_ttl_hours')
+        _prompt_cache = PromptCache(
+            Path(cache_config['dir']) / 'prompts.db',
+            ttl_seconds=float(ttl_hours) * 3600 if ttl_hours else None
+        )
+        _prompt_cache.purge_expired()
+    return _prompt_cache
+
+# 所有单词共享的提示词生成器，模板只读取一次
+_prompt_generator = None
+
+def get_prompt_generator(args):
+    """获取全局的提示词生成器"""
+    global _prompt_generator
+    if _prompt_generator is None:
+        _prompt_generator = PromptGenerator(cache=get_prompt_cache(args))
+    return _prompt_generator
+
+def log_cache_stats():
+    """输出本次运行的缓存统计"""
+    if _prompt_cache is not None:
+        logger.info(f"提示词缓存: 命中 {_prompt_cache.hits} 次, 未命中 {_prompt_cache.misses} 次")
+    if _audio_cache is not None:
+        stats = _audio_cache.stats()
+        logger.info(f"语音缓存: 命中 {stats['hits']} 次, 未命中 {stats['misses']} 次, "
+                    f"命中率 {stats['hit_rate']:.0%}, 共 {stats['entries']} 条 / {stats['bytes'] / 1024 / 1024:.1f}MB")
+    if _image_cache is not None:
+        stats = _image_cache.stats()
+        saved = _image_generator.gpu_seconds_saved if _image_generator is not None else 0.0
+        logger.info(f"图像缓存: 命中 {stats['hits']} 次, 未命中 {stats['misses']} 次, "
+                    f"节省GPU时间 {saved:.1f}秒, 共 {stats['entries']} 条 / {stats['bytes'] / 1024 / 1024:.1f}MB")
+
+def log_backend_stats():
+    """输出各ComfyUI后端的调度统计"""
+    if _image_generator is None or len(_image_generator.backend_pool) < 2:
+        return
+    for stats in _image_generator.backend_pool.stats():
+        latency = f"{stats['latency']:.1f}秒" if stats['latency'] is not None else "-"
+        state = "可用" if stats['available'] else "已摘除"
+        logger.info(f"ComfyUI后端 {stats['url']}: 完成 {stats['completed']} 个, 平均耗时 {latency}, {state}")
+
+def with_audio_cache(generator, provider, args):
+    """按配置为语音生成器加上缓存"""
+    cache = get_audio_cache(args)
+    if cache is None:
+        return generator
+    return CachedAudioGenerator(generator, provider, cache)
+
+# 语音服务名称到生成器类的映射
+TTS_PROVIDERS = {
+    'tencent': AudioGenerator,
+    'ali': AudioGenerator_ali,
+    'moyin': MoyinAudioGenerator,
+}
+
+_tts_router = None
+
+def get_tts_router(args):
+    """获取全局的语音服务路由，--tts 指定的服务（可用逗号分隔多个）优先于配置"""
+    global _tts_router
+    if _tts_router is None:
+        tts_config = ConfigManager().get_tts_config()
+        preferences = {language: list(names) for language, names in tts_config['providers'].items()}
+        if args.tts:
+            names = [name.strip() for name in args.tts.split(',') if name.strip()]
+            unknown = [name for name in names if name not in TTS_PROVIDERS]
+            if unknown:
+                raise ValueError(f"未知的语音服务: {', '.join(unknown)}，可选值: {', '.join(TTS_PROVIDERS)}")
+            preferences = {language: names for language in preferences}
+        # 只创建用得到的服务
+        used = {name for names in preferences.values() for name in names}
+        providers = {name: with_audio_cache(TTS_PROVIDERS[name](), name, args)
+                     for name in TTS_PROVIDERS if name in used}
+        _tts_router = TtsRouter(
+            providers, preferences,
+            hedge_delay=tts_config.get('hedge_delay'),
+            limiter=get_provider_limiter(),
+            window=int(tts_config.get('latency_window', 100)),
+            default_latency=float(tts_config.get('default_latency', 1.0)),
+            max_error_rate=float(tts_config.get('max_error_rate', 0.5))
+        )
+    return _tts_router
+
+def log_tts_stats():
+    """输出各语音服务的耗时和对冲统计"""
+    if _tts_router is None:
+        return
+    for stats in _tts_router.summary():
+        if not stats['completed'] and not stats['failed']:
+            continue
+        p95 = f"{stats['p95']:.2f}秒" if stats['p95'] is not None else "-"
+        logger.info(f"语音服务 {stats['name']}: 成功 {stats['completed']} 次, 失败 {stats['failed']} 次, p95耗时 {p95}")
+    if _tts_router.hedges:
+        logger.info(f"语音对冲请求 {_tts_router.hedges} 次, 非首选服务胜出 {_tts_router.secondary_wins} 次")
+
+def get_provider_limiter():
+    """获取全局的提供方并发限制器"""
+    global _provider_limiter
+    if _provider_limiter is None:
+        pipeline_config = ConfigManager().get_pipeline_config()
+        _provider_limiter = ProviderLimiter(pipeline_config.get('provider_concurrency') or {})
+    return _provider_limiter
+
+_caption_compositor = None
+
+def get_caption_compositor():
+    """获取共享的字幕绘制器，字体和排版缓存在所有单词之间复用"""
+    global _caption_compositor
+    if _caption_compositor is None:
+        _caption_compositor = CaptionCompositor(height=VideoGenerator.VIDEO_HEIGHT)
+    return _caption_compositor
+
+def captions_enabled(args):
+    """是否把文字绘制到静态图上"""
+    return bool(getattr(args, 'captions', False) or ConfigManager().get_caption_config().get('enabled'))
+
+def create_word_job(word, config_manager, task_id):
+    """创建单个单词的处理上下文"""
     output_base_dir = config_manager.get_output_base_dir() / str(task_id) / word
     output_base_dir.mkdir(parents=True, exist_ok=True)
     logger.info(f"输出目录: {output_base_dir}")
+    return {
+        'word': word,
+        'output_dir': output_base_dir,
+        'manifest': WordManifest(output_base_dir / "result.json"),
+        'artifacts': ArtifactBus(),
+        'start_time': time.time(),
+        'results': {
+            'task_id': task_id,
+            'word': word
+        }
+    }
+
+def apply_prompt_result(job, word_prompt):
+    """将提示词结果写入单词上下文并保存result.json"""
+    results = job['results']
+    log_success(f"生成提示词: {word_prompt}")
+    word_prompt = json.loads(word_prompt)
+
+    results['word'] = word_prompt['word']
+    results['word_zh'] = word_prompt['word_zh']
+    results['word_prompt'] = word_prompt['word_prompt']
+    results['phrase'] = word_prompt['phrase']
+    results['phrase_zh'] = word_prompt['phrase_zh']
+    results['phrase_prompt'] = word_prompt['phrase_prompt']
+
+    # 保存结果到JSON文件
+    job['manifest'].save(results)
+    log_success(f"结果已保存到: {job['manifest'].path}")
+    return job
+
+def skip_prompt(job, args):
+    """跳过提示词生成时使用自定义提示词"""
+    log_warning(f"跳过单词 '{job['word']}' 的提示词生成")
+    job['results']['word_prompt'] = args.custom_prompt or job['word']
+    job['results']['phrase_prompt'] = args.custom_prompt or job['word']
+    return job
+
+async def run_prompt_stage(job, args, total_steps=5):
+    """1. 生成提示词"""
+    word = job['word']
+
+    if not args.skip_prompt:
+        log_step(1, total_steps, f"为单词 '{word}' 生成图像提示词...")
+        prompt_gen = get_prompt_generator(args)
+        word_prompt = await prompt_gen.generate(word, refresh=args.refresh_prompts)
+        return apply_prompt_result(job, word_prompt)
+    return skip_prompt(job, args)
+
+async def run_prompt_batch_stage(batch, args, total_steps=5):
+    """1. 批量生成提示词，一次请求覆盖多个单词"""
+    if args.skip_prompt:
+        return [skip_prompt(job, args) for job in batch]
+
+    words = [job['word'] for job in batch]
+    log_step(1, total_steps, f"为 {len(words)} 个单词批量生成图像提示词: {', '.join(words)}")
+    prompt_gen = get_prompt_generator(args)
+    word_prompts = await prompt_gen.generate_batch(words, refresh=args.refresh_prompts)
+
+    outputs = []
+    for job in batch:
+        try:
+            if job['word'] not in word_prompts:
+                raise Exception("未能生成提示词")
+            outputs.append(apply_prompt_result(job, word_prompts[job['word']]))
+        except Exception as e:
+            log_error(f"处理单词 '{job['word']}' 过程中出错: {str(e)}")
+            outputs.append(None)
+    return outputs
+
+async def run_image_stage(job, args, total_steps=5):
+    """2. 生成图片"""
+    word = job['word']
+    results = job['results']
+    output_base_dir = job['output_dir']
+
+    if not args.skip_image:
+        log_step(2, total_steps, f"为单词 '{word}' 生成图像...")
+        image_gen = get_image_generator(args)
+        # 单词和短语图像互不依赖，一起进入提交队列，由队列深度控制提交节奏
+        word_image_path, phrase_image_path = await image_gen.generate_many([
+            (results['word_prompt'], output_base_dir / "word_image.png"),
+            (results['phrase_prompt'], output_base_dir / "phrase_image.png")
+        ])
+        log_success(f"单词图像已保存: {word_image_path}")
+        results['word_image_path'] = word_image_path
+        log_success(f"句子图像已保存: {phrase_image_path}")
+        results['phrase_image_path'] = phrase_image_path
+    elif args.image_path:
+        log_warning(f"为单词 '{word}' 使用已有图像: {args.image_path}")
+        results['image_path'] = args.image_path
+    else:
+        log_error("需要图像路径，请提供--image-path或不使用--skip-image")
+        return None
+    return job
+
+# 单词的四段语音：(名称, 文本字段, 类型, 语言)
+AUDIO_CLIPS = (
+    ('word_audio', 'word', 'word', 'en'),
+    ('word_zh_audio', 'word_zh', 'word', 'zh'),
+    ('phrase_audio', 'phrase', 'phrase', 'en'),
+    ('phrase_zh_audio', 'phrase_zh', 'phrase', 'zh'),
+)
+AUDIO_LABELS = {
+    'word_audio': "单词语音",
+    'word_zh_audio': "单词中文语音",
+    'phrase_audio': "短语语音",
+    'phrase_zh_audio': "短语中文语音",
+}
+
+def keep_intermediates(args):
+    """是否把语音等中间结果写入单词目录；剪映草稿需要引用音频文件"""
+    return bool(getattr(args, 'keep_intermediates', False) or getattr(args, 'draft', False))
+
+def audio_input(job, name):
+    """阶段使用的音频：优先取内存中的数据，否则取结果中的文件路径"""
+    artifact = job['artifacts'].get(name)
+    if artifact is not None:
+        return artifact
+    path = job['results'].get(f"{name}_path")
+    return str(path) if path else None
+
+async def run_audio_stage(job, args, total_steps=5):
+    """3. 生成语音"""
+    word = job['word']
+    results = job['results']
+    output_base_dir = job['output_dir']
+
+    if not args.skip_audio:
+        log_step(3, total_steps, f"为单词 '{word}' 生成语音...")
+        router = get_tts_router(args)
+        keep = keep_intermediates(args)
+        # 不保留中间文件时，语音写入本地临时目录，读入内存后即删除
+        audio_dir = output_base_dir if keep else Path(tempfile.mkdtemp(prefix='pictale-audio-'))
+        try:
+            # 四段语音互不依赖，并发合成；由路由按语言选择服务
+            paths = await asyncio.gather(*(
+                router.generate(results[text_key], type, language, output_path=audio_dir / f"{name}.wav")
+                for name, text_key, type, language in AUDIO_CLIPS
+            ))
+            for (name, text_key, type, language), path in zip(AUDIO_CLIPS, paths):
+                artifact = Artifact.from_file(path, name, meta={'text': results[text_key], 'language': language},
+                                              remove=not keep)
+                job['artifacts'].put(name, artifact)
+                if keep:
+                    log_success(f"{AUDIO_LABELS[name]}已保存: {path}")
+                    results[f"{name}_path"] = path
+                else:
+                    logger.debug(f"{AUDIO_LABELS[name]}已生成: {len(artifact)} 字节")
+        finally:
+            if not keep:
+                shutil.rmtree(audio_dir, ignore_errors=True)
+    elif args.audio_path:
+        log_warning(f"为单词 '{word}' 使用已有音频: {args.audio_path}")
+        results['audio_path'] = args.audio_path
+    else:
+        log_error("需要音频路径，请提供--audio-path或不使用--skip-audio")
+        return None
+    return job
+
+async def run_subtitle_stage(job, args, total_steps=5):
+    """4. 生成SRT字幕文件"""
+    word = job['word']
+    results = job['results']
+    output_base_dir = job['output_dir']
+
+    if not args.skip_subtitle and segment_encode_enabled():
+        # 分段编码时按两段的时间轴直接生成整段视频的字幕，不再为每段单独生成
+        logger.info(f"单词 '{word}' 的字幕在视频编码时随 video.mp4 一起生成")
+    elif not args.skip_subtitle:
+        log_step(4, total_steps, f"为单词 '{word}' 生成SRT字幕...")
+        srt_gen = SrtGenerator()
+        # 使用与视频生成相同的参数值
+        lead_silence = args.lead_silence if hasattr(args, 'lead_silence') else 1.0
+        audio_gap = args.audio_gap if hasattr(args, 'audio_gap') else 1.0
+
+        # 为单词部分生成字幕
+        word_srt_paths = await run_blocking(
+            srt_gen.generate,
+            audio_path=audio_input(job, 'word_audio'),
+            audio_zh_path=audio_input(job, 'word_zh_audio'),
+            text=results['word'],
+            text_zh=results['word_zh'],
+            lead_silence=lead_silence,
+            audio_gap=audio_gap,
+            output_path=output_base_dir / f"{word}.srt"
+        )
+        log_success(f"单词SRT字幕已保存: {', '.join(path for path in word_srt_paths.values() if path)}")
+        results['word_srt_en_path'] = word_srt_paths['en']
+        results['word_srt_zh_path'] = word_srt_paths['zh']
+
+        # 为短语部分生成字幕
+        phrase_srt_paths = await run_blocking(
+            srt_gen.generate,
+            audio_path=audio_input(job, 'phrase_audio'),
+            audio_zh_path=audio_input(job, 'phrase_zh_audio'),
+            text=results['phrase'],
+            text_zh=results['phrase_zh'],
+            lead_silence=lead_silence,
+            audio_gap=audio_gap,
+            output_path=output_base_dir / f"{word}_phrase.srt"
+        )
+        log_success(f"短语SRT字幕已保存: {', '.join(path for path in phrase_srt_paths.values() if path)}")
+        results['phrase_srt_en_path'] = phrase_srt_paths['en']
+        results['phrase_srt_zh_path'] = phrase_srt_paths['zh']
+    else:
+        log_warning(f"跳过单词 '{word}' 的字幕生成")
+    return job
+
+# 字幕语言对应的ISO 639-2代码，写入mov_text字幕流的language元数据
+SUBTITLE_LANGUAGES = (('en', 'eng'), ('zh', 'chi'))
+
+def subtitle_tracks(results, kind):
+    """字幕阶段生成的SRT文件，随视频编码一起封装"""
+    return [(results[f"{kind}_srt_{language}_path"], code) for language, code in SUBTITLE_LANGUAGES
+            if results.get(f"{kind}_srt_{language}_path")]
+
+async def encode_word_clips(job, args, video_gen, frames):
+    """单词视频和短语视频分别编码，同时进入共享的编码队列"""
+    results = job['results']
+    output_base_dir = job['output_dir']
+    word_video_path, phrase_video_path = await asyncio.gather(*(video_gen.generate_async(
+        frames[kind],
+        audio_path=audio_input(job, f"{kind}_audio"),
+        audio_zh_path=audio_input(job, f"{kind}_zh_audio"),
+        lead_silence_duration=args.lead_silence,
+        audio_gap=args.audio_gap,
+        end_pause=args.end_pause,
+        output_video_path=str(output_base_dir / f"{kind}_video.mp4"),
+        output_audio_path=str(output_base_dir / f"{kind}_audio.aac") if args.save_audio else None,
+        subtitles=subtitle_tracks(results, kind)
+    ) for kind in ('word', 'phrase')))
+    log_success(f"单词视频已生成: {word_video_path}")
+    results['word_video_path'] = word_video_path
+    log_success(f"短语视频已生成: {phrase_video_path}")
+    results['phrase_video_path'] = phrase_video_path
+    # 记录片段的时长和音频位置，合并字幕直接按此累计，不再探测
+    for kind in ('word', 'phrase'):
+        results[f"{kind}_timeline"] = video_gen.timeline(
+            audio_input(job, f"{kind}_audio"), audio_input(job, f"{kind}_zh_audio"),
+            lead_silence_duration=args.lead_silence, audio_gap=args.audio_gap, end_pause=args.end_pause
+        )
+
+async def encode_word_unit(job, args, video_gen, frames):
+    """单词和短语作为两段，一次编码为同一个视频"""
+    results = job['results']
+    output_base_dir = job['output_dir']
+    segments = [{
+        'image_path': frames[kind],
+        'audio': [audio_input(job, f"{kind}_audio"), audio_input(job, f"{kind}_zh_audio")],
+        'lead_silence_duration': args.lead_silence,
+        'audio_gap': args.audio_gap,
+        'end_pause': args.end_pause,
+    } for kind in ('word', 'phrase')]
+    timeline = await run_blocking(video_gen.segment_timeline, segments)
+
+    subtitles = []
+    if not args.skip_subtitle:
+        # 按两段的时间轴直接生成整段视频的字幕，随视频一起封装
+        builder = SubtitleTrackBuilder()
+        for kind, segment in zip(('word', 'phrase'), timeline):
+            builder.add_clip(segment['duration'], segment['segments'],
+                             text=results.get(kind, ""), text_zh=results.get(f"{kind}_zh", ""))
+        subtitle_paths = builder.write(output_base_dir / "video.srt")
+        subtitles = [(subtitle_paths[f"{language}_srt"], code) for language, code in SUBTITLE_LANGUAGES
+                     if f"{language}_srt" in subtitle_paths]
+
+    video_path = await video_gen.generate_segments_async(
+        segments,
+        output_video_path=str(output_base_dir / "video.mp4"),
+        output_audio_path=str(output_base_dir / "audio.aac") if args.save_audio else None,
+        subtitles=subtitles
+    )
+    log_success(f"单词和短语视频已生成: {video_path}")
+    results['video_path'] = video_path
+    for kind, segment in zip(('word', 'phrase'), timeline):
+        results[f"{kind}_timeline"] = {'duration': segment['duration'], 'segments': segment['segments']}
+
+async def run_video_stage(job, args, total_steps=5):
+    """5. 生成视频"""
+    word = job['word']
+    results = job['results']
+    output_base_dir = job['output_dir']
+
+    if not args.skip_video:
+        log_step(5, total_steps, f"为单词 '{word}' 生成视频...")
+        video_gen = VideoGenerator()
+
+        frames = {kind: str(results[f"{kind}_image_path"]) for kind in ('word', 'phrase')}
+        caption_frames = []
+        if captions_enabled(args):
+            # 文字预先绘制到图上，之后按静态图编码，硬字幕不增加编码开销
+            compositor = get_caption_compositor()
+            keep = keep_intermediates(args)
+            composed = await asyncio.gather(*(run_blocking(
+                compositor.compose, frames[kind], [results.get(kind), results.get(f"{kind}_zh")],
+                output_base_dir / f"{kind}_caption.png" if keep else None
+            ) for kind in frames))
+            frames = dict(zip(frames, composed))
+            if not keep:
+                caption_frames = composed
+
+        try:
+            if segment_encode_enabled():
+                await encode_word_unit(job, args, video_gen, frames)
+            else:
+                await encode_word_clips(job, args, video_gen, frames)
+        finally:
+            for path in caption_frames:
+                if os.path.exists(path):
+                    os.remove(path)
+    else:
+        log_warning(f"跳过单词 '{word}' 的视频生成")
+    return job
 
+def segment_encode_enabled():
+    """单词和短语是否一次编码为同一个视频"""
+    return bool(ConfigManager().get_ffmpeg_config().get('segment_encode', True))
+
+def word_clips(results):
+    """单词按播放顺序排列的视频文件"""
+    return [str(results[key]) for key in ('video_path', 'word_video_path', 'phrase_video_path') if key in results]
+
+STAGE_RUNNERS = {
+    'prompt': run_prompt_stage,
+    'image': run_image_stage,
+    'audio': run_audio_stage,
+    'subtitle': run_subtitle_stage,
+    'video': run_video_stage,
+}
+
+# 每个阶段写入结果字典的字段，用于断点续跑时恢复
+STAGE_OUTPUTS = {
+    'prompt': ('word', 'word_zh', 'word_prompt', 'phrase', 'phrase_zh', 'phrase_prompt'),
+    'image': ('word_image_path', 'phrase_image_path', 'image_path'),
+    'audio': ('word_audio_path', 'word_zh_audio_path', 'phrase_audio_path', 'phrase_zh_audio_path', 'audio_path'),
+    'subtitle': ('word_srt_en_path', 'word_srt_zh_path', 'phrase_srt_en_path', 'phrase_srt_zh_path'),
+    'video': ('video_path', 'word_video_path', 'phrase_video_path', 'word_timeline', 'phrase_timeline'),
+}
+
+def stage_inputs_hash(stage_name, job, args):
+    """计算阶段输入的哈希；上游输出文件按大小和修改时间参与计算，内存中的音频按内容哈希参与计算，
+    上游重做后下游随之重做"""
+    results = job['results']
+    files = lambda *keys: [file_signature(results.get(key)) for key in keys]
+
+    def audio():
+        signatures = []
+        for name, _, _, _ in AUDIO_CLIPS:
+            artifact = job['artifacts'].get(name)
+            signatures.append(artifact.digest if artifact is not None else file_signature(results.get(f"{name}_path")))
+        return signatures
+
+    if stage_name == 'prompt':
+        azure_config = ConfigManager().settings.get('azure_openai') or {}
+        # 按模板文件内容（与提示词缓存相同的哈希）计算，修改模板后续跑时重新生成
+        prompts_hash = None if args.skip_prompt else get_prompt_generator(args).prompts_hash
+        values = dict(word=job['word'], skip=args.skip_prompt, custom_prompt=args.custom_prompt,
+                      deployment=azure_config.get('deployment_name'), prompts_hash=prompts_hash)
+    elif stage_name == 'image':
+        values = dict(prompts=[results.get('word_prompt'), results.get('phrase_prompt')],
+                      skip=args.skip_image, image_path=args.image_path)
+    elif stage_name == 'audio':
+        values = dict(texts=[results.get(key) for key in ('word', 'word_zh', 'phrase', 'phrase_zh')],
+                      tts=args.tts, skip=args.skip_audio, audio_path=args.audio_path,
+                      keep=keep_intermediates(args))
+    elif stage_name == 'subtitle':
+        values = dict(texts=[results.get(key) for key in ('word', 'word_zh', 'phrase', 'phrase_zh')],
+                      audio=audio(),
+                      lead_silence=args.lead_silence, audio_gap=args.audio_gap,
+                      segment_encode=segment_encode_enabled(), skip=args.skip_subtitle)
+    else:
+        values = dict(images=files('word_image_path', 'phrase_image_path'),
+                      audio=audio(),
+                      subtitles=files('word_srt_en_path', 'word_srt_zh_path', 'phrase_srt_en_path', 'phrase_srt_zh_path'),
+                      lead_silence=args.lead_silence, audio_gap=args.audio_gap, end_pause=args.end_pause,
+                      save_audio=args.save_audio, captions=captions_enabled(args),
+                      segment_encode=segment_encode_enabled(), skip=args.skip_video)
+    return hash_inputs(stage=stage_name, **values)
+
+def restore_stage(job, stage_name, inputs_hash, args):
+    """续跑时，阶段已完成且输出有效则直接恢复结果，返回是否已恢复"""
+    if not args.resume:
+        return False
+    outputs = job['manifest'].completed(stage_name, inputs_hash)
+    if outputs is None:
+        return False
+    job['results'].update(outputs)
+    log_success(f"单词 '{job['word']}' 的 {stage_name} 阶段已完成，跳过")
+    return True
+
+def checkpoint_stage(job, stage_name, inputs_hash):
+    """阶段成功后把输出写入处理清单"""
+    results = job['results']
+    outputs = {key: results[key] for key in STAGE_OUTPUTS[stage_name] if key in results}
+    job['manifest'].record(stage_name, inputs_hash, outputs, results)
+
+def stage_persisted(stage_name, args):
+    """阶段的输出是否写入了磁盘；只在内存中的语音不记为完成，续跑时重新生成（通常命中缓存）"""
+    return stage_name != 'audio' or args.skip_audio or keep_intermediates(args)
+
+def fail_stage(job, stage_name, inputs_hash, error):
+    """阶段失败时记录到处理清单，清单本身写入失败不影响后续单词"""
     try:
-        # 1. 生成提示词
-        if not args.skip_prompt:
-            log_step(1, total_steps, f"为单词 '{word}' 生成图像提示词...")
-            prompt_gen = PromptGenerator()
-            word_prompt = await prompt_gen.generate(word)
-            log_success(f"生成提示词: {word_prompt}")
-            word_prompt = json.loads(word_prompt)
-
-            results['word'] = word_prompt['word']
-            results['word_zh'] = word_prompt['word_zh']
-            results['word_prompt'] = word_prompt['word_prompt']
-            results['phrase'] = word_prompt['phrase']
-            results['phrase_zh'] = word_prompt['phrase_zh']
-            results['phrase_prompt'] = word_prompt['phrase_prompt']
-
-            # 保存结果到JSON文件
-            json_path = output_base_dir / "result.json"
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(results, f, ensure_ascii=False, indent=2)
-            log_success(f"结果已保存到: {json_path}")
-        else:
-            log_warning(f"跳过单词 '{word}' 的提示词生成")
-            results['word_prompt'] = word_prompt['word_prompt']
-            results['phrase_prompt'] = word_prompt['phrase_prompt']
-
-        # 2. 生成图片
-        if not args.skip_image:
-            log_step(2, total_steps, f"为单词 '{word}' 生成图像...")
-            image_gen = ImageGenerator()
-            word_image_path = image_gen.generate(results['word_prompt'], output_path=output_base_dir / "word_image.png")
-            log_success(f"单词图像已保存: {word_image_path}")
-            results['word_image_path'] = word_image_path
-
-            phrase_image_path = image_gen.generate(results['phrase_prompt'], output_path=output_base_dir / "phrase_image.png")
-            log_success(f"句子图像已保存: {phrase_image_path}")
-            results['phrase_image_path'] = phrase_image_path
-        elif args.image_path:
-            log_warning(f"为单词 '{word}' 使用已有图像: {args.image_path}")
-            results['image_path'] = args.image_path
-        else:
-            log_error("需要图像路径，请提供--image-path或不使用--skip-image")
+        job['manifest'].fail(stage_name, inputs_hash, error, job['results'])
+    except OSError as e:
+        logger.warning(f"保存处理清单失败: {str(e)}")
+
+def finish_word_job(job):
+    """记录单词处理完成信息并返回结果字典"""
+    # 单词的视频已生成，释放内存中的中间数据
+    job['artifacts'].clear()
+    elapsed_time = time.time() - job['start_time']
+    logger.info(f"{COLORS['GREEN']}单词 '{job['word']}' 处理完成! 用时: {elapsed_time:.2f}秒{COLORS['RESET']}")
+    return job['results']
+
+def make_stage_handler(stage_name, args):
+    """将阶段函数包装为流水线处理器，出错时记录日志并返回None"""
+    runner = STAGE_RUNNERS[stage_name]
+
+    async def handler(job):
+        inputs_hash = stage_inputs_hash(stage_name, job, args)
+        if restore_stage(job, stage_name, inputs_hash, args):
+            return job
+        try:
+            result = await runner(job, args)
+        except Exception as e:
+            log_error(f"处理单词 '{job['word']}' 过程中出错: {str(e)}")
+            if args.debug:
+                import traceback
+                traceback.print_exc()
+            fail_stage(job, stage_name, inputs_hash, str(e))
             return None
+        if result is None:
+            fail_stage(job, stage_name, inputs_hash, "阶段未产生结果")
+        elif stage_persisted(stage_name, args):
+            checkpoint_stage(result, stage_name, inputs_hash)
+        return result
 
-        # 3. 生成语音
-        if not args.skip_audio:
-            log_step(3, total_steps, f"为单词 '{word}' 生成语音...")
-            zh_audio_gen = AudioGenerator()
-            en_audio_gen = AudioGenerator_ali()
-
-            word_audio_path = en_audio_gen.generate(results['word'], 'word', 'en', output_path=output_base_dir / "word_audio.wav")
-            log_success(f"单词语音已保存: {word_audio_path}")
-            results['word_audio_path'] = word_audio_path
-
-            word_zh_audio_path = zh_audio_gen.generate(results['word_zh'], 'word', 'zh', output_path=output_base_dir / "word_zh_audio.wav")
-            log_success(f"单词中文语音已保存: {word_zh_audio_path}")
-            results['word_zh_audio_path'] = word_zh_audio_path
-
-            phrase_audio_path = en_audio_gen.generate(results['phrase'], 'phrase', 'en', output_path=output_base_dir / "phrase_audio.wav")
-            log_success(f"短语语音已保存: {phrase_audio_path}")
-            results['phrase_audio_path'] = phrase_audio_path
-
-            phrase_zh_audio_path = zh_audio_gen.generate(results['phrase_zh'], 'phrase', 'zh', output_path=output_base_dir / "phrase_zh_audio.wav")
-            log_success(f"短语中文语音已保存: {phrase_zh_audio_path}")
-            results['phrase_zh_audio_path'] = phrase_zh_audio_path
-        elif args.audio_path:
-            log_warning(f"为单词 '{word}' 使用已有音频: {args.audio_path}")
-            results['audio_path'] = args.audio_path
-        else:
-            log_error("需要音频路径，请提供--audio-path或不使用--skip-audio")
+    return handler
+
+def make_prompt_batch_handler(args):
+    """批量提示词阶段的处理器，续跑时已完成的单词不再请求LLM"""
+
+    async def handler(batch):
+        hashes = [stage_inputs_hash('prompt', job, args) for job in batch]
+        pending = [i for i, job in enumerate(batch) if not restore_stage(job, 'prompt', hashes[i], args)]
+        outputs = list(batch)
+        if pending:
+            for i, result in zip(pending, await run_prompt_batch_stage([batch[i] for i in pending], args)):
+                outputs[i] = result
+                if result is None:
+                    fail_stage(batch[i], 'prompt', hashes[i], "未能生成提示词")
+                else:
+                    checkpoint_stage(result, 'prompt', hashes[i])
+        return outputs
+
+    return handler
+
+async def process_single_word(word, args, config_manager, task_id, total_steps=5):
+    """处理单个单词的视频生成流程"""
+    job = create_word_job(word, config_manager, task_id)
+    for stage_name in STAGE_NAMES:
+        job = await make_stage_handler(stage_name, args)(job)
+        if job is None:
             return None
-        
-        # 4. 生成SRT字幕文件
-        if not args.skip_subtitle:
-            log_step(4, total_steps, f"为单词 '{word}' 生成SRT字幕...")
-            srt_gen = SrtGenerator()
-            # 使用与视频生成相同的参数值
-            lead_silence = args.lead_silence if hasattr(args, 'lead_silence') else 1.0
-            audio_gap = args.audio_gap if hasattr(args, 'audio_gap') else 1.0
-            
-            # 为单词部分生成字幕
-            word_srt_path = srt_gen.generate(
-                audio_path=results['word_audio_path'],
-                audio_zh_path=results['word_zh_audio_path'],
-                text=results['word'],
-                text_zh=results['word_zh'],
-                lead_silence=lead_silence,
-                audio_gap=audio_gap,
-                output_path=output_base_dir / f"{word}.srt"
-            )
-            log_success(f"单词SRT字幕已保存: {word_srt_path}")
-            results['word_srt_path'] = word_srt_path
-            
-            # 为短语部分生成字幕
-            phrase_srt_path = srt_gen.generate(
-                audio_path=results['phrase_audio_path'],
-                audio_zh_path=results['phrase_zh_audio_path'],
-                text=results['phrase'],
-                text_zh=results['phrase_zh'],
-                lead_silence=lead_silence,
-                audio_gap=audio_gap,
-                output_path=output_base_dir / f"{word}_phrase.srt"
-            )
-            log_success(f"短语SRT字幕已保存: {phrase_srt_path}")
-            results['phrase_srt_path'] = phrase_srt_path
-        else:
-            log_warning(f"跳过单词 '{word}' 的字幕生成")
-        
-        # 5. 生成视频
-        if not args.skip_video:
-            log_step(5, total_steps, f"为单词 '{word}' 生成视频...")
-            video_gen = VideoGenerator()
-            lead_silence = args.lead_silence if hasattr(args, 'lead_silence') else 1.0
-            audio_gap = args.audio_gap if hasattr(args, 'audio_gap') else 1.0
-            end_pause = args.end_pause if hasattr(args, 'end_pause') else 1.0
-            
-            # 生成单词视频
-            word_video_path = video_gen.generate(
-                str(results['word_image_path']),
-                audio_path=str(results['word_audio_path']),
-                audio_zh_path=str(results['word_zh_audio_path']),
-                lead_silence_duration=lead_silence,
-                audio_gap=audio_gap,
-                end_pause=end_pause,
-                output_video_path=str(output_base_dir / "word_video.mp4"),
-                output_audio_path=str(output_base_dir / "word_audio.aac")
-            )
-            log_success(f"单词视频已生成: {word_video_path}")
-            results['word_video_path'] = word_video_path
-            
-            # 生成短语视频
-            phrase_video_path = video_gen.generate(
-                str(results['phrase_image_path']),
-                audio_path=str(results['phrase_audio_path']),
-                audio_zh_path=str(results['phrase_zh_audio_path']),
-                lead_silence_duration=lead_silence,
-                audio_gap=audio_gap,
-                end_pause=end_pause,
-                output_video_path=str(output_base_dir / "phrase_video.mp4"),
-                output_audio_path=str(output_base_dir / "phrase_audio.aac")
-            )
-            log_success(f"短语视频已生成: {phrase_video_path}")
-            results['phrase_video_path'] = phrase_video_path
+    return finish_word_job(job)
+
+def build_word_pipeline(args, config_manager, task_id, total_words):
+    """根据命令行参数和配置构建分阶段流水线"""
+    pipeline_config = config_manager.get_pipeline_config()
+    jobs = args.jobs if args.jobs else pipeline_config['jobs']
+    max_inflight = args.max_inflight_per_stage if args.max_inflight_per_stage else pipeline_config['max_inflight_per_stage']
+    stage_workers = pipeline_config.get('stage_workers') or {}
+    prompt_batch_size = 1 if args.skip_prompt else int(config_manager.get_azure_config().get('batch_size', 1))
+    started = 0
 
+    async def start_word(word):
+        # 单词进入流水线时才创建输出目录和上下文
+        nonlocal started
+        started += 1
+        log_step(started, total_words, f"处理单词 '{word}'...")
+        return create_word_job(word, config_manager, task_id)
+
+    stages = [Stage('init', start_word)]
+    for stage_name in STAGE_NAMES:
+        workers = jobs if args.jobs else stage_workers.get(stage_name, jobs)
+        if stage_name == 'image' and not args.jobs and 'image' not in stage_workers:
+            # 后续单词的图像任务也要提前进入提交队列，才能把ComfyUI队列保持在目标深度
+            comfy_config = config_manager.get_comfy_config()
+            depth = int(comfy_config.get('target_queue_depth', 2)) * len(get_backend_urls(comfy_config))
+            workers = max(workers, depth)
+        if stage_name == 'prompt' and prompt_batch_size > 1:
+            # 多个单词合并为一次LLM请求
+            stages.append(Stage(stage_name, make_prompt_batch_handler(args), workers, batch_size=prompt_batch_size))
         else:
-            log_warning(f"跳过单词 '{word}' 的视频生成")
-
-        # 完成
-        elapsed_time = time.time() - start_time
-        logger.info(f"{COLORS['GREEN']}单词 '{word}' 处理完成! 用时: {elapsed_time:.2f}秒{COLORS['RESET']}")
-        
-        return results
-        
-    except Exception as e:
-        log_error(f"处理单词 '{word}' 过程中出错: {str(e)}")
-        if args.debug:
-            import traceback
-            traceback.print_exc()
-        return None
+            stages.append(Stage(stage_name, make_stage_handler(stage_name, args), workers))
+    logger.debug(f"流水线配置: {[(stage.name, stage.workers) for stage in stages]}, 队列上限: {max_inflight}")
+    return StagePipeline(stages, max_inflight=max_inflight)
 
 async def generate_video(args, config_manager):
     """生成视频的主要流程，支持批量处理"""
     start_time = time.time()
-    task_id = int(time.time())
-    logger.info(f"开始执行任务，ID: {task_id}")
+    task_id = args.resume if args.resume else int(time.time())
+    task_dir = config_manager.get_output_base_dir() / str(task_id)
+    if args.resume:
+        logger.info(f"恢复任务，ID: {task_id}")
+    else:
+        logger.info(f"开始执行任务，ID: {task_id}")
     
     # 解析单词列表
     words = []
@@ -239,36 +760,61 @@ async def generate_video(args, config_manager):
             log_error(f"读取单词文件时出错: {str(e)}")
             return None
     
+    elif args.resume:  # 续跑时沿用任务记录的单词列表
+        try:
+            with open(task_dir / "task.json", 'r', encoding='utf-8') as f:
+                words = json.load(f)['words']
+        except (OSError, ValueError, KeyError) as e:
+            log_error(f"读取任务 {task_id} 的单词列表时出错: {str(e)}")
+            return None
+    
     if not words:
         log_error("没有指定要处理的单词，请使用--words或--words-file参数")
         return None
+
+    # 记录单词列表，供 --resume 使用
+    task_dir.mkdir(parents=True, exist_ok=True)
+    atomic_write_json(task_dir / "task.json", {'task_id': task_id, 'words': words})
     
     # 显示要处理的单词
     log_success(f"将处理 {len(words)} 个单词: {', '.join(words)}")
     
     # 存储每个单词的处理结果
     all_results = []
-    video_paths = []
-    
-    # 处理每个单词
-    for i, word in enumerate(words):
-        log_step(i + 1, len(words), f"处理单词 '{word}'...")
-        result = await process_single_word(word, args, config_manager, task_id)
-
-        if result:
-            all_results.append(result)
-            # 优先使用带字幕的视频
-            if 'subtitled_video_path' in result:
-                video_paths.append(result['subtitled_video_path'])
-            elif 'video_path' in result:
-                video_paths.append(result['video_path'])
+    output_dir = task_dir
+
+    # 合并视频时，单词完成后立即登记片段，在后台逐层合并
+    combiner = None
+    if args.combine:
+        ffmpeg_config = config_manager.get_ffmpeg_config()
+        combiner = IncrementalCombiner(output_dir / "combined.mp4",
+                                       fanout=ffmpeg_config.get('combine_fanout', 16))
+
+    # 以流水线方式处理所有单词：不同单词可同时处于不同阶段
+    pipeline = build_word_pipeline(args, config_manager, task_id, total_words=len(words))
+
+    def on_word_done(index, job):
+        if job is not None:
+            finish_word_job(job)
+        if combiner is not None:
+            if job is None:
+                combiner.add(index, None)
+            else:
+                results = job['results']
+                combiner.add(index, word_clips(results))
+
+    finished_jobs = await pipeline.run(words, on_result=on_word_done)
+
+    for job in finished_jobs:
+        if job is None:
+            continue
+        all_results.append(job['results'])
     
     # 生成剪映草稿
     if args.draft and len(all_results) > 0:
         log_step(len(words) + 1, len(words) + 2, "生成剪映草稿...")
         try:
             draft_gen = DraftGenerator()
-            output_dir = config_manager.get_output_base_dir() / str(task_id)
             draft_path = draft_gen.generate_from_results(
                 all_results, 
                 output_path=output_dir / f"pictale_draft_{task_id}.jy"
@@ -281,39 +827,20 @@ async def generate_video(args, config_manager):
                 traceback.print_exc()
 
     # 如果需要合并视频
-    if args.combine and len(video_paths) > 0:
+    if combiner is not None:
         combine_step = len(words) + 2 if args.draft else len(words) + 1
         log_step(combine_step, combine_step, "合并所有视频...")
-        output_dir = config_manager.get_output_base_dir() / str(task_id)
-        combined_video_path = output_dir / f"combined.mp4"
-
-        # 创建临时文件列表
-        temp_list_file = output_dir / "video_list.txt"
-        with open(temp_list_file, 'w', encoding='utf-8') as f:
-            for video_path in video_paths:
-                f.write(f"file '{video_path}'\n")
-        
-        # 使用ffmpeg直接合并视频
         try:
-            subprocess.run([
-                'ffmpeg',
-                '-f', 'concat',
-                '-safe', '0',
-                '-i', str(temp_list_file),
-                '-c', 'copy',
-                str(combined_video_path)
-            ], check=True, capture_output=True)
-            combined_path = str(combined_video_path)
-        except subprocess.CalledProcessError as e:
-            log_error(f"合并视频失败: {e.stderr.decode()}")
+            combined_path = await combiner.finish()
+        except FFmpegError as e:
+            log_error(f"合并视频失败: {e.stderr or str(e)}")
             combined_path = None
-        finally:
-            # 清理临时文件
-            if temp_list_file.exists():
-                temp_list_file.unlink()
 
         if combined_path:
             log_success(f"所有视频已合并: {combined_path}")
+            subtitle_paths = build_combined_subtitles(all_results, combined_path)
+            if subtitle_paths:
+                log_success(f"合并字幕已生成: {', '.join(subtitle_paths.values())}")
             
             # 如果需要播放
             if args.play:
@@ -321,18 +848,45 @@ async def generate_video(args, config_manager):
             
             # 添加到结果中
             final_result = {'combined_video_path': combined_path, 'individual_results': all_results}
+            if subtitle_paths:
+                final_result['combined_subtitle_paths'] = subtitle_paths
         else:
             log_error("视频合并失败")
             final_result = {'individual_results': all_results}
     else:
         final_result = {'individual_results': all_results}
     
+    # 缓存和后端调度统计
+    log_cache_stats()
+    log_backend_stats()
+    log_tts_stats()
+
     # 完成
     elapsed_time = time.time() - start_time
     logger.info(f"\n{COLORS['GREEN']}{COLORS['BOLD']}✨ 任务 {task_id} 所有操作完成! 总用时: {elapsed_time:.2f}秒{COLORS['RESET']}")
     
     return final_result
 
+def build_combined_subtitles(all_results, combined_path):
+    """
+    按合并顺序累计各片段的时间轴，生成整段合并视频的英文和中文字幕
+
+    Returns:
+        dict: 字幕文件路径，片段缺少时间轴时返回None
+    """
+    builder = SubtitleTrackBuilder()
+    for results in all_results:
+        for kind, text_key in (('word', 'word'), ('phrase', 'phrase')):
+            if f"{kind}_video_path" not in results and 'video_path' not in results:
+                continue
+            timeline = results.get(f"{kind}_timeline") or {}
+            if not timeline.get('duration'):
+                log_warning(f"单词 '{results['word']}' 缺少{kind}片段的时间轴，无法生成合并字幕")
+                return None
+            builder.add_clip(timeline['duration'], timeline['segments'],
+                             text=results.get(text_key, ""), text_zh=results.get(f"{text_key}_zh", ""))
+    return builder.write(combined_path)
+
 def play_video(video_path):
     """使用系统默认播放器播放视频"""
     try:
@@ -345,21 +899,15 @@ def play_video(video_path):
     except Exception as e:
         log_warning(f"无法播放视频: {str(e)}")
 
-async def main():
-    # 加载环境变量
-    load_dotenv()
-    
-    # 初始化配置管理器
-    config_manager = ConfigManager()
-    
-    # 解析命令行参数
+def build_parser():
+    """构建命令行参数解析器"""
     parser = argparse.ArgumentParser(
         description='Word Video Generator - 生成单词的音视频',
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
     )
     
-    # 单词输入选项（三选一）
-    word_group = parser.add_mutually_exclusive_group(required=True)
+    # 单词输入选项（三选一，--resume 时沿用任务记录的单词列表）
+    word_group = parser.add_mutually_exclusive_group()
     word_group.add_argument('--word', '-w', help='要生成视频的单个单词（向后兼容）')
     word_group.add_argument('--words', '-ws', nargs='+', help='要生成视频的多个单词，空格分隔')
     word_group.add_argument('--words-file', '-wf', help='包含单词列表的文件路径，每行一个单词')
@@ -378,22 +926,49 @@ async def main():
     parser.add_argument('--output-dir', help='指定输出目录')
     
     # 视频和音频参数
-    parser.add_argument('--tts', '-tts', default='tencent', help='语音合成类型，可选值: tencent, moyin, ali')
+    parser.add_argument('--tts', '-tts', help='语音合成服务，可选值: tencent, moyin, ali，逗号分隔表示偏好顺序（默认读取配置tts.providers）')
     parser.add_argument('--lead-silence', type=float, default=0.3, help='视频前导静音时长（秒）')
     parser.add_argument('--audio-gap', type=float, default=0.3, help='各段音频之间的间隔时间（秒）')
     parser.add_argument('--end-pause', type=float, default=0, help='每个单词视频结束后的静置时间（秒）')
+    parser.add_argument('--save-audio', action='store_true', help='同时保存拼接后的音频文件（.aac）')
+    parser.add_argument('--captions', action='store_true', help='把单词/短语的中英文绘制到画面上（硬字幕，默认读取配置caption.enabled）')
+    parser.add_argument('--keep-intermediates', action='store_true', help='在单词目录保留语音WAV等中间文件（默认只在内存中传递）')
+
+    # 批量并发选项
+    parser.add_argument('--jobs', '-j', type=int, help='流水线每个阶段的并发数（默认读取配置pipeline.jobs）')
+    parser.add_argument('--max-inflight-per-stage', type=int, help='每个阶段队列中最多排队的单词数（默认读取配置pipeline.max_inflight_per_stage）')
     
     # 输出选项
     parser.add_argument('--combine', '-c', action='store_true', help='合并生成的多个视频')
     parser.add_argument('--draft', '-d', action='store_true', help='生成剪映草稿文件 (.jy)')
+    parser.add_argument('--no-cache', action='store_true', help='不使用本地缓存')
+    parser.add_argument('--resume', type=int, metavar='TASK_ID', help='续跑指定任务，跳过已完成且输出有效的阶段')
+    parser.add_argument('--refresh-prompts', action='store_true', help='忽略提示词缓存，重新调用LLM生成并更新缓存')
 
     # 其他选项
     parser.add_argument('--play', action='store_true', help='生成后自动播放视频')
     parser.add_argument('--no-color', action='store_true', help='禁用彩色输出')
     parser.add_argument('--debug', action='store_true', help='启用调试模式')
     parser.add_argument('--version', action='store_true', help='显示版本信息')
+    return parser
+
+def parse_args(argv=None):
+    """解析命令行参数，未指定单词时必须通过 --resume 指定要续跑的任务"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not (args.word or args.words or args.words_file or args.resume or args.version):
+        parser.error("需要指定 --word/-w、--words/-ws、--words-file/-wf 之一，或使用 --resume 续跑任务")
+    return args
+
+async def main():
+    # 加载环境变量
+    load_dotenv()
     
-    args = parser.parse_args()
+    # 初始化配置管理器
+    config_manager = ConfigManager()
+    
+    # 解析命令行参数
+    args = parse_args()
     
     # 处理版本信息请求
     if args.version:
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+静态图编码基准测试
+
+对比逐帧循环编码（原方式）和静态图模式在各质量档位下的
+CPU时间、墙钟时间和输出文件大小。CPU时间包括FFmpeg子进程和本进程
+（静态图模式在进程内预缩放图像、两种模式在进程内拼接音轨）。
+
+用法:
+    python benchmarks/still_encode.py
+    python benchmarks/still_encode.py --image output/xxx/word_image.png --audio a.wav b.wav --repeat 3
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+import wave
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules.video import VideoGenerator
+
+FFMPEG_CONFIG = {
+    'video_codec': 'libx264',
+    'audio_codec': 'aac',
+    'audio_bitrate': '192k',
+    'pixel_format': 'yuv420p',
+}
+
+
+def make_sample_inputs(work_dir: Path):
+    """生成测试用的图像（带噪点，接近真实图片的编码难度）和两段语音长度的音频"""
+    from PIL import Image
+    image_path = work_dir / "image.png"
+    Image.effect_noise((1024, 1024), 64).convert('RGB').save(image_path)
+
+    audio_paths = []
+    for name, seconds in (("en.wav", 1.6), ("zh.wav", 1.2)):
+        path = work_dir / name
+        with wave.open(str(path), 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(16000)
+            f.writeframes(b'\x10\x00\xf0\xff' * int(seconds * 8000))
+        audio_paths.append(str(path))
+    return str(image_path), audio_paths
+
+
+def cpu_seconds() -> float:
+    """本进程和已结束子进程的CPU时间之和"""
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def run_case(video_gen: VideoGenerator, image_path: str, audio_paths: list, quality: str,
+             still: bool, output_path: Path, repeat: int) -> dict:
+    cpu_start = cpu_seconds()
+    wall_start = time.perf_counter()
+    for _ in range(repeat):
+        video_gen.generate(image_path, audio_paths[0], audio_paths[1] if len(audio_paths) > 1 else None,
+                           quality=quality, lead_silence_duration=0.3, audio_gap=0.3, end_pause=0.5,
+                           output_video_path=output_path, still=still)
+    return {
+        'cpu': (cpu_seconds() - cpu_start) / repeat,
+        'wall': (time.perf_counter() - wall_start) / repeat,
+        'size': os.path.getsize(output_path),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比逐帧编码和静态图模式的编码开销')
+    parser.add_argument('--image', help='测试图像，默认生成1024x1024噪点图')
+    parser.add_argument('--audio', nargs='+', help='测试音频（1~2个），默认生成两段WAV')
+    parser.add_argument('--quality', nargs='+', default=list(VideoGenerator.QUALITY_PRESETS),
+                        help='要对比的质量档位')
+    parser.add_argument('--repeat', type=int, default=2, help='每种组合重复次数，取平均')
+    parser.add_argument('--still-fps', type=int, default=5, help='静态图模式的帧率')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        work_dir = Path(temp_dir)
+        image_path, audio_paths = make_sample_inputs(work_dir)
+        image_path = args.image or image_path
+        audio_paths = args.audio or audio_paths
+
+        video_gen = VideoGenerator(ffmpeg_config={**FFMPEG_CONFIG, 'still_fps': args.still_fps}, output_dir=work_dir)
+
+        print(f"{'质量':<8}{'模式':<8}{'CPU秒':>10}{'墙钟秒':>10}{'大小KB':>10}")
+        for quality in args.quality:
+            baseline = None
+            for still in (False, True):
+                result = run_case(video_gen, image_path, audio_paths, quality, still,
+                                  work_dir / f"{quality}_{int(still)}.mp4", args.repeat)
+                label = "静态图" if still else "逐帧"
+                line = f"{quality:<8}{label:<8}{result['cpu']:>10.2f}{result['wall']:>10.2f}{result['size'] / 1024:>10.1f}"
+                if baseline:
+                    line += f"   CPU {result['cpu'] / baseline['cpu']:.0%}, 大小 {result['size'] / baseline['size']:.0%}"
+                else:
+                    baseline = result
+                print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+class Artifact:
+    """在阶段之间传递的内存数据
+
+    数据只读取一次，后续阶段直接使用内存中的缓冲区；
+    只有需要作为成品或按需保留的中间文件时才写入磁盘。
+    """
+
+    def __init__(self, data: bytes, name: str, meta: Dict[str, Any] = None, path: str = None):
+        """
+        Args:
+            data: 数据内容
+            name: 名称，用于日志和临时文件名
+            meta: 附加信息（如文本、语言、提供方）
+            path: 已经保存到磁盘时的路径
+        """
+        self.data = data
+        self.name = name
+        self.meta = meta or {}
+        self.path = str(path) if path else None
+        self._digest = None
+
+    @classmethod
+    def from_file(cls, path, name: str = None, meta: Dict[str, Any] = None, remove: bool = False) -> 'Artifact':
+        """
+        读取文件为内存数据
+
+        Args:
+            path: 文件路径
+            name: 名称，默认取文件名
+            meta: 附加信息
+            remove: 读取后删除文件（临时文件），否则记录路径
+        """
+        with open(path, 'rb') as f:
+            data = f.read()
+        if remove:
+            os.remove(path)
+        return cls(data, name or Path(path).stem, meta, path=None if remove else path)
+
+    @property
+    def view(self) -> memoryview:
+        """只读的内存视图，不复制数据"""
+        return memoryview(self.data)
+
+    @property
+    def digest(self) -> str:
+        """内容的sha256"""
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.data).hexdigest()
+        return self._digest
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def persist(self, path) -> str:
+        """原子写入磁盘并记录路径"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(self.data)
+        os.replace(tmp_path, path)
+        self.path = str(path)
+        return self.path
+
+
+class ArtifactBus:
+    """单个单词各阶段共享的内存数据"""
+
+    def __init__(self):
+        self._artifacts: Dict[str, Artifact] = {}
+
+    def put(self, key: str, artifact: Artifact):
+        self._artifacts[key] = artifact
+
+    def get(self, key: str) -> Optional[Artifact]:
+        return self._artifacts.get(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._artifacts
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(artifact) for artifact in self._artifacts.values())
+
+    def clear(self):
+        """单词处理完成后释放内存"""
+        self._artifacts.clear()
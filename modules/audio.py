@@ -1,35 +1,150 @@
+import asyncio
 import base64
 import json
+import os
+import threading
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from tencentcloud.common import credential
+from tencentcloud.common.exception.tencent_cloud_sdk_exception import TencentCloudSDKException
 from tencentcloud.common.profile.client_profile import ClientProfile
 from tencentcloud.common.profile.http_profile import HttpProfile
 from tencentcloud.tts.v20190823 import tts_client, models
 from modules.config import ConfigManager
 from modules.logger import get_logger
+from modules.throttle import RetryPolicy, TokenBucket
 from pathlib import Path
 
-class AudioGenerator:
-    def __init__(self):
+# 可以重试的错误码前缀：限频、服务端临时错误和网络错误
+RETRYABLE_CODES = ('RequestLimitExceeded', 'LimitExceeded', 'InternalError', 'ResourceUnavailable',
+                   'ClientNetworkError', 'ServerNetworkError')
+
+
+def is_retryable(error: Exception) -> bool:
+    """判断腾讯云SDK异常是否可以重试"""
+    return isinstance(error, TencentCloudSDKException) and (error.get_code() or '').startswith(RETRYABLE_CODES)
+
+
+class TencentTtsClient:
+    """进程内共享的腾讯云语音合成客户端
+
+    复用同一个SDK客户端（保持长连接），所有请求经过同一个令牌桶，
+    总QPS不超过账号配额；限频等临时错误按指数退避加抖动重试。
+    异步接口在专用线程池中执行SDK调用，等待令牌和退避不占用线程。
+    """
+
+    def __init__(self, tencent_config: dict):
+        """
+        Args:
+            tencent_config: tencent_cloud 配置，另可包含 qps、burst、max_retries、timeout、max_connections
+        """
         self.logger = get_logger(__name__)
-        self.config_manager = ConfigManager()
-        self.tencent_config = self.config_manager.get_tencent_config()
-        self.output_dir = self.config_manager.get_output_base_dir()
-        
-        # 初始化腾讯云客户端
         cred = credential.Credential(
-            self.tencent_config['secret_id'], 
-            self.tencent_config['secret_key']
+            tencent_config['secret_id'],
+            tencent_config['secret_key']
         )
-        http_profile = HttpProfile()
+        http_profile = HttpProfile(reqTimeout=int(tencent_config.get('timeout', 30)), keepAlive=True)
         http_profile.endpoint = "tts.tencentcloudapi.com"
         client_profile = ClientProfile()
         client_profile.httpProfile = http_profile
         self.client = tts_client.TtsClient(
-            cred, 
-            self.tencent_config.get('region', 'ap-guangzhou'), 
+            cred,
+            tencent_config.get('region', 'ap-guangzhou'),
             client_profile
         )
+        self.limiter = TokenBucket(float(tencent_config.get('qps', 20)), tencent_config.get('burst'))
+        self.policy = RetryPolicy(is_retryable, max_attempts=int(tencent_config.get('max_retries', 3)) + 1,
+                                  limiter=self.limiter, name="腾讯云语音合成")
+        self._executor = ThreadPoolExecutor(max_workers=int(tencent_config.get('max_connections', 8)),
+                                            thread_name_prefix="tencent-tts")
+
+    def _request(self, params: dict) -> bytes:
+        req = models.TextToVoiceRequest()
+        req.from_json_string(json.dumps(params))
+        resp = self.client.TextToVoice(req)
+        return base64.b64decode(resp.Audio)
+
+    def synthesize(self, params: dict) -> bytes:
+        """同步合成，返回音频数据"""
+        return self.policy.call(self._request, params)
+
+    async def synthesize_async(self, params: dict) -> bytes:
+        """异步合成，返回音频数据"""
+        loop = asyncio.get_running_loop()
+        return await self.policy.call_async(lambda: loop.run_in_executor(self._executor, self._request, params))
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_tencent_tts_client() -> TencentTtsClient:
+    """获取进程内共享的腾讯云语音合成客户端"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = TencentTtsClient(ConfigManager().get_tencent_config())
+        return _client
+
+
+class AudioGenerator:
+    def __init__(self):
+        self.logger = get_logger(__name__)
+        self.config_manager = ConfigManager()
+        self.tencent_config = self.config_manager.get_tencent_config()
+        self.output_dir = self.config_manager.get_output_base_dir()
+        
+        # 所有实例共用一个腾讯云客户端
+        self.client = get_tencent_tts_client()
+
+    def get_voice_params(self, language: str = "en") -> dict:
+        """
+        获取指定语言的合成参数
+
+        Args:
+            language: 语言，en 或 zh
+
+        Returns:
+            dict: 影响合成结果的参数，同时用于请求和缓存键
+        """
+        if language == "zh":
+            primary_language = 1  # 中文
+            voice_type = self.tencent_config['voice_zh']   # 中文女声 (爱小璟)
+        else:
+            primary_language = 2  # 英文
+            voice_type = self.tencent_config['voice_en']   # 英文女声 (WeWinny)
+        return {
+            "ModelType": 1,           # 1: 标准音色
+            "Volume": 5,              # 音量大小
+            "Speed": -1,               # 语速
+            "SampleRate": 16000,      # 采样率
+            "Codec": "wav",           # 音频格式
+            "PrimaryLanguage": primary_language,
+            "VoiceType": voice_type,
+        }
+
+    def _build_params(self, text: str, language: str) -> dict:
+        return {
+            "Text": text,
+            "SessionId": f"session-{uuid.uuid4().hex}",
+            **self.get_voice_params(language)
+        }
+
+    def _save(self, audio_data: bytes, type: str, language: str, output_path: str = None) -> str:
+        """先写临时文件再替换，中途失败不会留下半截的WAV"""
+        if not output_path:
+            timestamp = int(time.time())
+            output_path = self.output_dir / f"{timestamp}_{type}_{language}.wav"
+        else:
+            output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{output_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(audio_data)
+        os.replace(tmp_path, output_path)
+        self.logger.info(f"语音文件已保存: {output_path}")
+        return str(output_path)
 
     def generate(self, text: str, type: str = "word", language: str = "en", output_path: str = None) -> str:
         """
@@ -46,52 +161,18 @@ class AudioGenerator:
         """
         try:
             self.logger.info(f"开始生成语音: {text}")
-            # 创建请求对象
-            req = models.TextToVoiceRequest()
-            
-            # 根据语言选择不同的参数
-            if language == "zh":
-                primary_language = 1  # 中文
-                voice_type = self.tencent_config['voice_zh']   # 中文女声 (爱小璟)
-            else:
-                primary_language = 2  # 英文
-                voice_type = self.tencent_config['voice_en']   # 英文女声 (WeWinny)
-            
-            params = {
-                "Text": text,
-                "SessionId": f"session-{int(time.time())}",
-                "ModelType": 1,           # 1: 标准音色
-                "Volume": 5,              # 音量大小
-                "Speed": -1,               # 语速
-                "SampleRate": 16000,      # 采样率
-                "Codec": "wav",           # 音频格式
-                "PrimaryLanguage": primary_language,
-                "VoiceType": voice_type,
-            }
-            req.from_json_string(json.dumps(params))
-            
-            # 发送请求
-            self.logger.debug("发送语音合成请求到腾讯云")
-            resp = self.client.TextToVoice(req)
-            
-            # 确定输出路径
-            if not output_path:
-                timestamp = int(time.time())
-                output_path = self.output_dir / f"{timestamp}_{type}_{language}.wav"
-            else:
-                output_path = Path(output_path)
-            
-            # 确保输出目录存在
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            # 保存音频文件
-            decoded_audio_data = base64.b64decode(resp.Audio)
-            with open(str(output_path), 'wb') as f:
-                f.write(decoded_audio_data)
-            
-            self.logger.info(f"语音文件已保存: {output_path}")
-            return str(output_path)
-            
+            audio_data = self.client.synthesize(self._build_params(text, language))
+            return self._save(audio_data, type, language, output_path)
+        except Exception as e:
+            self.logger.error(f"生成语音时出错: {str(e)}")
+            raise Exception(f"Error generating audio: {str(e)}")
+
+    async def generate_async(self, text: str, type: str = "word", language: str = "en", output_path: str = None) -> str:
+        """异步生成语音，参数与generate相同"""
+        try:
+            self.logger.info(f"开始生成语音: {text}")
+            audio_data = await self.client.synthesize_async(self._build_params(text, language))
+            return self._save(audio_data, type, language, output_path)
         except Exception as e:
             self.logger.error(f"生成语音时出错: {str(e)}")
-            raise Exception(f"Error generating audio: {str(e)}") 
\ No newline at end of file
+            raise Exception(f"Error generating audio: {str(e)}")
@@ -1,6 +1,8 @@
-import base64
+import asyncio
 import json
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import os
 import ssl
@@ -11,92 +13,272 @@ from aliyunsdkcore.client import AcsClient
 from aliyunsdkcore.request import CommonRequest
 from aliyunsdkcore.auth.credentials import AccessKeyCredential
 import nls
+from nls.exception import InvalidParameter
 
 from modules.config import ConfigManager
 from modules.logger import get_logger
+from modules.throttle import RetryPolicy
 
-class AudioGenerator_ali:
-    def __init__(self):
+
+class AliSynthesisError(Exception):
+    """阿里云语音合成会话失败"""
+
+
+class AliTokenProvider:
+    """阿里云访问令牌缓存
+
+    令牌有效期为数小时，缓存到过期前 refresh_margin 秒为止，
+    并在那之前由后台线程提前刷新，合成请求不再等待 CreateToken。
+    """
+
+    def __init__(self, client: AcsClient, refresh_margin: float = 600):
+        """
+        Args:
+            client: 阿里云SDK客户端
+            refresh_margin: 提前刷新的时间（秒）
+        """
         self.logger = get_logger(__name__)
-        self.config_manager = ConfigManager()
-        self.ali_config = self.config_manager.get_aliyun_config()
-        self.output_dir = self.config_manager.get_output_base_dir()
-        
-        # 初始化阿里云客户端
-        credentials = AccessKeyCredential(
-            self.ali_config['access_key_id'], 
-            self.ali_config['access_key_secret']
-        )
-        self.client = AcsClient(
-            region_id=self.ali_config.get('region', 'cn-shanghai'),
-            credential=credentials
-        )
-        
-        # 初始化NLS客户端
-        self.url = "wss://nls-gateway-cn-shanghai.aliyuncs.com/ws/v1"
-        self.appkey = self.ali_config['appkey']
+        self.client = client
+        self.refresh_margin = refresh_margin
         self.token = None
-        self.file_handle = None
-        
-        # 设置环境变量禁用证书验证
-        os.environ['PYTHONHTTPSVERIFY'] = '0'
-        os.environ['CURL_CA_BUNDLE'] = ''
-        os.environ['REQUESTS_CA_BUNDLE'] = ''
+        self.expire_time = 0
+        self.refreshes = 0
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def _valid(self) -> bool:
+        return self.token is not None and time.time() < self.expire_time - self.refresh_margin
 
-    def __get_token(self):
-        """获取访问令牌"""
+    def _create_token(self):
+        """调用 CreateToken 获取令牌和过期时间"""
+        request = CommonRequest()
+        request.set_domain('nls-meta.cn-shanghai.aliyuncs.com')
+        request.set_version('2019-02-28')
+        request.set_action_name('CreateToken')
+        request.set_method('POST')
+
+        response = self.client.do_action_with_exception(request)
+        token_json = json.loads(response.decode('utf-8')).get('Token', {})
+        token = token_json.get('Id')
+        if not token:
+            raise Exception("无法获取阿里云访问令牌")
+        # 没有返回过期时间时按1小时计
+        return token, float(token_json.get('ExpireTime') or time.time() + 3600)
+
+    def _refresh(self):
         try:
-            # 创建请求对象
-            request = CommonRequest()
-            request.set_domain('nls-meta.cn-shanghai.aliyuncs.com')
-            request.set_version('2019-02-28')
-            request.set_action_name('CreateToken')
-            request.set_method('POST')
-            
-            # 发送请求
-            response = self.client.do_action_with_exception(request)
-            token_json = json.loads(response.decode('utf-8'))
-            token = token_json.get('Token', {}).get('Id')
-            
-            if not token:
-                raise Exception("无法获取阿里云访问令牌")
-            
-            return token
+            token, expire_time = self._create_token()
         except Exception as e:
             self.logger.error(f"获取Token失败: {str(e)}")
             raise
+        self.token, self.expire_time = token, expire_time
+        self.refreshes += 1
+        self._schedule()
+
+    def _schedule(self):
+        """在令牌进入刷新窗口时由后台线程刷新"""
+        if self._timer:
+            self._timer.cancel()
+        delay = max(1.0, self.expire_time - self.refresh_margin - time.time())
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        with self._lock:
+            try:
+                self._refresh()
+            except Exception:
+                # 后台刷新失败时，下一次 get() 会同步重试
+                pass
+
+    def get(self) -> str:
+        """获取有效的访问令牌"""
+        with self._lock:
+            if not self._valid():
+                self._refresh()
+            return self.token
+
+    def invalidate(self):
+        """令牌被服务端拒绝时丢弃缓存"""
+        with self._lock:
+            self.token = None
+
 
-    def __on_metainfo(self, message, *args):
-        self.logger.debug(f"on_metainfo: {message}, {args}")
-    
-    def __on_error(self, message, *args):
-        self.logger.error(f"on_error: {message}, {args}")
+class _SynthesisSink:
+    """单次合成的输出，先写临时文件，合成完成后再替换为目标文件"""
+
+    def __init__(self, output_path: Path):
+        self.output_path = output_path
+        self.tmp_path = f"{output_path}.tmp"
+        self.file_handle = open(self.tmp_path, 'wb')
+        self.completed = False
+        self.error = None
+
+    def on_data(self, data, *args):
         if self.file_handle:
-            self.file_handle.close()
-            self.file_handle = None
-    
-    def __on_close(self, *args):
-        self.logger.debug(f"on_close: {args}")
-        # if self.file_handle:
-        #     self.file_handle.close()
-        #     self.file_handle = None
-
-    def __on_completed(self, *args):
-        self.logger.debug(f"on_completed: {args}")
+            self.file_handle.write(data)
+
+    def on_error(self, message, *args):
+        self.error = message
+
+    def on_completed(self, *args):
+        self.completed = True
+
+    def on_close(self, *args):
+        pass
+
+    def discard(self):
+        """关闭并删除临时文件"""
         if self.file_handle:
             self.file_handle.close()
             self.file_handle = None
-    
-    def __on_data(self, data, *args):
-        self.logger.debug(f"on_data: {data}, {args}")
-        if self.file_handle:
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def finish(self) -> str:
+        """关闭文件；合成成功时替换目标文件，否则删除临时文件并抛出异常"""
+        self.file_handle.close()
+        self.file_handle = None
+        if self.completed and not self.error:
+            os.replace(self.tmp_path, self.output_path)
+            return str(self.output_path)
+        self.discard()
+        raise AliSynthesisError(f"语音合成失败: {self.error or '等待合成完成超时'}")
+
+
+class AliNlsClient:
+    """进程内共享的阿里云语音合成客户端
+
+    访问令牌全局缓存；每次合成使用独立的输出对象，最多 max_sessions 个
+    NlsSpeechSynthesizer 会话同时进行。异步接口在专用线程池中执行合成。
+    """
+
+    def __init__(self, ali_config: dict):
+        """
+        Args:
+            ali_config: aliyun 配置，另可包含 max_sessions、max_retries、token_refresh_margin
+        """
+        self.logger = get_logger(__name__)
+        credentials = AccessKeyCredential(
+            ali_config['access_key_id'],
+            ali_config['access_key_secret']
+        )
+        self.client = AcsClient(
+            region_id=ali_config.get('region', 'cn-shanghai'),
+            credential=credentials
+        )
+        self.url = "wss://nls-gateway-cn-shanghai.aliyuncs.com/ws/v1"
+        self.appkey = ali_config['appkey']
+        self.tokens = AliTokenProvider(self.client, float(ali_config.get('token_refresh_margin', 600)))
+        self.max_sessions = max(1, int(ali_config.get('max_sessions', 4)))
+        self._sessions = threading.BoundedSemaphore(self.max_sessions)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_sessions, thread_name_prefix="ali-tts")
+        self.policy = RetryPolicy(lambda e: isinstance(e, AliSynthesisError),
+                                  max_attempts=int(ali_config.get('max_retries', 2)) + 1,
+                                  name="阿里云语音合成")
+
+    def _session(self, text: str, voice_params: dict, output_path: Path) -> str:
+        """执行一次合成会话"""
+        with self._sessions:
+            sink = _SynthesisSink(output_path)
             try:
-                self.file_handle.write(data)
+                tts = nls.NlsSpeechSynthesizer(
+                    url=self.url,
+                    token=self.tokens.get(),
+                    appkey=self.appkey,
+                    on_data=sink.on_data,
+                    on_error=sink.on_error,
+                    on_completed=sink.on_completed,
+                    on_close=sink.on_close
+                )
+                tts.start(text=text, wait_complete=True, **voice_params)
+            except InvalidParameter:
+                sink.discard()
+                raise
             except Exception as e:
-                self.logger.error(f"写入数据失败: {str(e)}")
-                if self.file_handle:
-                    self.file_handle.close()
-                    self.file_handle = None
+                # 连接和超时错误可以重试
+                sink.discard()
+                raise AliSynthesisError(f"语音合成会话失败: {str(e)}") from e
+            try:
+                return sink.finish()
+            except AliSynthesisError as e:
+                if 'token' in str(e).lower():
+                    self.tokens.invalidate()
+                raise
+
+    def synthesize(self, text: str, voice_params: dict, output_path: Path) -> str:
+        """同步合成到输出文件"""
+        return self.policy.call(self._session, text, voice_params, output_path)
+
+    async def synthesize_async(self, text: str, voice_params: dict, output_path: Path) -> str:
+        """异步合成到输出文件"""
+        loop = asyncio.get_running_loop()
+        return await self.policy.call_async(
+            lambda: loop.run_in_executor(self._executor, self._session, text, voice_params, output_path))
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_ali_nls_client() -> AliNlsClient:
+    """获取进程内共享的阿里云语音合成客户端"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = AliNlsClient(ConfigManager().get_aliyun_config())
+        return _client
+
+
+class AudioGenerator_ali:
+    def __init__(self):
+        self.logger = get_logger(__name__)
+        self.config_manager = ConfigManager()
+        self.ali_config = self.config_manager.get_aliyun_config()
+        self.output_dir = self.config_manager.get_output_base_dir()
+        
+        # 所有实例共用一个客户端，令牌缓存和会话数限制全局生效
+        self.client = get_ali_nls_client()
+        
+        # 设置环境变量禁用证书验证
+        os.environ['PYTHONHTTPSVERIFY'] = '0'
+        os.environ['CURL_CA_BUNDLE'] = ''
+        os.environ['REQUESTS_CA_BUNDLE'] = ''
+
+    def get_voice_params(self, language: str = "en") -> dict:
+        """
+        获取指定语言的合成参数
+
+        Args:
+            language: 语言，en 或 zh
+
+        Returns:
+            dict: 影响合成结果的参数，同时用于请求和缓存键
+        """
+        if language == "zh":
+            voice = self.ali_config.get('voice_zh', 'xiaoyun')  # 中文默认音色
+            speech_rate = 0  # 正常语速
+        else:
+            voice = self.ali_config.get('voice_en', 'samantha')  # 英文默认音色
+            speech_rate = -100  # 稍慢语速，适合学习
+        return {
+            'voice': voice,
+            'aformat': 'wav',
+            'sample_rate': 16000,
+            'volume': 50,
+            'speech_rate': speech_rate,
+            'pitch_rate': 0,
+        }
+
+    def _output_path(self, type: str, language: str, output_path: str = None) -> Path:
+        if not output_path:
+            timestamp = int(time.time())
+            output_path = self.output_dir / f"{timestamp}_{type}_{language}.wav"
+        else:
+            output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        return output_path
 
     def generate(self, text: str, type: str = "word", language: str = "en", output_path: str = None) -> str:
         """
@@ -113,67 +295,22 @@ class AudioGenerator_ali:
         """
         try:
             self.logger.info(f"开始生成语音(阿里云): {text}")
-            
-            # 获取token
-            self.token = self.__get_token()
-            self.logger.debug(f"token: {self.token}")
-            
-            # 根据语言选择不同的参数
-            if language == "zh":
-                voice = self.ali_config.get('voice_zh', 'xiaoyun')  # 中文默认音色
-                speech_rate = 0  # 正常语速
-            else:
-                voice = self.ali_config.get('voice_en', 'samantha')  # 英文默认音色
-                speech_rate = -100  # 稍慢语速，适合学习
-            
-            # 确定输出路径
-            if not output_path:
-                timestamp = int(time.time())
-                output_path = self.output_dir / f"{timestamp}_{type}_{language}.wav"
-            else:
-                output_path = Path(output_path)
-            
-            # 确保输出目录存在
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            # 打开文件
-            self.file_handle = open(str(output_path), 'wb')
-            
-            # 创建语音合成器
-            # nls.enableTrace(True)
-            
-            tts = nls.NlsSpeechSynthesizer(
-                url=self.url,
-                token=self.token,
-                appkey=self.appkey,
-                on_metainfo=self.__on_metainfo,
-                on_error=self.__on_error,
-                on_close=self.__on_close,
-                on_data=self.__on_data,
-                on_completed=self.__on_completed
-            )
-            
-            self.logger.debug(f"tts: {tts}")
-            # 开始合成
-            result = tts.start(
-                text=text,
-                voice=voice,
-                aformat="wav",
-                sample_rate=16000,
-                volume=50,
-                speech_rate=speech_rate,
-                pitch_rate=0,
-                wait_complete=True
-            )
-            
-            self.logger.debug(f"result: {result}")
-            
+            output_path = self.client.synthesize(text, self.get_voice_params(language),
+                                                 self._output_path(type, language, output_path))
             self.logger.info(f"语音文件已保存: {output_path}")
-            return str(output_path)
-            
+            return output_path
+        except Exception as e:
+            self.logger.error(f"生成语音时出错: {str(e)}")
+            raise Exception(f"Error generating audio: {str(e)}")
+
+    async def generate_async(self, text: str, type: str = "word", language: str = "en", output_path: str = None) -> str:
+        """异步生成语音，参数与generate相同"""
+        try:
+            self.logger.info(f"开始生成语音(阿里云): {text}")
+            output_path = await self.client.synthesize_async(text, self.get_voice_params(language),
+                                                             self._output_path(type, language, output_path))
+            self.logger.info(f"语音文件已保存: {output_path}")
+            return output_path
         except Exception as e:
             self.logger.error(f"生成语音时出错: {str(e)}")
-            if self.file_handle:
-                self.file_handle.close()
-                self.file_handle = None
-            raise Exception(f"Error generating audio: {str(e)}") 
\ No newline at end of file
+            raise Exception(f"Error generating audio: {str(e)}")
@@ -0,0 +1,276 @@
+import io
+import mmap
+import struct
+import wave
+from pathlib import Path
+from typing import Dict, List, Tuple
+from modules.logger import get_logger
+
+try:
+    import numpy as np
+except ImportError:  # numpy为可选依赖，缺失时由调用方退回FFmpeg滤镜
+    np = None
+
+
+class WavFormatError(Exception):
+    """不是可直接拼接的PCM WAV文件"""
+
+
+class WavInfo:
+    """WAV文件的格式信息和数据块位置"""
+
+    def __init__(self, path, channels: int, sample_rate: int, sample_width: int,
+                 data_offset: int, data_size: int, audio_format: int = 1, byte_rate: int = None,
+                 buffer: memoryview = None):
+        self.path = str(path) if path is not None else None
+        self.buffer = buffer
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.data_offset = data_offset
+        self.data_size = data_size
+        self.audio_format = audio_format
+        self.byte_rate = byte_rate or sample_rate * channels * sample_width
+
+    @property
+    def is_pcm16(self) -> bool:
+        # 0xFFFE为WAVE_FORMAT_EXTENSIBLE，TTS返回的PCM也可能使用
+        return self.audio_format in (1, 0xFFFE) and self.sample_width == 2
+
+    @property
+    def frames(self) -> int:
+        return self.data_size // (self.channels * self.sample_width)
+
+    @property
+    def duration(self) -> float:
+        if self.is_pcm16:
+            return self.frames / self.sample_rate
+        return self.data_size / self.byte_rate
+
+
+def is_buffer(source) -> bool:
+    """是否为内存中的数据（bytes、bytearray或memoryview）"""
+    return isinstance(source, (bytes, bytearray, memoryview))
+
+
+def read_wav_info(path, pcm_only: bool = True) -> WavInfo:
+    """
+    解析WAV文件头，定位fmt和data块
+
+    部分TTS返回的流式WAV在头中把data长度写成0或0xFFFFFFFF，
+    此时按文件实际长度计算。
+
+    Args:
+        path: WAV文件路径，或内存中的WAV数据
+        pcm_only: 为True时只接受16位PCM
+
+    Raises:
+        WavFormatError: 不是WAV文件，或pcm_only时不是16位PCM
+    """
+    if is_buffer(path):
+        buffer = memoryview(path).cast('B')
+        file_size = len(buffer)
+        opener = lambda: io.BytesIO(buffer)
+        path = None
+    else:
+        buffer = None
+        path = Path(path)
+        file_size = path.stat().st_size
+        opener = lambda: open(path, 'rb')
+    with opener() as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+            raise WavFormatError(f"不是WAV文件: {path or '内存数据'}")
+        fmt = None
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                break
+            chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+            if chunk_id == b'fmt ':
+                fmt = struct.unpack('<HHIIHH', f.read(16))
+                f.seek(chunk_size - 16 + (chunk_size & 1), 1)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    break
+                data_offset = f.tell()
+                if chunk_size in (0, 0xFFFFFFFF) or data_offset + chunk_size > file_size:
+                    chunk_size = file_size - data_offset
+                audio_format, channels, sample_rate, byte_rate, _, bits = fmt
+                info = WavInfo(path, channels, sample_rate, max(1, bits // 8), data_offset, chunk_size,
+                               audio_format=audio_format, byte_rate=byte_rate, buffer=buffer)
+                if pcm_only and not info.is_pcm16:
+                    raise WavFormatError(f"只支持16位PCM WAV: {path or '内存数据'}")
+                return info
+            else:
+                f.seek(chunk_size + (chunk_size & 1), 1)
+    raise WavFormatError(f"WAV文件缺少fmt或data块: {path or '内存数据'}")
+
+
+def resampled_frames(frames: int, src_rate: int, dst_rate: int) -> int:
+    """重采样后的帧数，拼接和字幕计时使用同一算法保证一致"""
+    if src_rate == dst_rate:
+        return frames
+    return int(round(frames * dst_rate / src_rate))
+
+
+class AudioAssembler:
+    """进程内的PCM音频拼接
+
+    TTS返回的都是PCM WAV，前导静音、段间间隔和结尾静置只是补零，
+    没必要为此启动FFmpeg。所有输入统一到同一采样率和声道数后
+    写成一条PCM音轨，并返回每段音频在音轨中的精确起止时间。
+    """
+
+    def __init__(self, sample_rate: int = None, channels: int = None):
+        """
+        Args:
+            sample_rate: 输出采样率，默认取输入中最高的采样率
+            channels: 输出声道数，默认取输入中最多的声道数
+        """
+        self.logger = get_logger(__name__)
+        self.sample_rate = sample_rate
+        self.channels = channels
+
+    @staticmethod
+    def available() -> bool:
+        """numpy是否可用"""
+        return np is not None
+
+    def _target_format(self, infos: List[WavInfo]) -> Tuple[int, int]:
+        sample_rate = self.sample_rate or max(info.sample_rate for info in infos)
+        channels = self.channels or max(info.channels for info in infos)
+        return sample_rate, channels
+
+    def layout(self, audio_paths: list, lead_silence: float = 0, audio_gap: float = 0,
+               end_pause: float = 0) -> Dict:
+        """
+        只读取文件头，计算拼接后各段音频的位置
+
+        Args:
+            audio_paths: 按播放顺序排列的WAV路径或内存中的WAV数据
+            lead_silence: 前导静音时间（秒）
+            audio_gap: 各段音频之间的间隔时间（秒）
+            end_pause: 音频结束后的静置时间（秒）
+
+        Returns:
+            dict: sample_rate、channels、duration（秒）和 segments（[(开始秒, 结束秒)]）
+        """
+        infos = [read_wav_info(path) for path in audio_paths]
+        if not infos:
+            raise ValueError("至少需要提供一个音频文件")
+        sample_rate, channels = self._target_format(infos)
+        lead_frames = int(round(lead_silence * sample_rate))
+        gap_frames = int(round(audio_gap * sample_rate))
+        end_frames = int(round(end_pause * sample_rate))
+
+        position = lead_frames
+        frame_segments = []
+        for i, info in enumerate(infos):
+            frames = resampled_frames(info.frames, info.sample_rate, sample_rate)
+            frame_segments.append((position, position + frames))
+            position += frames
+            if i < len(infos) - 1:
+                position += gap_frames
+        total_frames = position + end_frames
+
+        return {
+            'infos': infos,
+            'sample_rate': sample_rate,
+            'channels': channels,
+            'frames': total_frames,
+            'frame_segments': frame_segments,
+            'duration': total_frames / sample_rate,
+            'segments': [(start / sample_rate, end / sample_rate) for start, end in frame_segments],
+        }
+
+    def _load(self, info: WavInfo, sample_rate: int, channels: int):
+        """以内存映射（或直接从内存数据）读取PCM数据并转换到目标格式"""
+        count = info.frames * info.channels
+        if info.data_size == 0:
+            return np.zeros((0, channels), dtype=np.int16)
+        if info.buffer is not None:
+            samples = np.frombuffer(info.buffer, dtype='<i2', count=count, offset=info.data_offset)
+            samples = samples.reshape(-1, info.channels)
+        else:
+            with open(info.path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    view = np.frombuffer(buffer, dtype='<i2', count=count, offset=info.data_offset)
+                    samples = view.reshape(-1, info.channels).astype(np.int16)
+                    # 关闭映射前释放对缓冲区的引用
+                    del view
+
+        if info.sample_rate != sample_rate:
+            frames = resampled_frames(len(samples), info.sample_rate, sample_rate)
+            # 线性插值，对语音足够
+            src_times = np.arange(len(samples)) / info.sample_rate
+            dst_times = np.arange(frames) / sample_rate
+            samples = np.stack([
+                np.interp(dst_times, src_times, samples[:, c].astype(np.float32))
+                for c in range(info.channels)
+            ], axis=1)
+            samples = np.clip(np.round(samples), -32768, 32767).astype(np.int16)
+
+        if info.channels != channels:
+            if info.channels == 1:
+                samples = np.repeat(samples, channels, axis=1)
+            else:
+                # 多声道下混后再复制到目标声道数
+                mono = samples.mean(axis=1, keepdims=True).astype(np.int16)
+                samples = np.repeat(mono, channels, axis=1)
+        return samples
+
+    def render(self, audio_paths: list, lead_silence: float = 0, audio_gap: float = 0,
+               end_pause: float = 0) -> Dict:
+        """
+        在内存中拼接音频
+
+        Args:
+            audio_paths: 按播放顺序排列的WAV路径或内存中的WAV数据
+            lead_silence: 前导静音时间（秒）
+            audio_gap: 各段音频之间的间隔时间（秒）
+            end_pause: 音频结束后的静置时间（秒）
+
+        Returns:
+            dict: 与layout()相同，另含 pcm（16位小端交错PCM数据）
+        """
+        if np is None:
+            raise RuntimeError("音频拼接需要numpy")
+        plan = self.layout(audio_paths, lead_silence, audio_gap, end_pause)
+        sample_rate, channels = plan['sample_rate'], plan['channels']
+
+        # 静音部分本身就是零，只需拷贝各段音频
+        track = np.zeros((plan['frames'], channels), dtype='<i2')
+        for info, (start, end) in zip(plan['infos'], plan['frame_segments']):
+            samples = self._load(info, sample_rate, channels)
+            track[start:start + len(samples)] = samples[:end - start]
+        plan['pcm'] = track.tobytes()
+        return plan
+
+    def assemble(self, audio_paths: list, output_path, lead_silence: float = 0,
+                 audio_gap: float = 0, end_pause: float = 0) -> Dict:
+        """
+        拼接音频并写出单条PCM WAV音轨
+
+        Args:
+            audio_paths: 按播放顺序排列的WAV路径或内存中的WAV数据
+            output_path: 输出WAV路径
+            lead_silence: 前导静音时间（秒）
+            audio_gap: 各段音频之间的间隔时间（秒）
+            end_pause: 音频结束后的静置时间（秒）
+
+        Returns:
+            dict: 与layout()相同，另含 path
+        """
+        plan = self.render(audio_paths, lead_silence, audio_gap, end_pause)
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with wave.open(str(output_path), 'wb') as f:
+            f.setnchannels(plan['channels'])
+            f.setsampwidth(2)
+            f.setframerate(plan['sample_rate'])
+            f.writeframes(plan.pop('pcm'))
+
+        self.logger.debug(f"已拼接 {len(audio_paths)} 段音频: {output_path}, 时长 {plan['duration']:.3f}秒")
+        plan['path'] = str(output_path)
+        return plan
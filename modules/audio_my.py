@@ -1,11 +1,99 @@
-import base64
-import json
+import asyncio
+import os
+import threading
 import time
 import requests
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from modules.config import ConfigManager
 from modules.logger import get_logger
 
+# 服务端限流和临时错误，按退避时间重试
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class MoyinClient:
+    """进程内共享的魔音HTTP客户端
+
+    所有请求复用同一个 requests.Session（保持长连接，连接池大小可配置），
+    429和5xx由urllib3按指数退避重试并遵循Retry-After；
+    音频响应以流的方式分块写入临时文件，完成后再替换为目标文件。
+    """
+
+    def __init__(self, moyin_config: dict):
+        """
+        Args:
+            moyin_config: moyin 配置，另可包含 connect_timeout、read_timeout、max_retries、
+                          backoff_factor、max_connections
+        """
+        self.logger = get_logger(__name__)
+        self.timeout = (float(moyin_config.get('connect_timeout', 5)), float(moyin_config.get('read_timeout', 30)))
+        self.max_connections = max(1, int(moyin_config.get('max_connections', 16)))
+        retry = Retry(
+            total=int(moyin_config.get('max_retries', 3)),
+            backoff_factor=float(moyin_config.get('backoff_factor', 0.5)),
+            status_forcelist=RETRY_STATUS,
+            allowed_methods=frozenset(['POST']),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_connections, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_connections, thread_name_prefix="moyin-tts")
+
+    def synthesize(self, api_url: str, payload: dict, output_path) -> str:
+        """
+        发送合成请求并把音频流写入文件
+
+        Raises:
+            Exception: 请求失败或API返回的不是音频
+        """
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.session.post(api_url, json=payload, timeout=self.timeout, stream=True) as response:
+            if response.status_code != 200:
+                self.logger.error(f"API请求失败: {response.status_code} - {response.text}")
+                raise Exception(f"API request failed with status code {response.status_code}")
+            if not response.headers.get('Content-Type', '').startswith('audio/'):
+                self.logger.error(f"API返回错误: {response.text}")
+                raise Exception(f"API returned error: {response.text}")
+
+            tmp_path = f"{output_path}.tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        f.write(chunk)
+                os.replace(tmp_path, output_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        return str(output_path)
+
+    async def synthesize_async(self, api_url: str, payload: dict, output_path) -> str:
+        """异步合成，在专用线程池中执行请求"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.synthesize, api_url, payload, output_path)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_moyin_client() -> MoyinClient:
+    """获取进程内共享的魔音客户端"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = MoyinClient(ConfigManager().get_moyin_config())
+        return _client
+
+
 class MoyinAudioGenerator:
     def __init__(self):
         self.logger = get_logger(__name__)
@@ -24,6 +112,9 @@ class MoyinAudioGenerator:
                 'api_secret': ''
             }
 
+        # 所有实例共用一个HTTP会话
+        self.client = get_moyin_client()
+
     def __generate_signature(self, timestamp: int) -> str:
         """
         生成签名
@@ -31,6 +122,39 @@ class MoyinAudioGenerator:
         content = f"{self.moyin_config.get('api_key')}{self.moyin_config.get('api_secret')}{timestamp}"
         return hashlib.md5(content.encode()).hexdigest()
 
+    def get_voice_params(self, language: str = "en") -> dict:
+        """
+        获取指定语言的合成参数
+
+        Args:
+            language: 语言，en 或 zh
+
+        Returns:
+            dict: 影响合成结果的参数，同时用于请求和缓存键
+        """
+        return {
+            "speaker": self.speaker_zh if language == "zh" else self.speaker_en,
+            "audio_type": "wav",  # 音频格式，可选wav、mp3
+            "speed": 0.8,  # 语速，范围0.5-2.0，默认1.0
+            "pitch": 1.0,  # 音调，范围0.5-2.0，默认1.0
+            "volume": 1.0,  # 音量，范围0.5-2.0，默认1.0
+            "rate": 16000  # 采样率，范围16000-48000，默认16000
+        }
+
+    def _build_request(self, text: str, type: str, language: str, output_path: str = None):
+        """构建请求参数和输出路径"""
+        timestamp = int(time.time())
+        payload = {
+            "signature": self.__generate_signature(timestamp),
+            "timestamp": timestamp,
+            "appkey": self.moyin_config.get('api_key'),
+            "text": text,
+            **self.get_voice_params(language)
+        }
+        if not output_path:
+            output_path = self.output_dir / f"{timestamp}_{type}_{language}.wav"
+        return payload, output_path
+
     def generate(self, text: str, type: str = "word", language: str = "en", output_path: str = None) -> str:
         """
         使用墨因API生成语音
@@ -46,58 +170,23 @@ class MoyinAudioGenerator:
         """
         try:
             self.logger.info(f"开始生成语音: {text}")
-            
-            # 准备请求参数
-            headers = {
-                "Content-Type": "application/json"
-            }
-            
-            timestamp = int(time.time())
-            if language == "zh":
-                voice_id = self.speaker_zh
-            else:
-                voice_id = self.speaker_en
-
-            signature = self.__generate_signature(timestamp)
-            payload = {
-                "signature": signature,
-                "timestamp": timestamp,
-                "appkey": self.moyin_config.get('api_key'),
-                "speaker": voice_id,
-                "text": text,
-                "audio_type": "wav",  # 音频格式，可选wav、mp3
-                "speed": 0.8,  # 语速，范围0.5-2.0，默认1.0
-                "pitch": 1.0,  # 音调，范围0.5-2.0，默认1.0
-                "volume": 1.0,  # 音量，范围0.5-2.0，默认1.0
-                "rate": 16000  # 采样率，范围16000-48000，默认16000
-            }
-            
-            # 发送请求
+            payload, output_path = self._build_request(text, type, language, output_path)
             self.logger.debug("发送语音合成请求到 Moyin API")
-            response = requests.post(self.api_url, headers=headers, json=payload)
-            
-            # 检查响应
-            if response.status_code != 200:
-                self.logger.error(f"API请求失败: {response.status_code} - {response.text}")
-                raise Exception(f"API request failed with status code {response.status_code}")
-            
-            headers = response.headers
-
-            if headers.get('Content-Type') == 'audio/mpeg' or headers.get('Content-Type') == 'audio/wav':
-                audio_data = response.content
-                if not output_path:
-                    timestamp = int(time.time())
-                    output_path = self.output_dir / f"{timestamp}_{type}_{language}.wav"
-                # 保存音频文件
-                with open(output_path, 'wb') as f:
-                    f.write(audio_data)
-            else:
-                self.logger.error(f"API返回错误: {response.text}")
-                raise Exception(f"API returned error: {response.text}")
+            output_path = self.client.synthesize(self.api_url, payload, output_path)
+            self.logger.info(f"语音文件已保存: {output_path}")
+            return output_path
+        except Exception as e:
+            self.logger.error(f"生成语音时出错: {str(e)}")
+            raise Exception(f"Error generating audio: {str(e)}")
 
+    async def generate_async(self, text: str, type: str = "word", language: str = "en", output_path: str = None) -> str:
+        """异步生成语音，参数与generate相同"""
+        try:
+            self.logger.info(f"开始生成语音: {text}")
+            payload, output_path = self._build_request(text, type, language, output_path)
+            output_path = await self.client.synthesize_async(self.api_url, payload, output_path)
             self.logger.info(f"语音文件已保存: {output_path}")
-            return str(output_path)
-            
+            return output_path
         except Exception as e:
             self.logger.error(f"生成语音时出错: {str(e)}")
             raise Exception(f"Error generating audio: {str(e)}")
@@ -0,0 +1,346 @@
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+from modules.logger import get_logger
+
+
+def make_cache_key(**parts) -> str:
+    """根据键值对生成稳定的缓存键（SHA-256）"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class FileCache:
+    """基于内容寻址的文件缓存
+
+    文件按缓存键存放在 root 目录下，索引保存在 SQLite 中，
+    总大小超过上限时按最近访问时间（LRU）淘汰。命中时优先以硬链接
+    放到目标路径，跨设备等无法链接的情况退化为复制。
+    """
+
+    def __init__(self, root, max_bytes: int, name: str = "cache"):
+        """
+        Args:
+            root: 缓存目录
+            max_bytes: 缓存文件总大小上限（字节）
+            name: 缓存名称，用于日志
+        """
+        self.logger = get_logger(__name__)
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_bytes)
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.root / "index.db"), timeout=30, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, last_access REAL NOT NULL, meta TEXT)"
+        )
+        self._db.commit()
+
+    def _entry_path(self, key: str, suffix: str) -> Path:
+        return self.root / key[:2] / f"{key}{suffix}"
+
+    def get(self, key: str, dest_path) -> Optional[Dict[str, Any]]:
+        """
+        查找缓存并放置到目标路径
+
+        Args:
+            key: 缓存键
+            dest_path: 命中时文件的放置路径
+
+        Returns:
+            dict: 命中时返回写入时附带的元数据，未命中返回None
+        """
+        with self._lock:
+            row = self._db.execute("SELECT path, size, meta FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            entry_path, size, meta = Path(row[0]), row[1], row[2]
+            if not entry_path.exists() or entry_path.stat().st_size != size:
+                # 缓存文件丢失或被改写，视为未命中
+                self.logger.warning(f"{self.name}缓存条目已失效: {entry_path}")
+                self._delete(key, entry_path)
+                self._db.commit()
+                self.misses += 1
+                return None
+
+            # 在锁内放置文件，避免同时进行的put()淘汰该条目
+            dest_path = Path(dest_path)
+            try:
+                dest_path.parent.mkdir(parents=True, exist_ok=True)
+                if dest_path.exists():
+                    dest_path.unlink()
+                try:
+                    os.link(entry_path, dest_path)
+                except OSError:
+                    shutil.copyfile(entry_path, dest_path)
+            except OSError as e:
+                self.logger.warning(f"{self.name}缓存条目无法读取，视为未命中: {entry_path}, {str(e)}")
+                self._delete(key, entry_path)
+                self._db.commit()
+                self.misses += 1
+                return None
+
+            self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self.hits += 1
+        return json.loads(meta) if meta else {}
+
+    def peek(self, key: str) -> bool:
+        """检查缓存是否存在有效条目，不放置文件，也不计入命中统计和访问时间"""
+        with self._lock:
+            row = self._db.execute("SELECT path, size FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return False
+        entry_path = Path(row[0])
+        return entry_path.exists() and entry_path.stat().st_size == row[1]
+
+    def put(self, key: str, src_path, meta: Dict[str, Any] = None):
+        """
+        将文件写入缓存（复制，避免与输出文件共享同一inode）
+
+        Args:
+            key: 缓存键
+            src_path: 源文件路径
+            meta: 需要随条目保存的元数据
+        """
+        src_path = Path(src_path)
+        entry_path = self._entry_path(key, src_path.suffix)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = entry_path.with_name(f".{entry_path.name}.{threading.get_ident()}.tmp")
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, entry_path)
+        size = entry_path.stat().st_size
+        now = time.time()
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, path, size, created, last_access, meta) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, str(entry_path), size, now, now, json.dumps(meta or {}, ensure_ascii=False))
+            )
+            self._evict()
+            self._db.commit()
+
+    def _delete(self, key: str, entry_path: Path):
+        self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        try:
+            entry_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        """超出容量上限时按LRU淘汰条目"""
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute("SELECT key, path, size FROM entries ORDER BY last_access ASC").fetchall()
+        for key, path, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._delete(key, Path(path))
+            total -= size
+            self.evictions += 1
+        self.logger.debug(f"{self.name}缓存淘汰后大小: {total} 字节")
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            entries, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': entries,
+            'bytes': total,
+        }
+
+    def close(self):
+        """关闭索引数据库"""
+        with self._lock:
+            self._db.close()
+
+
+class PromptCache:
+    """LLM提示词结果的持久化缓存
+
+    以规范化后的单词、提示词模板哈希和部署名称作为键，
+    结果保存在 SQLite 中，超过有效期的条目视为未命中。
+    """
+
+    def __init__(self, db_path, ttl_seconds: float = None):
+        """
+        Args:
+            db_path: SQLite 数据库文件路径
+            ttl_seconds: 条目有效期（秒），None 表示永不过期
+        """
+        self.logger = get_logger(__name__)
+        db_path = Path(db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(db_path), timeout=30, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS prompts ("
+            "word TEXT NOT NULL, template_hash TEXT NOT NULL, deployment TEXT NOT NULL, "
+            "value TEXT NOT NULL, created REAL NOT NULL, "
+            "PRIMARY KEY (word, template_hash, deployment))"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def normalize_word(word: str) -> str:
+        """规范化单词，忽略首尾空白和大小写"""
+        return " ".join(word.split()).lower()
+
+    def get(self, word: str, template_hash: str, deployment: str) -> Optional[str]:
+        """
+        查找缓存的提示词结果
+
+        Returns:
+            str: 命中时返回缓存的JSON字符串，未命中或已过期返回None
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, created FROM prompts WHERE word = ? AND template_hash = ? AND deployment = ?",
+                (self.normalize_word(word), template_hash, deployment)
+            ).fetchone()
+            if row is None or (self.ttl_seconds is not None and time.time() - row[1] > self.ttl_seconds):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, word: str, template_hash: str, deployment: str, value: str):
+        """写入提示词结果"""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO prompts (word, template_hash, deployment, value, created) VALUES (?, ?, ?, ?, ?)",
+                (self.normalize_word(word), template_hash, deployment, value, time.time())
+            )
+            self._db.commit()
+
+    def invalidate(self, word: str = None) -> int:
+        """
+        使缓存失效
+
+        Args:
+            word: 指定单词，None 表示清空全部
+
+        Returns:
+            int: 删除的条目数
+        """
+        with self._lock:
+            if word is None:
+                cursor = self._db.execute("DELETE FROM prompts")
+            else:
+                cursor = self._db.execute("DELETE FROM prompts WHERE word = ?", (self.normalize_word(word),))
+            self._db.commit()
+            return cursor.rowcount
+
+    def purge_expired(self) -> int:
+        """删除所有过期条目，返回删除的条目数"""
+        if self.ttl_seconds is None:
+            return 0
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM prompts WHERE created < ?", (time.time() - self.ttl_seconds,))
+            self._db.commit()
+            return cursor.rowcount
+
+    def close(self):
+        """关闭数据库"""
+        with self._lock:
+            self._db.close()
+
+
+class CachedAudioGenerator:
+    """为语音生成器加上持久化缓存
+
+    缓存键由提供方、音色、语言、语速、采样率和文本等参数组成，
+    被包装的生成器需实现 generate() 和 get_voice_params()。
+    """
+
+    def __init__(self, generator, provider: str, cache: FileCache):
+        """
+        Args:
+            generator: 语音生成器实例（AudioGenerator、AudioGenerator_ali、MoyinAudioGenerator）
+            provider: 提供方名称
+            cache: 文件缓存
+        """
+        self.logger = get_logger(__name__)
+        self.generator = generator
+        self.provider = provider
+        self.cache = cache
+
+    def cache_key(self, text: str, language: str) -> str:
+        """计算语音的缓存键"""
+        return make_cache_key(
+            provider=self.provider,
+            language=language,
+            text=text,
+            **self.generator.get_voice_params(language)
+        )
+
+    def contains(self, text: str, language: str) -> bool:
+        """检查语音是否已缓存，不计入命中统计"""
+        return self.cache.peek(self.cache_key(text, language))
+
+    def fetch(self, text: str, language: str, output_path) -> bool:
+        """命中缓存时把缓存文件放到output_path，返回是否命中"""
+        if output_path and self.cache.get(self.cache_key(text, language), output_path) is not None:
+            self.logger.info(f"语音缓存命中({self.provider}): {text}")
+            return True
+        return False
+
+    def generate(self, text: str, type: str = "word", language: str = "en", output_path: str = None) -> str:
+        """生成语音，命中缓存时直接放置缓存文件，参数与被包装生成器一致"""
+        if self.fetch(text, language, output_path):
+            return str(output_path)
+        key = self.cache_key(text, language)
+
+        start_time = time.time()
+        audio_path = self.generator.generate(text, type, language, output_path=output_path)
+        self.cache.put(key, audio_path, meta={
+            'provider': self.provider,
+            'text': text,
+            'seconds': round(time.time() - start_time, 3),
+        })
+        return audio_path
+
+    async def generate_async(self, text: str, type: str = "word", language: str = "en", output_path: str = None,
+                             check_cache: bool = True) -> str:
+        """异步生成语音，被包装的生成器需实现 generate_async()；check_cache为False时跳过缓存查找
+
+        缓存的SQLite读写和文件复制在线程池中执行，不阻塞事件循环
+        """
+        loop = asyncio.get_running_loop()
+        if check_cache and await loop.run_in_executor(None, self.fetch, text, language, output_path):
+            return str(output_path)
+        key = self.cache_key(text, language)
+
+        start_time = time.time()
+        audio_path = await self.generator.generate_async(text, type, language, output_path=output_path)
+        await loop.run_in_executor(None, functools.partial(self.cache.put, key, audio_path, meta={
+            'provider': self.provider,
+            'text': text,
+            'seconds': round(time.time() - start_time, 3),
+        }))
+        return audio_path
@@ -0,0 +1,121 @@
+import functools
+import os
+import tempfile
+from pathlib import Path
+from typing import List, Tuple
+from modules.config import ConfigManager
+from modules.logger import get_logger
+
+# 未配置字体时依次尝试的常见中文字体
+DEFAULT_FONT_PATHS = (
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+    "/System/Library/Fonts/PingFang.ttc",
+    "C:/Windows/Fonts/msyh.ttc",
+)
+
+
+@functools.lru_cache(maxsize=64)
+def load_font(font_path: str, size: int):
+    """加载字体，同一字体和字号只解析一次；没有字体文件时使用Pillow内置字体"""
+    from PIL import ImageFont
+    if font_path:
+        return ImageFont.truetype(font_path, size)
+    return ImageFont.load_default(size)
+
+
+def find_font(font_path: str = None) -> str:
+    """返回配置的字体，未配置时返回找到的第一个常见中文字体，都没有时返回None"""
+    if font_path:
+        return font_path
+    for path in DEFAULT_FONT_PATHS:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+class CaptionCompositor:
+    """用Pillow把单词或短语的中英文预先绘制到静态图上
+
+    片段只有一帧画面，在图上绘制一次文字，再走静态图编码，
+    硬字幕的编码开销与无字幕相同，不需要FFmpeg逐帧渲染字幕。
+    字体对象和文字排版结果都有缓存，重复的文字和尺寸不再重新测量。
+    """
+
+    def __init__(self, height: int = 1080):
+        """
+        Args:
+            height: 输出图像的高度，与视频高度一致，编码前无需再次缩放
+        """
+        self.logger = get_logger(__name__)
+        self.config = ConfigManager().get_caption_config()
+        self.height = height
+        self.font_path = find_font(self.config.get('font_path'))
+        if self.font_path is None:
+            self.logger.warning("未找到中文字体，使用Pillow内置字体，中文可能无法显示；请配置 caption.font_path")
+        self._layout = functools.lru_cache(maxsize=int(self.config.get('layout_cache_size', 1024)))(self._compute_layout)
+
+    def _compute_layout(self, lines: Tuple[str, ...], width: int, height: int) -> List[tuple]:
+        """计算每行文字的字号和位置，返回 [(文字, 字号, 描边宽度, (x, y))]，文字底边贴近画面底部"""
+        from PIL import Image, ImageDraw
+        measure = ImageDraw.Draw(Image.new('RGB', (1, 1)))
+        max_width = width * (1 - 2 * self.config['side_margin_ratio'])
+        base_size = max(8, int(height * self.config['font_size_ratio']))
+
+        rows = []
+        for index, text in enumerate(lines):
+            # 第一行为主文字，其余行按比例缩小；过长时缩小字号直到放得下
+            size = base_size if index == 0 else max(8, int(base_size * self.config['secondary_scale']))
+            while True:
+                font = load_font(self.font_path, size)
+                stroke = max(1, int(size * self.config['stroke_ratio']))
+                left, top, right, bottom = measure.textbbox((0, 0), text, font=font, stroke_width=stroke)
+                if right - left <= max_width or size <= 8:
+                    break
+                size = max(8, int(size * max_width / (right - left)))
+            rows.append((text, size, stroke, (left, top, right, bottom)))
+
+        spacing = int(base_size * self.config['line_spacing'])
+        y = height * (1 - self.config['bottom_margin_ratio']) - sum(box[3] - box[1] for _, _, _, box in rows) \
+            - spacing * (len(rows) - 1)
+        layout = []
+        for text, size, stroke, (left, top, right, bottom) in rows:
+            x = (width - (right - left)) / 2 - left
+            layout.append((text, size, stroke, (int(round(x)), int(round(y - top)))))
+            y += bottom - top + spacing
+        return layout
+
+    def compose(self, image_path, lines: List[str], output_path=None) -> str:
+        """
+        在图像底部绘制文字
+
+        Args:
+            image_path: 原始图像路径
+            lines: 按从上到下顺序排列的文字，如 [word, word_zh]，空行忽略
+            output_path: 输出PNG路径，默认写入本地临时目录
+
+        Returns:
+            str: 绘制好文字、高度为视频高度的PNG路径
+        """
+        from PIL import Image, ImageDraw
+        lines = tuple(line for line in lines if line)
+        with Image.open(image_path) as image:
+            width = max(2, int(round(image.width * self.height / image.height / 2)) * 2)
+            frame = image.convert('RGB')
+            if frame.size != (width, self.height):
+                frame = frame.resize((width, self.height), Image.LANCZOS)
+
+        draw = ImageDraw.Draw(frame)
+        for text, size, stroke, position in self._layout(lines, width, self.height):
+            draw.text(position, text, font=load_font(self.font_path, size), fill=self.config['fill'],
+                      stroke_width=stroke, stroke_fill=self.config['stroke_fill'])
+
+        if output_path is None:
+            fd, output_path = tempfile.mkstemp(prefix='pictale-caption-', suffix='.png')
+            os.close(fd)
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        # 中间文件，压缩级别越低写入越快
+        frame.save(output_path, format='PNG', compress_level=1)
+        self.logger.debug(f"已绘制字幕: {' / '.join(lines)} -> {output_path}")
+        return str(output_path)
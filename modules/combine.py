@@ -0,0 +1,162 @@
+import asyncio
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+from modules.ffmpeg_pool import FFmpegError, FFmpegPool, get_ffmpeg_pool
+from modules.logger import get_logger
+
+
+def write_concat_list(list_path, paths: List[str]):
+    """写出FFmpeg concat分离器使用的文件列表"""
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for path in paths:
+            escaped = str(Path(path).resolve()).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+
+class IncrementalCombiner:
+    """边生成边合并的视频拼接
+
+    单词完成后立即按原顺序登记其片段，每凑满 fanout 个片段就在后台
+    以流复制方式合并成一个中间文件，中间文件凑满 fanout 个再合并到上一层。
+    所有单词结束时只剩每层不足 fanout 个文件，最后一次合并的输入很少，
+    成品在最后一个单词完成后很快就绪。
+    失败的单词只是不登记片段；某次中间合并失败时保留它的输入，不影响其他片段。
+    """
+
+    def __init__(self, output_path, work_dir=None, fanout: int = 16, pool: FFmpegPool = None):
+        """
+        Args:
+            output_path: 合并后的视频路径
+            work_dir: 中间文件目录，默认与输出文件同目录
+            fanout: 每次合并的片段数
+            pool: FFmpeg执行队列，默认使用共享队列
+        """
+        self.logger = get_logger(__name__)
+        self.output_path = Path(output_path)
+        self.work_dir = Path(work_dir) if work_dir else self.output_path.parent / "combine_parts"
+        self.fanout = max(2, int(fanout))
+        self.pool = pool
+        self.merges = 0
+        self._next_index = 0
+        self._waiting: Dict[int, Optional[List[str]]] = {}
+        # 每层的条目是合并任务，结果为片段路径列表；层数越高，内容在成片中越靠前
+        self._levels: List[List[asyncio.Future]] = []
+        self._intermediates = set()
+        self._counter = 0
+
+    def _get_pool(self) -> FFmpegPool:
+        return self.pool or get_ffmpeg_pool()
+
+    def add(self, index: int, paths: Optional[List[str]]):
+        """
+        登记一个单词的片段
+
+        Args:
+            index: 单词在批次中的序号，从0开始且不重复
+            paths: 该单词按播放顺序排列的视频片段，单词失败时为None
+        """
+        self._waiting[index] = paths
+        while self._next_index in self._waiting:
+            for path in self._waiting.pop(self._next_index) or []:
+                if path and os.path.exists(path):
+                    self._push(0, self._done([str(path)]))
+                elif path:
+                    self.logger.warning(f"视频片段不存在，合并时跳过: {path}")
+            self._next_index += 1
+
+    @staticmethod
+    def _done(paths: List[str]) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(paths)
+        return future
+
+    def _push(self, level: int, entry: asyncio.Future):
+        while len(self._levels) <= level:
+            self._levels.append([])
+        self._levels[level].append(entry)
+        if len(self._levels[level]) >= self.fanout:
+            group = self._levels[level][:self.fanout]
+            del self._levels[level][:self.fanout]
+            self._push(level + 1, asyncio.ensure_future(self._merge_group(group)))
+
+    async def _merge_group(self, group: List[asyncio.Future]) -> List[str]:
+        """合并一组条目，失败时返回原有输入"""
+        inputs = []
+        for entry in group:
+            inputs.extend(await entry)
+        if len(inputs) < 2:
+            return inputs
+        self._counter += 1
+        output = self.work_dir / f"part_{self._counter:05d}.mp4"
+        try:
+            await self._concat(inputs, output)
+        except FFmpegError as e:
+            self.logger.warning(f"中间合并失败，保留原片段: {e.stderr[-500:] or str(e)}")
+            return inputs
+        self._discard(inputs)
+        self._intermediates.add(str(output))
+        return [str(output)]
+
+    async def _concat(self, inputs: List[str], output: Path):
+        output.parent.mkdir(parents=True, exist_ok=True)
+        list_path = output.with_suffix('.txt')
+        write_concat_list(list_path, inputs)
+        try:
+            await self._get_pool().run([
+                'ffmpeg', '-y',
+                '-f', 'concat',
+                '-safe', '0',
+                '-i', str(list_path),
+                # 保留所有流，片段中封装的软字幕随视频一起合并
+                '-map', '0',
+                '-c', 'copy',
+                str(output)
+            ])
+            self.merges += 1
+        finally:
+            list_path.unlink(missing_ok=True)
+
+    def _discard(self, paths: List[str]):
+        """删除已合并进上一层的中间文件，单词自己的片段保留"""
+        for path in paths:
+            if path in self._intermediates:
+                self._intermediates.discard(path)
+                Path(path).unlink(missing_ok=True)
+
+    async def finish(self) -> Optional[str]:
+        """
+        等待后台合并完成并生成最终视频
+
+        Returns:
+            str: 合并后的视频路径，没有任何片段时返回None
+
+        Raises:
+            FFmpegError: 最终合并失败
+        """
+        if self._waiting:
+            # 没有登记的序号视为失败，之后的片段照常合并
+            self.logger.warning(f"有 {len(self._waiting)} 个单词在缺失序号之后完成，按顺序合并")
+            for index in sorted(self._waiting):
+                if index in self._waiting:
+                    self._next_index = index
+                    self.add(index, self._waiting.pop(index))
+
+        inputs = []
+        for level in reversed(self._levels):
+            for entry in level:
+                inputs.extend(await entry)
+        self._levels = []
+        if not inputs:
+            return None
+
+        try:
+            await self._concat(inputs, self.output_path)
+        finally:
+            self._discard(inputs)
+            try:
+                self.work_dir.rmdir()
+            except OSError:
+                pass
+        self.logger.info(f"已合并 {len(inputs)} 个文件（中间合并 {self.merges - 1} 次）: {self.output_path}")
+        return str(self.output_path)
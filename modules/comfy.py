@@ -0,0 +1,409 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+import requests
+import websocket
+from modules.logger import get_logger
+
+
+class ComfyExecutionError(Exception):
+    """ComfyUI执行工作流失败"""
+
+
+class ComfyEventDispatcher:
+    """ComfyUI WebSocket事件分发器
+
+    每个ComfyUI地址在进程内共享一个WebSocket连接，后台线程接收
+    执行事件并完成对应 prompt_id 的 Future。提交工作流时需使用
+    分发器的 client_id，服务端才会把执行事件推送到这个连接。
+    WebSocket不可用或期间重连过（可能漏掉事件）时，等待方才查询
+    /history/{prompt_id} 兜底；连接正常时只在最终超时前查询一次。
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    # 保留最近完成的prompt，应对注册等待前事件已到达的情况
+    MAX_FINISHED = 1024
+
+    @classmethod
+    def get(cls, base_url: str) -> "ComfyEventDispatcher":
+        """获取指定地址共享的分发器，首次调用时建立连接"""
+        with cls._instances_lock:
+            dispatcher = cls._instances.get(base_url)
+            if dispatcher is None:
+                dispatcher = cls(base_url)
+                cls._instances[base_url] = dispatcher
+        dispatcher.start()
+        return dispatcher
+
+    def __init__(self, base_url: str, history_interval: float = 5.0, reconnect_delay: float = 2.0):
+        """
+        Args:
+            base_url: ComfyUI HTTP地址
+            history_interval: WebSocket连接期间检查连接状态的间隔（秒），断开时按不超过0.5秒的间隔查询历史
+            reconnect_delay: WebSocket断开后重连的等待时间（秒）
+        """
+        self.logger = get_logger(__name__)
+        self.base_url = base_url.rstrip('/')
+        self.ws_url = self.base_url.replace('https://', 'wss://').replace('http://', 'ws://') + "/ws"
+        self.client_id = str(uuid.uuid4())
+        self.history_interval = history_interval
+        self.reconnect_delay = reconnect_delay
+        self.status_data = {}
+        self.queue_remaining = None
+        self.connected = False
+        # 每次建立连接加一，等待方据此发现期间发生过重连
+        self.connections = 0
+        self._futures = {}
+        self._finished = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = False
+        self._ws = None
+
+    def start(self):
+        """启动后台接收线程（幂等）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="comfy-ws", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止接收线程并关闭连接"""
+        self._stopped = True
+        if self._ws is not None:
+            try:
+                self._ws.close()
+            except Exception:
+                pass
+
+    def _run(self):
+        while not self._stopped:
+            try:
+                self._ws = websocket.create_connection(f"{self.ws_url}?clientId={self.client_id}")
+                self.connections += 1
+                self.connected = True
+                self.logger.debug(f"已连接ComfyUI WebSocket: {self.ws_url}")
+                while not self._stopped:
+                    message = self._ws.recv()
+                    # 二进制帧是预览图，忽略
+                    if isinstance(message, str):
+                        self._handle(json.loads(message))
+            except Exception as e:
+                if not self._stopped:
+                    self.logger.warning(f"ComfyUI WebSocket连接中断，{self.reconnect_delay}秒后重连: {str(e)}")
+            finally:
+                self.connected = False
+                if self._ws is not None:
+                    try:
+                        self._ws.close()
+                    except Exception:
+                        pass
+            if not self._stopped:
+                time.sleep(self.reconnect_delay)
+
+    def _handle(self, message: dict):
+        """处理一条WebSocket事件"""
+        msg_type = message.get('type')
+        data = message.get('data') or {}
+        if msg_type == 'status':
+            self.status_data = data
+            exec_info = (data.get('status') or {}).get('exec_info') or data.get('exec_info') or {}
+            if 'queue_remaining' in exec_info:
+                self.queue_remaining = exec_info['queue_remaining']
+        elif msg_type == 'executing':
+            # node为空表示整个prompt执行结束
+            if data.get('node') is None and data.get('prompt_id'):
+                self._resolve(data['prompt_id'])
+        elif msg_type == 'execution_success':
+            self._resolve(data.get('prompt_id'))
+        elif msg_type in ('execution_error', 'execution_interrupted'):
+            error = data.get('exception_message') or msg_type
+            self._resolve(data.get('prompt_id'), error=error)
+
+    def _resolve(self, prompt_id: str, error: str = None):
+        if not prompt_id:
+            return
+        with self._lock:
+            self._finished[prompt_id] = error
+            while len(self._finished) > self.MAX_FINISHED:
+                self._finished.popitem(last=False)
+            future = self._futures.pop(prompt_id, None)
+        if future is not None and not future.done():
+            if error:
+                future.set_exception(ComfyExecutionError(error))
+            else:
+                future.set_result(prompt_id)
+
+    def watch(self, prompt_id: str) -> Future:
+        """
+        获取prompt执行完成的Future
+
+        Returns:
+            Future: 执行成功时结果为prompt_id，失败时抛出ComfyExecutionError
+        """
+        with self._lock:
+            if prompt_id in self._finished:
+                future = Future()
+                error = self._finished[prompt_id]
+                if error:
+                    future.set_exception(ComfyExecutionError(error))
+                else:
+                    future.set_result(prompt_id)
+                return future
+            future = self._futures.get(prompt_id)
+            if future is None or future.cancelled():
+                future = Future()
+                self._futures[prompt_id] = future
+            return future
+
+    def fetch_history(self, prompt_id: str) -> dict:
+        """查询单个prompt的历史记录，未完成时返回None"""
+        response = requests.get(f"{self.base_url}/history/{prompt_id}", timeout=30)
+        if response.status_code != 200:
+            return None
+        return response.json().get(prompt_id)
+
+    def _check_history(self, prompt_id: str) -> bool:
+        """兜底检查prompt是否已完成，完成时同时完成对应Future"""
+        try:
+            entry = self.fetch_history(prompt_id)
+        except Exception as e:
+            self.logger.debug(f"查询执行历史失败: {str(e)}")
+            return False
+        if entry is None:
+            return False
+        status = entry.get('status') or {}
+        error = 'execution_error' if status.get('status_str') == 'error' else None
+        self._resolve(prompt_id, error=error)
+        return True
+
+    def _history_needed(self, connections: int) -> bool:
+        """WebSocket当前断开，或自connections记录以来重连过时，事件可能丢失，需要查询历史"""
+        return not self.connected or self.connections != connections
+
+    def _poll_interval(self) -> float:
+        return self.history_interval if self.connected else min(self.history_interval, 0.5)
+
+    def _final_check(self, prompt_id: str) -> bool:
+        """超时前最后查询一次历史，执行成功返回True，失败抛出ComfyExecutionError"""
+        if not self._check_history(prompt_id):
+            return False
+        self.watch(prompt_id).result()
+        return True
+
+    def wait(self, prompt_id: str, timeout: float) -> bool:
+        """
+        阻塞等待prompt执行完成
+
+        Returns:
+            bool: 执行成功返回True，超时返回False；执行失败抛出ComfyExecutionError
+        """
+        future = self.watch(prompt_id)
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return self._final_check(prompt_id)
+            connections = self.connections
+            try:
+                future.result(timeout=min(self._poll_interval(), remaining))
+                return True
+            except FutureTimeoutError:
+                # 连接正常时事件由WebSocket推送，不轮询历史
+                if self._history_needed(connections):
+                    self._check_history(prompt_id)
+
+    async def wait_async(self, prompt_id: str, timeout: float) -> bool:
+        """
+        异步等待prompt执行完成，语义与wait相同
+        """
+        future = asyncio.wrap_future(self.watch(prompt_id))
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return await loop.run_in_executor(None, self._final_check, prompt_id)
+            connections = self.connections
+            try:
+                await asyncio.wait_for(asyncio.shield(future), timeout=min(self._poll_interval(), remaining))
+                return True
+            except asyncio.TimeoutError:
+                if self._history_needed(connections):
+                    await loop.run_in_executor(None, self._check_history, prompt_id)
+
+def get_backend_urls(comfy_config: dict) -> list:
+    """从comfyui配置中读取后端地址列表，api_urls优先，api_url也可以是列表"""
+    urls = comfy_config.get('api_urls') or comfy_config.get('api_url') or 'http://127.0.0.1:8188'
+    if isinstance(urls, str):
+        urls = [urls]
+    return [url.rstrip('/') for url in urls]
+
+
+class ComfyBackend:
+    """单个ComfyUI后端的负载和健康状态"""
+
+    def __init__(self, base_url: str, dispatcher: ComfyEventDispatcher = None):
+        """
+        Args:
+            base_url: ComfyUI HTTP地址
+            dispatcher: 事件分发器，默认使用该地址共享的分发器
+        """
+        self.base_url = base_url.rstrip('/')
+        self._dispatcher = dispatcher
+        self.inflight = 0
+        self.latency = None
+        self.completed = 0
+        self.failures = 0
+        self.down_until = 0.0
+        self.last_finished = 0.0
+
+    @property
+    def dispatcher(self) -> ComfyEventDispatcher:
+        if self._dispatcher is None:
+            self._dispatcher = ComfyEventDispatcher.get(self.base_url)
+        return self._dispatcher
+
+    @property
+    def queue_remaining(self) -> int:
+        """服务端上报的队列长度，尚未收到时以本进程的在途数量代替"""
+        queue_remaining = self.dispatcher.queue_remaining
+        return self.inflight if queue_remaining is None else max(queue_remaining, self.inflight)
+
+    def is_available(self, now: float = None) -> bool:
+        """是否处于可用状态（未被摘除）"""
+        return (now or time.time()) >= self.down_until
+
+    def load(self, default_latency: float) -> float:
+        """估算新任务在该后端上的完成时间，用于选择后端"""
+        latency = self.latency if self.latency is not None else default_latency
+        return (self.queue_remaining + 1) * latency
+
+
+class ComfyBackendPool:
+    """多个ComfyUI后端组成的负载均衡池
+
+    新任务路由到预计完成时间最短的后端（队列长度 × 平均耗时），
+    连续失败的后端会被暂时摘除，冷却后再重新参与调度。
+    """
+
+    def __init__(self, urls, max_failures: int = 3, cooldown: float = 60.0, latency_alpha: float = 0.3):
+        """
+        Args:
+            urls: ComfyUI地址或地址列表
+            max_failures: 连续失败多少次后摘除后端
+            cooldown: 摘除后的冷却时间（秒）
+            latency_alpha: 平均耗时的指数平滑系数
+        """
+        self.logger = get_logger(__name__)
+        if isinstance(urls, str):
+            urls = [urls]
+        if not urls:
+            raise ValueError("至少需要配置一个ComfyUI地址")
+        self.backends = [url if isinstance(url, ComfyBackend) else ComfyBackend(url) for url in urls]
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.latency_alpha = latency_alpha
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.backends)
+
+    def get(self, base_url: str) -> ComfyBackend:
+        """按地址查找后端，不存在时返回None"""
+        base_url = base_url.rstrip('/')
+        for backend in self.backends:
+            if backend.base_url == base_url:
+                return backend
+        return None
+
+    def _default_latency(self) -> float:
+        known = [backend.latency for backend in self.backends if backend.latency is not None]
+        return sum(known) / len(known) if known else 1.0
+
+    def _pick(self, max_queue: int = None) -> ComfyBackend:
+        now = time.time()
+        candidates = [backend for backend in self.backends if backend.is_available(now)]
+        if not candidates:
+            # 全部被摘除时，选择最早恢复的后端继续尝试
+            candidates = [min(self.backends, key=lambda backend: backend.down_until)]
+        if max_queue is not None:
+            # 本进程在该后端没有在途任务时总是允许提交，避免被其他客户端的队列饿死
+            candidates = [
+                backend for backend in candidates
+                if backend.inflight == 0 or backend.queue_remaining < max_queue
+            ]
+        if not candidates:
+            return None
+        default_latency = self._default_latency()
+        return min(candidates, key=lambda backend: (backend.load(default_latency), backend.inflight))
+
+    def pick(self, max_queue: int = None) -> ComfyBackend:
+        """
+        选择负载最低的可用后端
+
+        Args:
+            max_queue: 单个后端的目标队列长度，所有后端都达到上限时返回None
+
+        Returns:
+            ComfyBackend: 选中的后端
+        """
+        with self._lock:
+            return self._pick(max_queue)
+
+    def acquire(self, max_queue: int = None) -> ComfyBackend:
+        """选择后端并记为在途，无可用后端时返回None"""
+        with self._lock:
+            backend = self._pick(max_queue)
+            if backend is not None:
+                backend.inflight += 1
+            return backend
+
+    def release(self, backend: ComfyBackend, started: float = None, ok: bool = True):
+        """
+        任务结束后更新后端状态
+
+        Args:
+            backend: 执行任务的后端
+            started: 提交时间，成功时用于更新平均耗时
+            ok: 是否执行成功
+        """
+        with self._lock:
+            now = time.time()
+            backend.inflight = max(0, backend.inflight - 1)
+            if ok:
+                backend.failures = 0
+                backend.completed += 1
+                if started is not None:
+                    # 排在本进程前一个任务之后时，只计算上一个任务完成后的耗时
+                    seconds = now - max(started, backend.last_finished)
+                    if backend.latency is None:
+                        backend.latency = seconds
+                    else:
+                        backend.latency = self.latency_alpha * seconds + (1 - self.latency_alpha) * backend.latency
+                backend.last_finished = now
+                return
+            backend.failures += 1
+            if backend.failures >= self.max_failures:
+                backend.down_until = now + self.cooldown
+                backend.failures = 0
+                self.logger.warning(f"ComfyUI后端 {backend.base_url} 连续失败 {self.max_failures} 次，暂停调度 {self.cooldown} 秒")
+
+    def stats(self) -> list:
+        """各后端的调度统计"""
+        now = time.time()
+        return [{
+            'url': backend.base_url,
+            'inflight': backend.inflight,
+            'completed': backend.completed,
+            'latency': backend.latency,
+            'available': backend.is_available(now),
+        } for backend in self.backends]
@@ -126,3 +126,67 @@ class ConfigManager:
     def get_aliyun_config(self) -> Dict[str, Any]:
         """获取阿里云配置"""
         return self.settings['aliyun']
+
+    # 本地缓存相关配置
+    def get_cache_config(self) -> Dict[str, Any]:
+        """获取本地缓存配置"""
+        cache_config = {
+            'enabled': True,
+            'dir': str(Path(__file__).parent.parent / 'cache'),
+            'audio_max_mb': 1024,
+            'image_max_mb': 2048,
+            'prompt_ttl_hours': 720,
+        }
+        cache_config.update(self.settings.get('cache') or {})
+        return cache_config
+
+    # 语音服务路由相关配置
+    def get_tts_config(self) -> Dict[str, Any]:
+        """获取语音服务路由配置"""
+        tts_config = {
+            'providers': {
+                'zh': ['tencent', 'ali', 'moyin'],
+                'en': ['ali', 'tencent', 'moyin'],
+            },
+            'hedge_delay': 2.0,
+            'latency_window': 100,
+            'default_latency': 1.0,
+            'max_error_rate': 0.5,
+        }
+        tts_config.update(self.settings.get('tts') or {})
+        return tts_config
+
+    # 硬字幕相关配置
+    def get_caption_config(self) -> Dict[str, Any]:
+        """获取静态图字幕（硬字幕）配置"""
+        caption_config = {
+            'enabled': False,
+            'font_path': None,
+            'font_size_ratio': 0.08,
+            'secondary_scale': 0.75,
+            'line_spacing': 0.25,
+            'bottom_margin_ratio': 0.08,
+            'side_margin_ratio': 0.05,
+            'fill': '#FFFFFF',
+            'stroke_fill': '#000000',
+            'stroke_ratio': 0.08,
+            'layout_cache_size': 1024,
+        }
+        caption_config.update(self.settings.get('caption') or {})
+        return caption_config
+
+    # 批量流水线相关配置
+    def get_pipeline_config(self) -> Dict[str, Any]:
+        """获取批量流水线配置"""
+        pipeline_config = {
+            'jobs': 1,
+            'max_inflight_per_stage': 2,
+            'stage_workers': {},
+            'provider_concurrency': {
+                'tencent': 4,
+                'ali': 4,
+                'moyin': 4,
+            },
+        }
+        pipeline_config.update(self.settings.get('pipeline') or {})
+        return pipeline_config
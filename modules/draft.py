@@ -4,9 +4,16 @@ import pyJianYingDraft as draft
 from pyJianYingDraft import Script_file
 from pathlib import Path
 from modules.config import ConfigManager
+from modules.duration import get_duration_service
 from modules.logger import get_logger
 
 class DraftGenerator:
+    # 片段时间安排（毫秒）
+    AUDIO_LEAD = 500       # 图片出现后开始播放英文音频
+    AUDIO_GAP = 300        # 英文和中文音频之间的间隔
+    AUDIO_TAIL = 500       # 中文音频结束后图片继续停留
+    MIN_IMAGE_DURATION = 3000
+
     def __init__(self):
         self.logger = get_logger(__name__)
         self.config_manager = ConfigManager()
@@ -102,6 +109,13 @@ class DraftGenerator:
             # 第二步：按轨道组织内容
             self.logger.info("组织轨道内容...")
             current_time = 0  # 当前时间位置 (毫秒)
+
+            # 一次性读取所有音频的实际时长
+            durations = get_duration_service().get_durations([
+                word_result[key] for word_result in word_results_list
+                for key in ('word_audio_path', 'word_zh_audio_path', 'phrase_audio_path', 'phrase_zh_audio_path')
+                if word_result.get(key) in resource_map
+            ])
             
             for index, word_result in enumerate(word_results_list):
                 word = word_result.get('word', f'Word_{index}')
@@ -113,8 +127,11 @@ class DraftGenerator:
                 word_img_id = resource_map.get(word_result.get('word_image_path'))
                 phrase_img_id = resource_map.get(word_result.get('phrase_image_path'))
                 
-                word_img_duration = 3000  # 单词图片持续3秒
-                phrase_img_duration = 3000  # 短语图片持续3秒
+                # 图片持续到中文音频结束后再停留一会，至少3秒
+                word_timing = self._plan_audio(durations, word_result.get('word_audio_path'), word_result.get('word_zh_audio_path'))
+                phrase_timing = self._plan_audio(durations, word_result.get('phrase_audio_path'), word_result.get('phrase_zh_audio_path'))
+                word_img_duration = word_timing['image']
+                phrase_img_duration = phrase_timing['image']
                 
                 if word_img_id:
                     new_draft.addImageClip(word_img_id, current_time, word_img_duration)
@@ -129,36 +146,32 @@ class DraftGenerator:
                 word_en_audio_id = resource_map.get(word_result.get('word_audio_path'))
                 phrase_en_audio_id = resource_map.get(word_result.get('phrase_audio_path'))
                 
-                if word_en_audio_id:
+                if word_en_audio_id and word_timing['en']:
                     # 单词英文音频在单词图片开始后0.5秒播放
-                    word_audio_start = current_time + 500
-                    word_audio_duration = 2000  # 预设2秒
-                    new_draft.addAudioClip(word_en_audio_id, word_audio_start, word_audio_duration)
+                    word_audio_start = current_time + word_timing['en'][0]
+                    new_draft.addAudioClip(word_en_audio_id, word_audio_start, word_timing['en'][1])
                     self.logger.debug(f"添加单词英文音频: {word} 从 {word_audio_start}ms 开始")
                 
-                if phrase_en_audio_id:
+                if phrase_en_audio_id and phrase_timing['en']:
                     # 短语英文音频在短语图片开始后0.5秒播放
-                    phrase_audio_start = current_time + word_img_duration + 500
-                    phrase_audio_duration = 2000  # 预设2秒
-                    new_draft.addAudioClip(phrase_en_audio_id, phrase_audio_start, phrase_audio_duration)
+                    phrase_audio_start = current_time + word_img_duration + phrase_timing['en'][0]
+                    new_draft.addAudioClip(phrase_en_audio_id, phrase_audio_start, phrase_timing['en'][1])
                     self.logger.debug(f"添加短语英文音频: {phrase} 从 {phrase_audio_start}ms 开始")
                 
                 # 轨道3：中文音频轨道 - 单词中文 + 短语中文
                 word_zh_audio_id = resource_map.get(word_result.get('word_zh_audio_path'))
                 phrase_zh_audio_id = resource_map.get(word_result.get('phrase_zh_audio_path'))
                 
-                if word_zh_audio_id:
+                if word_zh_audio_id and word_timing['zh']:
                     # 单词中文音频在单词英文音频结束后0.3秒播放
-                    word_zh_audio_start = current_time + 500 + 2000 + 300
-                    word_zh_audio_duration = 1500  # 预设1.5秒
-                    new_draft.addAudioClip(word_zh_audio_id, word_zh_audio_start, word_zh_audio_duration)
+                    word_zh_audio_start = current_time + word_timing['zh'][0]
+                    new_draft.addAudioClip(word_zh_audio_id, word_zh_audio_start, word_timing['zh'][1])
                     self.logger.debug(f"添加单词中文音频: {word_result.get('word_zh')} 从 {word_zh_audio_start}ms 开始")
                 
-                if phrase_zh_audio_id:
+                if phrase_zh_audio_id and phrase_timing['zh']:
                     # 短语中文音频在短语英文音频结束后0.3秒播放
-                    phrase_zh_audio_start = current_time + word_img_duration + 500 + 2000 + 300
-                    phrase_zh_audio_duration = 1500  # 预设1.5秒
-                    new_draft.addAudioClip(phrase_zh_audio_id, phrase_zh_audio_start, phrase_zh_audio_duration)
+                    phrase_zh_audio_start = current_time + word_img_duration + phrase_timing['zh'][0]
+                    new_draft.addAudioClip(phrase_zh_audio_id, phrase_zh_audio_start, phrase_timing['zh'][1])
                     self.logger.debug(f"添加短语中文音频: {word_result.get('phrase_zh')} 从 {phrase_zh_audio_start}ms 开始")
                 
                 # 添加文本字幕
@@ -212,7 +225,7 @@ class DraftGenerator:
                     }
                     new_draft.addTextClip(phrase_start_time, phrase_img_duration, phrase_zh_text_params)
                 
-                # 更新时间位置（单词3秒 + 短语3秒 + 间隔1秒）
+                # 更新时间位置（单词 + 短语 + 间隔1秒）
                 current_time += word_img_duration + phrase_img_duration + 1000
             
             # 保存草稿文件
@@ -225,6 +238,30 @@ class DraftGenerator:
             self.logger.error(f"生成剪映草稿时出错: {str(e)}")
             raise Exception(f"Error generating JianYing draft: {str(e)}")
     
+    def _plan_audio(self, durations, audio_path, audio_zh_path):
+        """
+        按实际音频时长安排一组图片内的英文和中文音频
+
+        Returns:
+            dict: en/zh 为相对图片开始的 (开始毫秒, 时长毫秒)，无音频或无法获取时长时为None；
+                  image 为图片持续时间（毫秒）
+        """
+        timing = {'en': None, 'zh': None}
+        position = self.AUDIO_LEAD
+        for key, path in (('en', audio_path), ('zh', audio_zh_path)):
+            if not path:
+                continue
+            path = str(path)
+            if path not in durations:
+                self.logger.warning(f"无法获取音频时长，跳过该片段: {path}")
+                continue
+            length = int(round(durations[path] * 1000))
+            timing[key] = (position, length)
+            position += length + self.AUDIO_GAP
+        end = max((start + length for start, length in filter(None, timing.values())), default=0)
+        timing['image'] = max(self.MIN_IMAGE_DURATION, end + self.AUDIO_TAIL)
+        return timing
+
     def generate_from_results(self, process_results, output_path=None):
         """
         从处理结果直接生成剪映草稿
@@ -0,0 +1,195 @@
+import mmap
+import os
+import re
+import subprocess
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+from modules.audio_mix import WavFormatError, read_wav_info
+from modules.logger import get_logger
+
+# ADTS头中的采样率索引
+ADTS_SAMPLE_RATES = [96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050,
+                     16000, 12000, 11025, 8000, 7350]
+
+DURATION_PATTERN = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+
+
+class DurationError(Exception):
+    """无法获取媒体时长"""
+
+
+def wav_duration(path) -> float:
+    """根据WAV文件头计算时长"""
+    return read_wav_info(path, pcm_only=False).duration
+
+
+def adts_duration(path) -> float:
+    """
+    遍历ADTS帧头计算AAC时长，每帧1024个采样
+
+    Raises:
+        DurationError: 不是ADTS格式
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise DurationError(f"空文件: {path}")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            size = len(data)
+            pos = 0
+            # 跳过ID3v2标签
+            if data[:3] == b'ID3' and size >= 10:
+                pos = 10 + ((data[6] & 0x7F) << 21 | (data[7] & 0x7F) << 14 | (data[8] & 0x7F) << 7 | (data[9] & 0x7F))
+            samples = 0
+            sample_rate = None
+            while pos + 7 <= size:
+                if data[pos] != 0xFF or (data[pos + 1] & 0xF6) != 0xF0:
+                    break
+                rate_index = (data[pos + 2] >> 2) & 0x0F
+                frame_length = ((data[pos + 3] & 0x03) << 11) | (data[pos + 4] << 3) | (data[pos + 5] >> 5)
+                if rate_index >= len(ADTS_SAMPLE_RATES) or frame_length < 7:
+                    break
+                sample_rate = ADTS_SAMPLE_RATES[rate_index]
+                samples += 1024 * ((data[pos + 6] & 0x03) + 1)
+                pos += frame_length
+    if sample_rate is None:
+        raise DurationError(f"不是ADTS格式的AAC文件: {path}")
+    return samples / sample_rate
+
+
+class DurationService:
+    """音频时长查询
+
+    WAV和ADTS AAC直接解析文件头，其他格式合并为一次FFmpeg调用探测。
+    结果按路径、修改时间和大小缓存，文件被重新生成后自动失效。
+    """
+
+    def __init__(self, ffmpeg_path: str = 'ffmpeg'):
+        """
+        Args:
+            ffmpeg_path: 探测未知格式使用的FFmpeg可执行文件
+        """
+        self.logger = get_logger(__name__)
+        self.ffmpeg_path = ffmpeg_path
+        self._memo = {}
+        self._lock = threading.Lock()
+        self.probes = 0
+
+    @staticmethod
+    def _signature(path: str):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _lookup(self, path: str, signature) -> Optional[float]:
+        with self._lock:
+            entry = self._memo.get(path)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+        return None
+
+    def _remember(self, path: str, signature, duration: float):
+        with self._lock:
+            self._memo[path] = (signature, duration)
+
+    def _parse_header(self, path: str) -> Optional[float]:
+        """按文件头解析时长，未知格式返回None"""
+        suffix = Path(path).suffix.lower()
+        parsers = [wav_duration, adts_duration]
+        if suffix in ('.aac', '.adts'):
+            parsers.reverse()
+        for parser in parsers:
+            try:
+                return parser(path)
+            except (WavFormatError, DurationError, ValueError):
+                continue
+        return None
+
+    def _probe(self, paths: List[str]) -> Dict[str, float]:
+        """
+        一次FFmpeg调用探测多个文件的时长
+
+        FFmpeg遇到无法打开的输入会中止，之后的输入另起一次调用继续探测。
+        """
+        durations = {}
+        pending = list(paths)
+        while pending:
+            command = [self.ffmpeg_path, '-hide_banner', '-nostdin']
+            for path in pending:
+                command.extend(['-i', path])
+            self.probes += 1
+            try:
+                result = subprocess.run(command, capture_output=True, text=True, errors='replace', timeout=60)
+            except (OSError, subprocess.TimeoutExpired) as e:
+                self.logger.warning(f"FFmpeg探测时长失败: {str(e)}")
+                break
+            # 每个输入的信息以 "Input #n" 开头，没有输出文件时FFmpeg报错退出，这里只解析输入信息
+            blocks = re.split(r"^Input #(\d+)", result.stderr, flags=re.MULTILINE)
+            parsed = 0
+            for index, block in zip(blocks[1::2], blocks[2::2]):
+                match = DURATION_PATTERN.search(block)
+                if match:
+                    hours, minutes, seconds = match.groups()
+                    durations[pending[int(index)]] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+                parsed = max(parsed, int(index) + 1)
+            # 第parsed个输入导致FFmpeg中止，跳过它继续
+            pending = pending[parsed + 1:]
+        return durations
+
+    def get_durations(self, paths: list) -> Dict[str, float]:
+        """
+        批量获取音频时长
+
+        Args:
+            paths: 音频文件路径列表
+
+        Returns:
+            dict: 路径到时长（秒）的映射，无法获取的路径不在结果中
+        """
+        durations = {}
+        unknown = {}
+        for path in dict.fromkeys(str(path) for path in paths):
+            try:
+                signature = self._signature(path)
+            except OSError:
+                self.logger.warning(f"音频文件不存在: {path}")
+                continue
+            duration = self._lookup(path, signature)
+            if duration is None:
+                duration = self._parse_header(path)
+                if duration is not None:
+                    self._remember(path, signature, duration)
+            if duration is None:
+                unknown[path] = signature
+            else:
+                durations[path] = duration
+
+        if unknown:
+            for path, duration in self._probe(list(unknown)).items():
+                self._remember(path, unknown[path], duration)
+                durations[path] = duration
+        return durations
+
+    def get_duration(self, path) -> float:
+        """
+        获取单个音频的时长（秒）
+
+        Raises:
+            DurationError: 无法获取时长
+        """
+        duration = self.get_durations([path]).get(str(path))
+        if duration is None:
+            raise DurationError(f"无法获取音频时长: {path}")
+        return duration
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_duration_service() -> DurationService:
+    """获取进程内共享的时长查询服务"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = DurationService()
+        return _service
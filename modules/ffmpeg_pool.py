@@ -0,0 +1,149 @@
+import asyncio
+import os
+import threading
+from typing import List
+from modules.config import ConfigManager
+from modules.logger import get_logger
+
+
+class FFmpegError(Exception):
+    """FFmpeg执行失败或超时"""
+
+    def __init__(self, message: str, returncode: int = None, stderr: str = ""):
+        super().__init__(message)
+        self.returncode = returncode
+        self.stderr = stderr
+
+
+def available_cores() -> int:
+    """当前进程可用的CPU核数"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def with_thread_limit(command: List[str], threads: int) -> List[str]:
+    """
+    为FFmpeg命令加上线程数限制
+
+    -filter_threads 作为全局选项放在最前，-threads 放在最后一个输入之后，
+    作用于第一个输出的编码器。命令中已指定 -threads 或不是FFmpeg命令时不做修改。
+    """
+    if '-threads' in command or not os.path.basename(command[0]).startswith('ffmpeg'):
+        return list(command)
+    command = list(command)
+    command[1:1] = ['-filter_threads', str(threads)]
+    last_input = max((i for i, arg in enumerate(command) if arg == '-i'), default=None)
+    position = last_input + 2 if last_input is not None else 1
+    command[position:position] = ['-threads', str(threads)]
+    return command
+
+
+class FFmpegPool:
+    """异步FFmpeg编码调度
+
+    所有单词的编码任务排在同一个队列里（先到先得），同时运行的进程数
+    按CPU核数确定，每个进程限制线程数，避免多个编码抢占同一批核心。
+    进程通过 asyncio.create_subprocess_exec 启动，不阻塞事件循环；
+    任务被取消或超时时终止对应的FFmpeg进程。
+    """
+
+    def __init__(self, workers: int = None, threads_per_job: int = None, timeout: float = None):
+        """
+        Args:
+            workers: 同时运行的FFmpeg进程数，默认为CPU核数的一半
+            threads_per_job: 每个进程的线程数，默认平分CPU核数
+            timeout: 单个任务的默认超时时间（秒），None表示不限制
+        """
+        self.logger = get_logger(__name__)
+        cores = available_cores()
+        self.workers = max(1, int(workers) if workers else cores // 2)
+        self.threads_per_job = max(1, int(threads_per_job) if threads_per_job else cores // self.workers)
+        self.timeout = timeout
+        self.running = 0
+        self.completed = 0
+        self._semaphore = None
+        self._loop = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.workers)
+            self._loop = loop
+        return self._semaphore
+
+    async def run(self, command: List[str], timeout: float = None, input: bytes = None) -> str:
+        """
+        排队执行一条FFmpeg命令
+
+        Args:
+            command: FFmpeg命令参数，第一个元素为可执行文件
+            timeout: 超时时间（秒），默认使用池的设置；排队时间不计入
+            input: 通过标准输入（pipe:0）传给FFmpeg的数据
+
+        Returns:
+            str: FFmpeg的标准错误输出
+
+        Raises:
+            FFmpegError: 进程返回非零或超时
+        """
+        timeout = self.timeout if timeout is None else timeout
+        command = with_thread_limit(command, self.threads_per_job)
+        async with self._get_semaphore():
+            self.running += 1
+            try:
+                return await self._execute(command, timeout, input)
+            finally:
+                self.running -= 1
+                self.completed += 1
+
+    async def _execute(self, command: List[str], timeout: float, input: bytes = None) -> str:
+        self.logger.debug(f"FFmpeg命令: {' '.join(command)}")
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdin=asyncio.subprocess.DEVNULL if input is None else asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            _, stderr = await asyncio.wait_for(process.communicate(input), timeout=timeout)
+        except asyncio.TimeoutError:
+            await self._kill(process)
+            raise FFmpegError(f"FFmpeg执行超时（{timeout}秒）: {command[-1]}")
+        except asyncio.CancelledError:
+            await self._kill(process)
+            raise
+
+        stderr = stderr.decode(errors='replace')
+        if process.returncode != 0:
+            raise FFmpegError(f"FFmpeg执行失败（返回码 {process.returncode}）: {stderr[-2000:]}",
+                              returncode=process.returncode, stderr=stderr)
+        return stderr
+
+    async def _kill(self, process):
+        """终止进程并回收，避免留下僵尸进程"""
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+        await process.wait()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_ffmpeg_pool() -> FFmpegPool:
+    """获取进程内共享的FFmpeg编码调度，按 ffmpeg 配置确定并发数"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            ffmpeg_config = ConfigManager().get_ffmpeg_config()
+            _pool = FFmpegPool(
+                workers=ffmpeg_config.get('workers'),
+                threads_per_job=ffmpeg_config.get('threads_per_job'),
+                timeout=ffmpeg_config.get('timeout')
+            )
+        return _pool
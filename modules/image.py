@@ -1,37 +1,60 @@
 import requests
 import time
 import json
+import copy
+import hashlib
 import base64
 from io import BytesIO
 from PIL import Image
 import os
 import random
 from pathlib import Path
-import websocket
+import asyncio
 import threading
-import uuid
+from modules.cache import FileCache, make_cache_key
+from modules.comfy import ComfyBackend, ComfyBackendPool, ComfyEventDispatcher, ComfyExecutionError, get_backend_urls
 from modules.config import ConfigManager
 from modules.logger import get_logger
 
+# 带有随机种子输入的采样节点
+SAMPLER_SEED_INPUTS = {
+    'KSampler': 'seed',
+    'KSamplerAdvanced': 'noise_seed',
+    'SamplerCustom': 'noise_seed',
+    'RandomNoise': 'noise_seed',
+}
+
 class ImageGenerator:
-    def __init__(self):
+    def __init__(self, cache: FileCache = None):
+        """
+        Args:
+            cache: 图像缓存，相同提示词、种子和工作流的图像直接复用
+        """
         self.logger = get_logger(__name__)
         self.config_manager = ConfigManager()
         self.comfy_config = self.config_manager.get_comfy_config()
         self.output_dir = self.config_manager.get_output_base_dir()
         
-        # ComfyUI API连接信息
-        self.base_url = self.comfy_config.get('api_url', 'http://127.0.0.1:8188')
-        self.ws_url = self.base_url.replace('http://', 'ws://') + "/ws"
+        # ComfyUI API连接信息，配置多个地址时按负载分配任务
+        self.backend_pool = ComfyBackendPool(
+            get_backend_urls(self.comfy_config),
+            max_failures=int(self.comfy_config.get('backend_max_failures', 3)),
+            cooldown=float(self.comfy_config.get('backend_cooldown', 60))
+        )
+        self.base_url = self.backend_pool.backends[0].base_url
         
-        # 初始化客户端ID和工作流属性
-        self.client_id = str(uuid.uuid4())
+        # 初始化工作流属性，WebSocket连接由同地址的所有实例共享
         self.workflow = None
         self.workflow_cache = {}
+        self.workflow_lock = threading.Lock()
         self.is_model_loaded = False
-        self.status_data = {}
-        self.ws = None
         self.prompt_id = None
+        self.cache = cache
+        self.gpu_seconds_saved = 0.0
+
+        # 异步批量提交时每个后端保持的服务端队列深度
+        self.target_queue_depth = max(1, int(self.comfy_config.get('target_queue_depth', 2)))
+        self._depth_gate = None
         
         # 如果配置了预热模式，则在初始化时加载模型
         if self.comfy_config.get('preload_model', True):
@@ -40,13 +63,10 @@ class ImageGenerator:
     def _preload_workflow(self):
         """预加载工作流和模型"""
         try:
-            # 连接WebSocket以获取状态更新
-            self._connect_websocket()
-            
             # 加载工作流
             workflow_path = self.comfy_config.get('workflow_file')
             if workflow_path and os.path.exists(workflow_path):
-                self.workflow = self._load_workflow_from_file(workflow_path, "placeholder prompt")
+                self.workflow = self._load_workflow_from_file(workflow_path)
             
             # 提取模型信息，创建只包含模型加载部分的工作流
             model_nodes = {}
@@ -56,94 +76,331 @@ class ImageGenerator:
             
             if model_nodes:
                 self.logger.info("正在预加载模型，这可能需要一些时间...")
-                # 只提交模型加载部分
-                prompt_id = self._submit_workflow(self.base_url, model_nodes)
-                if prompt_id:
-                    # 等待模型加载完成
-                    self._wait_for_execution(prompt_id)
-                    self.is_model_loaded = True
+                # 只提交模型加载部分，每个后端各自加载
+                for backend in self.backend_pool.backends:
+                    prompt_id = self._submit_workflow(backend.base_url, model_nodes)
+                    if prompt_id:
+                        # 等待模型加载完成
+                        self._wait_for_execution(prompt_id, base_url=backend.base_url)
+                        self.is_model_loaded = True
+                if self.is_model_loaded:
                     self.logger.info("模型预加载完成，后续生成将更快")
         except Exception as e:
             self.logger.error(f"预加载模型时出错: {str(e)}")
             self.is_model_loaded = False
     
-    def _connect_websocket(self):
+    @property
+    def client_id(self) -> str:
+        """提交工作流使用的客户端ID，与共享WebSocket连接一致"""
+        return self._connect_websocket().client_id
+
+    @property
+    def status_data(self) -> dict:
+        """最近一次收到的ComfyUI状态"""
+        return self._connect_websocket().status_data
+
+    @property
+    def _inflight(self) -> int:
+        """所有后端上本进程在途的任务数"""
+        return sum(backend.inflight for backend in self.backend_pool.backends)
+
+    def _connect_websocket(self, base_url: str = None) -> ComfyEventDispatcher:
         """连接到ComfyUI WebSocket进行状态监控"""
-        try:
-            self.ws = websocket.create_connection(f"{self.ws_url}?clientId={self.client_id}")
-            
-            # 启动一个线程来处理WebSocket消息
-            def ws_thread():
-                while True:
-                    try:
-                        message = json.loads(self.ws.recv())
-                        if message['type'] == 'status':
-                            self.status_data = message['data']
-                    except Exception as e:
-                        self.logger.error(f"WebSocket错误: {str(e)}")
-                        break
-            
-            threading.Thread(target=ws_thread, daemon=True).start()
-            return True
-        except Exception as e:
-            self.logger.error(f"无法连接到ComfyUI WebSocket: {str(e)}")
-            return False
-    
-    def generate(self, prompt: str, output_path: str = None) -> str:
-        """生成图像"""
-        try:
-            # 确保WebSocket连接
-            if not self.ws:
-                self._connect_websocket()
-            
-            # 从缓存获取工作流或创建新工作流
-            cache_key = self.comfy_config.get('workflow_file', 'default')
-            if cache_key in self.workflow_cache and self.is_model_loaded:
-                workflow = self.workflow_cache[cache_key].copy()
-            else:
+        backend = self.backend_pool.get(base_url or self.base_url)
+        if backend is None:
+            return ComfyEventDispatcher.get(base_url)
+        return backend.dispatcher
+
+    def _prepare_workflow(self, prompt: str, batch_size: int = 1) -> dict:
+        """生成填入提示词、种子和批量大小的工作流副本"""
+        # 从缓存获取工作流或创建新工作流
+        cache_key = self.comfy_config.get('workflow_file', 'default')
+        with self.workflow_lock:
+            if cache_key not in self.workflow_cache:
                 # 加载或创建工作流
                 workflow_path = self.comfy_config.get('workflow_file')
                 self.logger.info(f"加载工作流: {workflow_path}")
+                workflow = None
                 if workflow_path and os.path.exists(workflow_path):
                     workflow = self._load_workflow_from_file(workflow_path)
-                
-                # 缓存工作流模板
-                self.workflow_cache[cache_key] = workflow.copy()
-            
-            # 更新工作流中的提示词和种子
-            self._update_workflow_for_prompt(workflow, prompt)
-            
-            # # 如果模型已加载，移除模型加载节点
-            # if self.is_model_loaded:
-            #     workflow = self._optimize_workflow(workflow)
-            self.logger.debug(f"提交工作流: {workflow}")
+                if not workflow:
+                    raise Exception(f"无法加载工作流: {workflow_path}")
+                self.workflow_cache[cache_key] = workflow
+            # 深拷贝，避免并发生成时共享节点字典
+            workflow = copy.deepcopy(self.workflow_cache[cache_key])
+        
+        # 更新工作流中的提示词和种子
+        self._update_workflow_for_prompt(workflow, prompt)
+        if batch_size > 1:
+            self._set_latent_batch_size(workflow, batch_size)
+        return workflow
+
+    def _resolve_seed(self, prompt: str) -> int:
+        """
+        确定本次生成的种子
+
+        配置了非负的seed时使用固定种子；否则默认由提示词推导，
+        相同提示词得到相同种子，图像才能被缓存复用。
+        use_random_seed为true时每次随机，此时不使用缓存。
+        """
+        if self.comfy_config.get('use_random_seed', False):
+            return random.randint(0, 2**32 - 1)
+        seed = int(self.comfy_config.get('seed', -1))
+        if seed >= 0:
+            return seed
+        return int(hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:8], 16)
+
+    def _cache_keys(self, prompt: str, workflow: dict, count: int) -> list:
+        """计算一次提交中每张图像的缓存键，不使用缓存时返回None"""
+        if self.cache is None or self.comfy_config.get('use_random_seed', False):
+            return None
+        workflow_hash = hashlib.sha256(json.dumps(workflow, sort_keys=True).encode('utf-8')).hexdigest()
+        return [make_cache_key(
+            kind='image',
+            positive=prompt,
+            negative=self.comfy_config.get('negative_prompt', ''),
+            seed=self._get_workflow_seed(workflow),
+            workflow=workflow_hash,
+            index=index
+        ) for index in range(count)]
+
+    def _get_cached(self, keys: list, output_paths: list) -> list:
+        """全部命中缓存时放置图像并返回路径，否则返回None（已放置的图像会被重新生成的覆盖）"""
+        if not keys or any(path is None for path in output_paths):
+            return None
+        saved = 0.0
+        for key, output_path in zip(keys, output_paths):
+            meta = self.cache.get(key, output_path)
+            if meta is None:
+                return None
+            saved += meta.get('seconds', 0.0)
+        self.gpu_seconds_saved += saved
+        return [str(output_path) for output_path in output_paths]
+
+    def _put_cached(self, keys: list, output_paths: list, prompt: str, seconds: float):
+        """写入图像缓存，执行耗时平均分摊到同批每张图像"""
+        if not keys:
+            return
+        for key, output_path in zip(keys, output_paths):
+            try:
+                self.cache.put(key, output_path, meta={
+                    'prompt': prompt,
+                    'seconds': round(seconds / len(keys), 3),
+                })
+            except Exception as e:
+                self.logger.warning(f"写入图像缓存失败: {str(e)}")
+
+    def _save_image(self, image_data: bytes, output_path: str = None) -> str:
+        """保存图像数据"""
+        if not output_path:
+            timestamp = int(time.time())
+            output_path = self.output_dir / f"generated_{timestamp}.png"
+        # 先写临时文件再替换，避免改写与缓存共享的硬链接
+        tmp_path = f"{output_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(image_data)
+        os.replace(tmp_path, output_path)
+        return str(output_path)
+    
+    def generate(self, prompt: str, output_path: str = None) -> str:
+        """生成图像"""
+        workflow = self._prepare_workflow(prompt)
+        keys = self._cache_keys(prompt, workflow, 1)
+        cached = self._get_cached(keys, [output_path])
+        if cached:
+            self.logger.info(f"图像缓存命中: {prompt[:50]}")
+            return cached[0]
+
+        backend = self.backend_pool.acquire()
+        started = time.time()
+        ok = False
+        try:
+            self.logger.debug(f"提交工作流到 {backend.base_url}: {workflow}")
             # 提交工作流执行
-            prompt_id = self._submit_workflow(self.base_url, workflow)
+            prompt_id = self._submit_workflow(backend.base_url, workflow)
             if not prompt_id:
                 raise Exception("提交工作流失败")
             
             # 等待图像生成
-            image_data = self._wait_for_image(self.base_url, prompt_id)
+            image_data = self._wait_for_image(backend.base_url, prompt_id)
             if not image_data:
                 raise Exception("图像生成失败")
             
-            # 保存图像
-            if not output_path:
-                timestamp = int(time.time())
-                output_path = self.output_dir / f"generated_{timestamp}.png"
-            with open(output_path, 'wb') as f:
-                f.write(image_data)
-            
-            return str(output_path)
+            ok = True
+            seconds = time.time() - started
+            image_path = self._save_image(image_data, output_path)
+            self._put_cached(keys, [image_path], prompt, seconds)
+            return image_path
         except Exception as e:
             self.logger.error(f"生成图像时出错: {str(e)}")
-            # 重置连接状态以便下次重试
             self.is_model_loaded = False
-            self.ws = None
             raise
+        finally:
+            self.backend_pool.release(backend, started, ok)
+
+    async def generate_async(self, prompt: str, output_path: str = None) -> str:
+        """
+        异步生成图像
+
+        等待执行完成时不占用线程，同一进程内可以同时等待大量prompt。
+
+        Args:
+            prompt: 正向提示词
+            output_path: 输出路径
+
+        Returns:
+            str: 生成的图像路径
+        """
+        return (await self.generate_many([(prompt, output_path)]))[0]
+
+    async def generate_many(self, jobs: list, return_exceptions: bool = False) -> list:
+        """
+        批量生成图像
+
+        所有任务立即进入提交队列，由队列深度控制实际提交节奏，
+        每个任务路由到当前负载最低的后端，结果按完成顺序收集。
+
+        Args:
+            jobs: (提示词, 输出路径) 列表
+            return_exceptions: 为True时失败任务返回异常对象，否则抛出第一个异常
+
+        Returns:
+            list: 与输入顺序一致的图像路径列表
+        """
+        results = [None] * len(jobs)
+        async for index, result in self.iter_generate(jobs):
+            results[index] = result
+        if not return_exceptions:
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+        return results
+
+    async def iter_generate(self, jobs: list):
+        """
+        批量生成图像，按完成顺序产出 (任务序号, 图像路径或异常)
+
+        Args:
+            jobs: (提示词, 输出路径) 列表
+        """
+        groups = self._group_jobs(jobs)
+        tasks = [asyncio.ensure_future(self._run_group(prompt, members)) for prompt, members in groups]
+        try:
+            for future in asyncio.as_completed(tasks):
+                for index, result in await future:
+                    yield index, result
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _group_jobs(self, jobs: list) -> list:
+        """按提示词分组；启用latent批量时相同提示词合并为一次提交"""
+        use_latent_batch = self.comfy_config.get('latent_batch', False)
+        max_batch = max(1, int(self.comfy_config.get('max_latent_batch', 4)))
+        groups = []
+        open_groups = {}
+        for index, (prompt, output_path) in enumerate(jobs):
+            group = open_groups.get(prompt) if use_latent_batch else None
+            if group is None or len(group[1]) >= max_batch:
+                group = (prompt, [])
+                groups.append(group)
+                open_groups[prompt] = group
+            group[1].append((index, output_path))
+        return groups
+
+    def _get_depth_gate(self) -> asyncio.Semaphore:
+        if self._depth_gate is None:
+            self._depth_gate = asyncio.Semaphore(self.target_queue_depth * len(self.backend_pool))
+        return self._depth_gate
+
+    async def _acquire_slot(self) -> ComfyBackend:
+        """等待某个后端的队列深度低于目标值后占用一个提交名额，返回选中的后端"""
+        await self._get_depth_gate().acquire()
+        # 其他客户端也可能占用服务端队列，以WebSocket上报的队列长度为准
+        while True:
+            backend = self.backend_pool.acquire(self.target_queue_depth)
+            if backend is not None:
+                return backend
+            await asyncio.sleep(0.2)
+
+    def _release_slot(self, backend: ComfyBackend, started: float = None, ok: bool = True):
+        self.backend_pool.release(backend, started, ok)
+        self._get_depth_gate().release()
+
+    async def _run_group(self, prompt: str, members: list) -> list:
+        """提交一组相同提示词的任务，返回 [(任务序号, 图像路径或异常)]"""
+        loop = asyncio.get_running_loop()
+        output_paths = [output_path for _, output_path in members]
+        try:
+            workflow = self._prepare_workflow(prompt, len(members))
+            keys = self._cache_keys(prompt, workflow, len(members))
+            cached = await loop.run_in_executor(None, self._get_cached, keys, output_paths)
+        except Exception as e:
+            self.logger.error(f"生成图像时出错: {str(e)}")
+            return [(index, e) for index, _ in members]
+        if cached:
+            # 命中缓存时不占用ComfyUI
+            self.logger.info(f"图像缓存命中: {prompt[:50]}")
+            return [(index, path) for (index, _), path in zip(members, cached)]
+
+        backend = await self._acquire_slot()
+        started = time.time()
+        holding = True
+        try:
+            prompt_id = await loop.run_in_executor(None, self._submit_workflow, backend.base_url, workflow)
+            if not prompt_id:
+                raise Exception(f"提交工作流失败: {backend.base_url}")
+
+            timeout = self.comfy_config.get('timeout', 120)
+            if not await backend.dispatcher.wait_async(prompt_id, timeout):
+                raise Exception(f"等待工作流执行超时，已等待{timeout}秒: {backend.base_url}")
+            seconds = time.time() - started
+            # GPU已空闲，下载图像期间允许提交下一个任务
+            self._release_slot(backend, started)
+            holding = False
+
+            images = await loop.run_in_executor(None, self._fetch_images, backend.base_url, prompt_id)
+            if len(images) < len(members):
+                raise Exception("图像生成失败")
+            results = []
+            for (index, output_path), image_data in zip(members, images):
+                results.append((index, await loop.run_in_executor(None, self._save_image, image_data, output_path)))
+            await loop.run_in_executor(None, self._put_cached, keys, [path for _, path in results], prompt, seconds)
+            return results
+        except Exception as e:
+            self.logger.error(f"生成图像时出错: {str(e)}")
+            return [(index, e) for index, _ in members]
+        finally:
+            if holding:
+                self._release_slot(backend, ok=False)
+
+    def _set_latent_batch_size(self, workflow: dict, batch_size: int):
+        """设置工作流中EmptyLatentImage节点的批量大小"""
+        for node in workflow.values():
+            if node.get('class_type') == 'EmptyLatentImage' and 'inputs' in node:
+                node['inputs']['batch_size'] = batch_size
     
+    def _set_workflow_seed(self, workflow: dict, seed: int):
+        """设置工作流中采样节点的种子，取代工作流自身的随机化"""
+        for node in workflow.values():
+            input_name = SAMPLER_SEED_INPUTS.get(node.get('class_type'))
+            inputs = node.get('inputs') or {}
+            # 连接到其他节点的输入是列表，不覆盖
+            if input_name and isinstance(inputs.get(input_name), int):
+                inputs[input_name] = seed
+
+    def _get_workflow_seed(self, workflow: dict):
+        """读取工作流中采样节点的种子"""
+        for node in workflow.values():
+            input_name = SAMPLER_SEED_INPUTS.get(node.get('class_type'))
+            if input_name and isinstance((node.get('inputs') or {}).get(input_name), int):
+                return node['inputs'][input_name]
+        return None
+
     def _update_workflow_for_prompt(self, workflow: dict, prompt: str):
         """更新工作流中的提示词和随机种子"""
+        self._set_workflow_seed(workflow, self._resolve_seed(prompt))
+
         negative_prompt = self.comfy_config.get('negative_prompt', '')
         
         # 查找提示词节点并更新
@@ -197,8 +454,9 @@ class ImageGenerator:
                 f"{base_url}/prompt",
                 json={
                     "prompt": workflow,
-                    "client_id": self.client_id  # 添加客户端ID，使ComfyUI能够跟踪状态
-                }
+                    "client_id": self._connect_websocket(base_url).client_id  # 添加客户端ID，使ComfyUI能够跟踪状态
+                },
+                timeout=30
             )
             if response.status_code != 200:
                 self.logger.error(f"提交工作流失败: {response.text}")
@@ -211,79 +469,66 @@ class ImageGenerator:
             self.logger.error(f"提交工作流时出错: {e}")
             return None
     
-    def _wait_for_execution(self, prompt_id: str, timeout: int = None) -> bool:
+    def _wait_for_execution(self, prompt_id: str, timeout: int = None, base_url: str = None) -> bool:
         """等待工作流执行完成，不需要返回图像数据"""
         if timeout is None:
             timeout = self.comfy_config.get('timeout', 120)
-            
-        start_time = time.time()
         
-        while time.time() - start_time < timeout:
-            # 检查执行状态
-            try:
-                # 使用已有的状态数据
-                if self.status_data:
-                    execution_queue = self.status_data.get('exec_info', {}).get('queue_remaining', 0)
-                    if execution_queue == 0:
-                        # 检查历史记录确认是否完成
-                        response = requests.get(f"{self.base_url}/history")
-                        if response.status_code == 200 and prompt_id in response.json():
-                            return True
-                
-                # 如果没有通过WebSocket收到状态，直接查询历史
-                response = requests.get(f"{self.base_url}/history")
-                if response.status_code == 200 and prompt_id in response.json():
-                    return True
-                    
-            except Exception as e:
-                self.logger.error(f"检查执行状态时出错: {e}")
-            
-            time.sleep(0.5)
+        try:
+            if self._connect_websocket(base_url).wait(prompt_id, timeout):
+                return True
+        except ComfyExecutionError as e:
+            self.logger.error(f"工作流执行失败: {str(e)}")
+            return False
         
         self.logger.warning(f"等待工作流执行超时，已等待{timeout}秒")
         return False
-    
-    def _wait_for_image(self, base_url: str, prompt_id: str) -> bytes:
-        """等待图像生成并获取结果"""
-        timeout = self.comfy_config.get('timeout', 120)
-        
-        # 等待执行完成
-        if not self._wait_for_execution(prompt_id, timeout):
-            return None
-        
-        # 获取生成的图像
+
+    def _fetch_images(self, base_url: str, prompt_id: str) -> list:
+        """从已完成prompt的历史记录中下载全部输出图像"""
+        images = []
         try:
-            response = requests.get(f"{base_url}/history")
+            response = requests.get(f"{base_url}/history/{prompt_id}")
             if response.status_code != 200:
-                return None
+                return images
             
             history = response.json()
-            self.logger.debug(f"history: {history[prompt_id]}")
             if prompt_id in history:
+                self.logger.debug(f"history: {history[prompt_id]}")
                 outputs = history[prompt_id].get('outputs', {})
                 # 查找SaveImage节点的输出
                 for node_id, node_output in outputs.items():
-                    if 'images' in node_output:
-                        image_info = node_output['images'][0]
-                        image_url = f"{base_url}/view?filename={image_info['filename']}&type={image_info['type']}"
-                        
+                    for image_info in node_output.get('images', []):
                         # 下载图像
-                        img_response = requests.get(image_url)
+                        img_response = requests.get(f"{base_url}/view", params={
+                            'filename': image_info['filename'],
+                            'subfolder': image_info.get('subfolder', ''),
+                            'type': image_info['type']
+                        })
                         self.logger.debug(f"img_response: {img_response}")
                         if img_response.status_code == 200:
-                            return img_response.content
+                            images.append(img_response.content)
+                    if images:
+                        return images
                 
                 self.logger.warning("工作流完成但未找到图像输出")
-                return None
         except Exception as e:
             self.logger.error(f"获取图像时出错: {e}")
         
-        return None
+        return images
+
+    def _fetch_image(self, base_url: str, prompt_id: str) -> bytes:
+        """从已完成prompt的历史记录中下载第一张图像"""
+        images = self._fetch_images(base_url, prompt_id)
+        return images[0] if images else None
     
-    def __del__(self):
-        """清理资源"""
-        if self.ws:
-            try:
-                self.ws.close()
-            except:
-                pass 
\ No newline at end of file
+    def _wait_for_image(self, base_url: str, prompt_id: str) -> bytes:
+        """等待图像生成并获取结果"""
+        timeout = self.comfy_config.get('timeout', 120)
+        
+        # 等待执行完成
+        if not self._wait_for_execution(prompt_id, timeout, base_url):
+            return None
+        
+        # 获取生成的图像
+        return self._fetch_image(base_url, prompt_id)
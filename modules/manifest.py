@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+from modules.logger import get_logger
+
+
+def hash_inputs(**values) -> str:
+    """计算阶段输入的哈希，值按键排序后序列化"""
+    payload = json.dumps(values, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def file_signature(path) -> Optional[list]:
+    """文件的 [大小, 修改时间]，文件不存在时返回None"""
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def atomic_write_json(path, data: Dict[str, Any]):
+    """先写临时文件再替换，中途退出不会留下半截的JSON"""
+    path = Path(path)
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class WordManifest:
+    """单词的处理清单
+
+    保存在单词目录的 result.json 中：顶层仍是原来的结果字段，
+    stages 下按阶段记录输入哈希、输出结果、输出文件的大小和修改时间以及状态。
+    阶段只有在成功结束后才记为完成，且恢复时输出文件必须与记录一致，
+    因此中途被打断、写了一半的 WAV/PNG/MP4 不会被当成已完成。
+    """
+
+    STAGES_KEY = 'stages'
+
+    def __init__(self, path):
+        """
+        Args:
+            path: result.json 路径
+        """
+        self.logger = get_logger(__name__)
+        self.path = Path(path)
+        self.results: Dict[str, Any] = {}
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"无法读取处理清单，将重新处理: {self.path}, {str(e)}")
+            return
+        self.stages = data.pop(self.STAGES_KEY, None) or {}
+        self.results = data
+
+    def completed(self, stage: str, inputs_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        查询阶段是否已完成且输出仍然有效
+
+        Args:
+            stage: 阶段名称
+            inputs_hash: 本次运行的阶段输入哈希
+
+        Returns:
+            dict: 阶段写入的结果字段，未完成、输入变化或输出文件失效时返回None
+        """
+        entry = self.stages.get(stage)
+        if not entry or entry.get('status') != 'done' or entry.get('inputs') != inputs_hash:
+            return None
+        for path, signature in (entry.get('files') or {}).items():
+            if file_signature(path) != signature:
+                self.logger.info(f"阶段 {stage} 的输出文件已变化，重新执行: {path}")
+                return None
+        return entry.get('outputs') or {}
+
+    def record(self, stage: str, inputs_hash: str, outputs: Dict[str, Any], results: Dict[str, Any]):
+        """
+        记录阶段成功完成并保存清单
+
+        Args:
+            stage: 阶段名称
+            inputs_hash: 阶段输入哈希
+            outputs: 阶段写入的结果字段，键以 _path 结尾的值视为输出文件
+            results: 单词的完整结果字典
+        """
+        files = {}
+        for key, value in outputs.items():
+            if key.endswith('_path') and value:
+                signature = file_signature(value)
+                if signature is not None:
+                    files[str(value)] = signature
+        self.stages[stage] = {
+            'status': 'done',
+            'inputs': inputs_hash,
+            'outputs': outputs,
+            'files': files,
+            'finished_at': time.time(),
+        }
+        self.save(results)
+
+    def fail(self, stage: str, inputs_hash: str, error: str, results: Dict[str, Any]):
+        """记录阶段失败并保存清单"""
+        self.stages[stage] = {
+            'status': 'failed',
+            'inputs': inputs_hash,
+            'error': error,
+            'finished_at': time.time(),
+        }
+        self.save(results)
+
+    def save(self, results: Dict[str, Any]):
+        """原子写入 result.json"""
+        self.results = results
+        atomic_write_json(self.path, {**results, self.STAGES_KEY: self.stages})
@@ -0,0 +1,204 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from modules.logger import get_logger
+
+# 队列结束标记
+_STOP = object()
+
+
+async def run_blocking(func: Callable, *args, **kwargs) -> Any:
+    """在默认线程池中执行同步函数，避免阻塞事件循环"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+
+class ProviderLimiter:
+    """按服务提供方限制并发的线程池执行器
+
+    同步SDK（腾讯云、阿里云、魔音、ComfyUI等）的调用在线程池中执行，
+    每个提供方通过独立的信号量限制同时进行的请求数量。
+    """
+
+    def __init__(self, limits: Dict[str, int], default_limit: int = 2):
+        """
+        Args:
+            limits: 提供方名称到最大并发数的映射
+            default_limit: 未配置的提供方使用的并发数
+        """
+        self.limits = {name: max(1, int(limit)) for name, limit in (limits or {}).items()}
+        self.default_limit = max(1, int(default_limit))
+        self._semaphores = {}
+        max_workers = sum(self.limits.values()) + self.default_limit
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="provider")
+
+    def _get_semaphore(self, provider: str) -> asyncio.Semaphore:
+        if provider not in self._semaphores:
+            self._semaphores[provider] = asyncio.Semaphore(self.limits.get(provider, self.default_limit))
+        return self._semaphores[provider]
+
+    async def run(self, provider: str, func: Callable, *args, **kwargs) -> Any:
+        """在提供方的并发限制内，于线程池中执行同步函数"""
+        async with self._get_semaphore(provider):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def run_async(self, provider: str, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """在提供方的并发限制内执行异步函数"""
+        async with self._get_semaphore(provider):
+            return await func(*args, **kwargs)
+
+    def shutdown(self):
+        """关闭线程池"""
+        self._executor.shutdown(wait=False)
+
+
+class Stage:
+    """流水线中的一个处理阶段"""
+
+    def __init__(self, name: str, handler: Callable[[Any], Awaitable[Any]], workers: int = 1,
+                 batch_size: int = 1, batch_wait: float = 0.05):
+        """
+        Args:
+            name: 阶段名称，用于日志
+            handler: 异步处理函数，接收上一阶段的输出，返回交给下一阶段的数据；
+                     返回None表示该任务失败，后续阶段将跳过它。
+                     batch_size大于1时接收任务列表，返回等长的结果列表
+            workers: 该阶段并发执行的工作协程数量
+            batch_size: 每次交给处理函数的最大任务数
+            batch_wait: 凑批时等待后续任务的最长时间（秒）
+        """
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, int(batch_size))
+        self.batch_wait = batch_wait
+
+
+class StagePipeline:
+    """分阶段流水线执行器
+
+    每个阶段拥有独立的有界队列和工作协程，任务按阶段依次流转。
+    队列满时上游会被阻塞（背压），因此同一时刻驻留内存的任务数量有上限，
+    与批量大小无关。
+    """
+
+    def __init__(self, stages: List[Stage], max_inflight: int = 2):
+        """
+        Args:
+            stages: 按执行顺序排列的阶段列表
+            max_inflight: 每个阶段队列中最多等待的任务数
+        """
+        if not stages:
+            raise ValueError("流水线至少需要一个阶段")
+        self.logger = get_logger(__name__)
+        self.stages = stages
+        self.max_inflight = max(1, int(max_inflight))
+
+    async def run(self, items: List[Any],
+                  on_result: Optional[Callable[[int, Any], Any]] = None) -> List[Any]:
+        """
+        执行流水线
+
+        Args:
+            items: 输入任务列表
+            on_result: 每个任务走完全部阶段后的回调，参数为(任务序号, 结果)，
+                       可以是普通函数或协程函数
+
+        Returns:
+            list: 与输入顺序一致的结果列表，失败的任务对应None
+        """
+        # 批处理阶段的队列至少要能容纳一整批
+        queues = [asyncio.Queue(maxsize=max(self.max_inflight, stage.batch_size)) for stage in self.stages]
+        results = [None] * len(items)
+
+        async def feed():
+            for index, item in enumerate(items):
+                await queues[0].put((index, item))
+            for _ in range(self.stages[0].workers):
+                await queues[0].put(_STOP)
+
+        async def finish(index, payload):
+            results[index] = payload
+            if on_result is not None:
+                ret = on_result(index, payload)
+                if asyncio.iscoroutine(ret):
+                    await ret
+
+        async def emit(stage_index, index, payload):
+            if stage_index == len(self.stages) - 1:
+                await finish(index, payload)
+            else:
+                await queues[stage_index + 1].put((index, payload))
+
+        async def collect_batch(stage, queue, first):
+            # 取到第一个任务后，在等待时间内尽量凑满一批
+            batch = [first]
+            stopped = False
+            deadline = asyncio.get_running_loop().time() + stage.batch_wait
+            while len(batch) < stage.batch_size:
+                timeout = deadline - asyncio.get_running_loop().time()
+                try:
+                    job = queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(queue.get(), timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if job is _STOP:
+                    stopped = True
+                    break
+                batch.append(job)
+            return batch, stopped
+
+        async def worker(stage_index):
+            stage = self.stages[stage_index]
+            queue = queues[stage_index]
+            while True:
+                job = await queue.get()
+                if job is _STOP:
+                    return
+                if stage.batch_size > 1:
+                    batch, stopped = await collect_batch(stage, queue, job)
+                    await run_batch(stage_index, batch)
+                    if stopped:
+                        return
+                    continue
+
+                index, payload = job
+                if payload is not None:
+                    try:
+                        payload = await stage.handler(payload)
+                    except Exception as e:
+                        self.logger.error(f"阶段 '{stage.name}' 处理第 {index + 1} 个任务时出错: {str(e)}")
+                        payload = None
+                await emit(stage_index, index, payload)
+
+        async def run_batch(stage_index, batch):
+            stage = self.stages[stage_index]
+            live = [(index, payload) for index, payload in batch if payload is not None]
+            outputs = {}
+            if live:
+                try:
+                    handled = await stage.handler([payload for _, payload in live])
+                    outputs = {index: result for (index, _), result in zip(live, handled)}
+                except Exception as e:
+                    self.logger.error(f"阶段 '{stage.name}' 批量处理 {len(live)} 个任务时出错: {str(e)}")
+            for index, _ in batch:
+                await emit(stage_index, index, outputs.get(index))
+
+        async def run_stage(stage_index):
+            stage = self.stages[stage_index]
+            await asyncio.gather(*(worker(stage_index) for _ in range(stage.workers)))
+            # 本阶段全部结束后，通知下一阶段的工作协程退出
+            if stage_index + 1 < len(self.stages):
+                for _ in range(self.stages[stage_index + 1].workers):
+                    await queues[stage_index + 1].put(_STOP)
+
+        tasks = [asyncio.ensure_future(feed())]
+        tasks += [asyncio.ensure_future(run_stage(i)) for i in range(len(self.stages))]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        return results
@@ -1,27 +1,77 @@
 import os
 import json
+import asyncio
+import hashlib
 from pathlib import Path
 from openai import AsyncAzureOpenAI
+from modules.cache import PromptCache
 from modules.config import ConfigManager
 from modules.logger import get_logger
 
+# 提示词结果中必须包含的字段
+REQUIRED_FIELDS = ('word', 'word_zh', 'word_prompt', 'phrase', 'phrase_zh', 'phrase_prompt')
+
+# 批量模式追加到系统提示词后的说明
+BATCH_INSTRUCTION = (
+    " You will receive a JSON array of English words. Apply the workflow to every word and "
+    "return a JSON object of the form {\"items\": [...]}, with exactly one record per input word "
+    "in the same order. Each record must contain the fields: " + ", ".join(REQUIRED_FIELDS) + "."
+)
+
 class PromptGenerator:
-    def __init__(self):
+    def __init__(self, cache=None):
+        """
+        Args:
+            cache: 提示词缓存（PromptCache），为None时不使用缓存
+        """
         self.logger = get_logger(__name__)
         self.config_manager = ConfigManager()
         azure_config = self.config_manager.get_azure_config()
         prompts_file = azure_config['prompts_file']
-        with open(prompts_file, 'r', encoding='utf-8') as f:
-            self.prompts = json.load(f)
+        with open(prompts_file, 'rb') as f:
+            prompts_data = f.read()
+        self.prompts = json.loads(prompts_data.decode('utf-8'))
+        # 模板内容变化后缓存自动失效
+        self.prompts_hash = hashlib.sha256(prompts_data).hexdigest()
+        self.cache = cache
         
         self.client = AsyncAzureOpenAI(
             api_key=azure_config['api_key'],
             azure_endpoint=azure_config['endpoint'],
             api_version=azure_config['api_version']
         )
+
+    def _is_valid_record(self, data) -> bool:
+        """检查单条记录是否包含全部非空字段"""
+        return isinstance(data, dict) and all(isinstance(data.get(field), str) and data.get(field) for field in REQUIRED_FIELDS)
+
+    def _is_valid_result(self, content: str) -> bool:
+        """检查生成结果是否为包含全部字段的JSON对象"""
+        try:
+            data = json.loads(content)
+        except (TypeError, ValueError):
+            return False
+        return self._is_valid_record(data)
     
-    async def generate(self, word: str) -> str:
+    async def generate(self, word: str, refresh: bool = False) -> str:
+        """
+        生成单词的提示词结果
+
+        Args:
+            word: 单词
+            refresh: 为True时忽略缓存重新生成，并用新结果覆盖缓存
+
+        Returns:
+            str: JSON格式的提示词结果
+        """
         azure_config = self.config_manager.get_azure_config()
+        deployment_name = azure_config['deployment_name']
+        if self.cache is not None and not refresh:
+            cached = self.cache.get(word, self.prompts_hash, deployment_name)
+            if cached is not None:
+                self.logger.info(f"提示词缓存命中: {word}")
+                return cached
+
         # 使用模板中定义的system_prompt，如果没有则使用默认值
         system_prompt = self.prompts['system_prompt']
         assistant_prompt = json.dumps(self.prompts['assistant_prompt'], ensure_ascii=False)
@@ -35,7 +85,7 @@ class PromptGenerator:
         try:
             self.logger.debug(f"调用Azure OpenAI API")
             response = await self.client.chat.completions.create(
-                model=azure_config['deployment_name'],
+                model=deployment_name,
                 response_format={ "type": "json_object" },
                 messages=messages,
                 temperature=0.7
@@ -43,7 +93,105 @@ class PromptGenerator:
             
             generated_prompt = response.choices[0].message.content.strip()
             self.logger.info(f"生成的提示词: {generated_prompt[:50]}{'...' if len(generated_prompt) > 50 else ''}")
+            # 只缓存完整有效的结果
+            if self.cache is not None and self._is_valid_result(generated_prompt):
+                self.cache.put(word, self.prompts_hash, deployment_name, generated_prompt)
             return generated_prompt
         except Exception as e:
             self.logger.error(f"生成提示词时出错: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    async def _request_batch(self, words: list) -> dict:
+        """
+        在一次对话补全中为多个单词生成提示词
+
+        Returns:
+            dict: 规范化单词到JSON结果的映射，只包含校验通过的记录
+        """
+        azure_config = self.config_manager.get_azure_config()
+        example = self.prompts['assistant_prompt']
+        messages = [
+            {"role": "system", "content": self.prompts['system_prompt'] + BATCH_INSTRUCTION},
+            {"role": "user", "content": json.dumps([example['word']], ensure_ascii=False)},
+            {"role": "assistant", "content": json.dumps({"items": [example]}, ensure_ascii=False)},
+            {"role": "user", "content": json.dumps(words, ensure_ascii=False)}
+        ]
+        self.logger.debug(f"批量调用Azure OpenAI API: {words}")
+        response = await self.client.chat.completions.create(
+            model=azure_config['deployment_name'],
+            response_format={ "type": "json_object" },
+            messages=messages,
+            temperature=0.7
+        )
+        content = response.choices[0].message.content.strip()
+        items = json.loads(content).get('items')
+        if not isinstance(items, list):
+            raise ValueError("批量结果缺少items数组")
+
+        records = {}
+        for item in items:
+            if self._is_valid_record(item):
+                records[PromptCache.normalize_word(item['word'])] = json.dumps(item, ensure_ascii=False)
+            else:
+                self.logger.warning(f"忽略格式不正确的批量结果: {item}")
+        return records
+
+    async def generate_batch(self, words: list, refresh: bool = False) -> dict:
+        """
+        批量生成多个单词的提示词结果
+
+        每次请求最多包含 azure_openai.batch_size 个单词，批量结果中缺失或
+        格式不正确的单词会单独重试。
+
+        Args:
+            words: 单词列表
+            refresh: 为True时忽略缓存重新生成
+
+        Returns:
+            dict: 单词到JSON结果的映射，生成失败的单词不在其中
+        """
+        azure_config = self.config_manager.get_azure_config()
+        deployment_name = azure_config['deployment_name']
+        batch_size = max(1, int(azure_config.get('batch_size', 1)))
+        results = {}
+
+        pending = []
+        for word in words:
+            cached = None
+            if self.cache is not None and not refresh:
+                cached = self.cache.get(word, self.prompts_hash, deployment_name)
+            if cached is not None:
+                self.logger.info(f"提示词缓存命中: {word}")
+                results[word] = cached
+            else:
+                pending.append(word)
+
+        if batch_size > 1:
+            for i in range(0, len(pending), batch_size):
+                chunk = pending[i:i + batch_size]
+                if len(chunk) < 2:
+                    continue
+                try:
+                    records = await self._request_batch(chunk)
+                except Exception as e:
+                    self.logger.warning(f"批量生成提示词失败，将逐个重试: {str(e)}")
+                    continue
+                for word in chunk:
+                    content = records.get(PromptCache.normalize_word(word))
+                    if content is None:
+                        continue
+                    results[word] = content
+                    if self.cache is not None:
+                        self.cache.put(word, self.prompts_hash, deployment_name, content)
+
+        # 缺失的单词逐个重试
+        missing = [word for word in pending if word not in results]
+        if missing and batch_size > 1:
+            self.logger.info(f"逐个重试 {len(missing)} 个单词: {', '.join(missing)}")
+        retried = await asyncio.gather(*(self.generate(word, refresh=True) for word in missing), return_exceptions=True)
+        for word, content in zip(missing, retried):
+            if isinstance(content, Exception):
+                self.logger.error(f"生成单词 '{word}' 的提示词失败: {str(content)}")
+            else:
+                results[word] = content
+        return results
@@ -2,40 +2,150 @@ import os
 import time
 import subprocess
 from pathlib import Path
+from modules.audio_mix import AudioAssembler, WavFormatError
 from modules.config import ConfigManager
+from modules.duration import get_duration_service
 from modules.logger import get_logger
 
+def format_timestamp(seconds, separator=','):
+    """将秒数转换为字幕时间格式，SRT用逗号（HH:MM:SS,mmm），WebVTT用点（HH:MM:SS.mmm）"""
+    milliseconds = int(round(max(0.0, seconds) * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02}:{minutes:02}:{seconds:02}{separator}{milliseconds:03}"
+
+class SubtitleTrackBuilder:
+    """根据各片段的时间轴生成整段合并视频的字幕
+
+    片段按合并顺序加入，每个片段的时长和音频位置来自视频编码时的拼接结果，
+    只做加法累计偏移，不再探测任何音频或视频。英文和中文各输出一份SRT和WebVTT。
+    """
+
+    LANGUAGES = ('en', 'zh')
+
+    def __init__(self):
+        self.logger = get_logger(__name__)
+        self.offset = 0.0
+        self.cues = {language: [] for language in self.LANGUAGES}
+
+    def add_clip(self, duration, segments, text="", text_zh=""):
+        """
+        追加一个片段
+
+        Args:
+            duration: 片段时长（秒）
+            segments: 片段内各段音频的 [开始, 结束]（秒），字幕覆盖第一段开始到最后一段结束
+            text: 英文文本
+            text_zh: 中文文本
+        """
+        if segments:
+            start = self.offset + segments[0][0]
+            end = self.offset + segments[-1][1]
+            for language, content in zip(self.LANGUAGES, (text, text_zh)):
+                if content:
+                    self.cues[language].append((start, end, content))
+        self.offset += duration
+
+    def render_srt(self, language):
+        """生成SRT文本"""
+        lines = []
+        for index, (start, end, text) in enumerate(self.cues[language], 1):
+            lines.extend([str(index), f"{format_timestamp(start)} --> {format_timestamp(end)}", text, ""])
+        return '\n'.join(lines)
+
+    def render_vtt(self, language):
+        """生成WebVTT文本"""
+        lines = ["WEBVTT", ""]
+        for start, end, text in self.cues[language]:
+            lines.extend([f"{format_timestamp(start, '.')} --> {format_timestamp(end, '.')}", text, ""])
+        return '\n'.join(lines)
+
+    def write(self, output_path):
+        """
+        写入字幕文件
+
+        Args:
+            output_path: 输出路径，各语言文件名为 {stem}_en.srt / {stem}_en.vtt 等
+
+        Returns:
+            dict: 键为 en_srt、en_vtt、zh_srt、zh_vtt 的文件路径，没有字幕的语言不输出
+        """
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        paths = {}
+        for language in self.LANGUAGES:
+            if not self.cues[language]:
+                continue
+            for suffix, render in (('srt', self.render_srt), ('vtt', self.render_vtt)):
+                path = output_path.with_name(f"{output_path.stem}_{language}.{suffix}")
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(render(language))
+                paths[f"{language}_{suffix}"] = str(path)
+        self.logger.info(f"合并字幕已生成: {len(self.cues['en'])} 条英文, {len(self.cues['zh'])} 条中文, 总时长 {self.offset:.3f}秒")
+        return paths
+
 class SrtGenerator:
     def __init__(self):
         self.logger = get_logger(__name__)
         self.config_manager = ConfigManager()
         self.output_dir = self.config_manager.get_output_base_dir()
+        self.assembler = AudioAssembler()
     
     def _get_audio_duration(self, audio_path):
-        """获取音频文件的持续时间（秒）"""
-        try:
-            cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", 
-                  "default=noprint_wrappers=1:nokey=1", audio_path]
-            duration = float(subprocess.check_output(cmd).decode().strip())
-            return duration
-        except Exception as e:
-            self.logger.warning(f"无法获取音频 {audio_path} 时长，使用默认值: {e}")
-            return 2.0  # 默认2秒
+        """获取音频文件的持续时间（秒），无法获取时抛出DurationError"""
+        return get_duration_service().get_duration(audio_path)
     
+    def _compute_section(self, audio_path, audio_zh_path, lead_silence, audio_gap):
+        """计算字幕的起止时间，与视频音轨的拼接方式一致"""
+        sources = []
+        for source in (audio_path, audio_zh_path):
+            if hasattr(source, 'view'):
+                sources.append(source)
+            elif source and os.path.exists(source):
+                sources.append(str(source))
+        section = {
+            'start': lead_silence,
+            'end': lead_silence
+        }
+        if not sources:
+            return section
+
+        try:
+            # WAV按文件头计算，与AudioAssembler拼接出的音轨逐样本对齐；内存数据直接解析缓冲区
+            inputs = [source.view if hasattr(source, 'view') else source for source in sources]
+            segments = self.assembler.layout(inputs, lead_silence, audio_gap)['segments']
+            section['end'] = segments[-1][1]
+            return section
+        except WavFormatError:
+            pass
+
+        audio_paths = []
+        for source in sources:
+            path = source.path if hasattr(source, 'view') else source
+            if not path:
+                raise Exception(f"无法获取音频时长: {source.name}")
+            audio_paths.append(path)
+        durations = get_duration_service().get_durations(audio_paths)
+        current_time = lead_silence
+        for path in audio_paths:
+            if path not in durations:
+                raise Exception(f"无法获取音频时长: {path}")
+            duration = durations[path]
+            section['end'] = current_time + duration
+            current_time += duration + audio_gap
+        return section
+
     def _format_time(self, seconds):
         """将秒数转换为SRT时间格式 (HH:MM:SS,mmm)"""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        seconds = seconds % 60
-        milliseconds = int((seconds - int(seconds)) * 1000)
-        return f"{hours:02}:{minutes:02}:{int(seconds):02},{milliseconds:03}"
+        return format_timestamp(seconds)
     
     def generate(self, audio_path, audio_zh_path=None, text="", text_zh="", lead_silence=1.0, audio_gap=1.0, output_path=None):
         """
         根据音频生成SRT字幕文件
         
         Args:
-            audio_path: 英文音频路径
+            audio_path: 英文音频路径，或内存中的音频（Artifact）
             audio_zh_path: 中文音频路径（可选）
             text: 英文文本内容
             text_zh: 中文文本内容
@@ -44,7 +154,7 @@ class SrtGenerator:
             output_path: 输出SRT文件路径（可选）
             
         Returns:
-            dict: 包含英文和中文SRT文件路径的字典
+            dict: 键为 en、zh 的SRT文件路径，没有对应文本时为None
         """
         try:
             # 如果未指定输出路径，则自动生成
@@ -58,25 +168,10 @@ class SrtGenerator:
             output_path.parent.mkdir(parents=True, exist_ok=True)
             
             # 计算音频时长和位置
-            section = {
-                'start': lead_silence,
-                'end': lead_silence
-            }
-            
-            current_time = lead_silence
-            
-            # 计算英文音频时长
-            if audio_path and os.path.exists(audio_path):
-                audio_duration = self._get_audio_duration(audio_path)
-                section['end'] = current_time + audio_duration
-                current_time += audio_duration + audio_gap
-            
-            # 计算中文音频时长
-            if audio_zh_path and os.path.exists(audio_zh_path):
-                audio_zh_duration = self._get_audio_duration(audio_zh_path)
-                # 如果中文部分比英文部分晚结束，更新结束时间
-                section['end'] = max(section['end'], current_time + audio_zh_duration)
+            section = self._compute_section(audio_path, audio_zh_path, lead_silence, audio_gap)
             
+            paths = {'en': None, 'zh': None}
+
             # 创建英文SRT文件
             en_output_path = output_path.with_name(f"{output_path.stem}_en{output_path.suffix}")
             if text:
@@ -90,6 +185,7 @@ class SrtGenerator:
                     f.write('\n'.join(en_srt_content))
                 
                 self.logger.info(f"英文字幕文件已保存: {en_output_path}")
+                paths['en'] = str(en_output_path)
             
             # 创建中文SRT文件
             zh_output_path = output_path.with_name(f"{output_path.stem}_zh{output_path.suffix}")
@@ -104,14 +200,18 @@ class SrtGenerator:
                     f.write('\n'.join(zh_srt_content))
                 
                 self.logger.info(f"中文字幕文件已保存: {zh_output_path}")
-            
+                paths['zh'] = str(zh_output_path)
+
+            return paths
         except Exception as e:
             self.logger.error(f"生成字幕文件时出错: {str(e)}")
             raise Exception(f"Error generating SRT subtitle: {str(e)}")
 
     def attach_to_video(self, video_path, srt_path, output_path=None):
         """
-        将SRT字幕文件附加到视频文件
+        将SRT字幕文件附加到已有的视频文件
+
+        需要重新读写整个视频；生成视频时可直接通过 VideoGenerator.generate 的 subtitles 参数封装字幕
         
         Args:
             video_path: 视频文件路径
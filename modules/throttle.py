@@ -0,0 +1,120 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Callable, Optional
+from modules.logger import get_logger
+
+
+class TokenBucket:
+    """令牌桶限速
+
+    按 rate 个/秒补充令牌，最多积攒 burst 个。同步和异步调用方共用同一个桶，
+    线程池中的请求和事件循环中的请求一起计入账号的QPS。
+    """
+
+    def __init__(self, rate: float, burst: int = None):
+        """
+        Args:
+            rate: 每秒补充的令牌数，即允许的平均QPS
+            burst: 桶容量，默认等于rate（至少为1）
+        """
+        if rate <= 0:
+            raise ValueError("rate必须大于0")
+        self.rate = float(rate)
+        self.burst = max(1, int(burst if burst else rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """预订一个令牌，返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        """阻塞直到取得令牌"""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """异步等待直到取得令牌"""
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 10.0) -> float:
+    """指数退避加全抖动：第attempt次重试前等待 [0, min(cap, base*2^attempt)) 秒"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RetryPolicy:
+    """带令牌桶限速和抖动退避的重试策略"""
+
+    def __init__(self, should_retry: Callable[[Exception], bool], max_attempts: int = 4,
+                 base_delay: float = 0.5, max_delay: float = 10.0, limiter: TokenBucket = None,
+                 name: str = "request"):
+        """
+        Args:
+            should_retry: 判断异常是否可以重试
+            max_attempts: 最多尝试次数（含第一次）
+            base_delay: 退避基准时间（秒）
+            max_delay: 单次退避上限（秒）
+            limiter: 每次尝试前获取令牌的令牌桶（可选）
+            name: 日志中的请求名称
+        """
+        self.logger = get_logger(__name__)
+        self.should_retry = should_retry
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limiter = limiter
+        self.name = name
+        self.retries = 0
+
+    def _give_up(self, error: Exception, attempt: int) -> Optional[float]:
+        """返回重试前的等待时间，不再重试时返回None"""
+        if attempt + 1 >= self.max_attempts or not self.should_retry(error):
+            return None
+        self.retries += 1
+        delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+        self.logger.warning(f"{self.name}失败，{delay:.2f}秒后第{attempt + 1}次重试: {str(error)}")
+        return delay
+
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        """同步执行，可重试的错误按退避时间重试"""
+        attempt = 0
+        while True:
+            if self.limiter:
+                self.limiter.acquire()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                delay = self._give_up(e, attempt)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    async def call_async(self, func: Callable, *args, **kwargs) -> Any:
+        """异步执行，func返回协程；等待令牌和退避都不阻塞事件循环"""
+        attempt = 0
+        while True:
+            if self.limiter:
+                await self.limiter.acquire_async()
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                delay = self._give_up(e, attempt)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
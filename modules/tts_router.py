@@ -0,0 +1,196 @@
+import asyncio
+import os
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, List
+from modules.logger import get_logger
+
+
+class ProviderStats:
+    """语音服务最近若干次请求的耗时和成败"""
+
+    def __init__(self, window: int = 100):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.completed = 0
+        self.failed = 0
+
+    def record(self, seconds: float = None, ok: bool = True):
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(seconds)
+            self.completed += 1
+        else:
+            self.failed += 1
+
+    def p95(self):
+        """最近请求耗时的95分位数，没有样本时返回None"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+
+class TtsRouter:
+    """按偏好、p95耗时和错误率选择语音服务，慢请求发出对冲请求
+
+    每种语言按配置的偏好顺序列出可用的服务。样本足够后按
+    p95耗时 ×（1 + 错误率）排序，错误率超过上限的服务排到最后；
+    样本不足时按默认耗时估计，偏好顺序决定并列时的先后。
+    首选服务在 hedge_delay 秒内没有返回时，向下一个服务发出同样的请求，
+    取先完成的结果；失败的请求立即由下一个服务接替。
+    """
+
+    def __init__(self, providers: Dict[str, object], preferences: Dict[str, List[str]],
+                 hedge_delay: float = 2.0, limiter=None, window: int = 100, min_samples: int = 5,
+                 default_latency: float = 1.0, max_error_rate: float = 0.5):
+        """
+        Args:
+            providers: 服务名称到语音生成器的映射，生成器需实现 generate_async()
+            preferences: 语言到服务名称列表的映射，按偏好排序
+            hedge_delay: 发出对冲请求前等待的时间（秒），为0或None时不对冲
+            limiter: ProviderLimiter，按服务限制并发（可选）
+            window: 统计耗时和错误率的请求数
+            min_samples: 按实测耗时排序所需的最少样本数
+            default_latency: 样本不足时假定的耗时（秒）
+            max_error_rate: 错误率超过该值的服务排到最后
+        """
+        self.logger = get_logger(__name__)
+        self.providers = providers
+        self.preferences = {language: [name for name in names if name in providers]
+                            for language, names in preferences.items()}
+        self.hedge_delay = hedge_delay
+        self.limiter = limiter
+        self.min_samples = min_samples
+        self.default_latency = default_latency
+        self.max_error_rate = max_error_rate
+        self.stats = {name: ProviderStats(window) for name in providers}
+        self.hedges = 0
+        self.secondary_wins = 0
+
+    def rank(self, language: str) -> List[str]:
+        """返回该语言按当前状态排序的服务列表"""
+        names = self.preferences.get(language) or list(self.providers)
+
+        def score(item):
+            index, name = item
+            stats = self.stats[name]
+            latency = stats.p95() if len(stats.latencies) >= self.min_samples else None
+            latency = self.default_latency if latency is None else latency
+            return stats.error_rate > self.max_error_rate, latency * (1 + stats.error_rate), index
+
+        return [name for _, name in sorted(enumerate(names), key=score)]
+
+    async def _attempt(self, name: str, text: str, type: str, language: str, output_path: str) -> str:
+        generator = self.providers[name]
+        start = time.monotonic()
+        try:
+            # 缓存已在路由前查过，带缓存的生成器不再重复查找
+            kwargs = {'check_cache': False} if hasattr(generator, 'fetch') else {}
+            if self.limiter is not None:
+                path = await self.limiter.run_async(name, generator.generate_async, text, type, language,
+                                                    output_path=output_path, **kwargs)
+            else:
+                path = await generator.generate_async(text, type, language, output_path=output_path, **kwargs)
+        except Exception:
+            self.stats[name].record(ok=False)
+            raise
+        self.stats[name].record(time.monotonic() - start)
+        return path
+
+    def _fetch_cached(self, ranked: List[str], text: str, language: str, output_path) -> bool:
+        """先用contains()探查，只对选中的服务调用fetch()，避免每次查找都给其余服务记一次未命中"""
+        name = next((name for name in ranked if hasattr(self.providers[name], 'contains')
+                     and self.providers[name].contains(text, language)), ranked[0])
+        fetch = getattr(self.providers[name], 'fetch', None)
+        return fetch is not None and fetch(text, language, output_path)
+
+    @staticmethod
+    def _discard(task: asyncio.Future):
+        """对冲中落后的请求完成后删除其输出"""
+        if task.cancelled() or task.exception() is not None:
+            return
+        path = task.result()
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    async def generate(self, text: str, type: str = "word", language: str = "en", output_path: str = None) -> str:
+        """
+        生成语音，参数与各语音生成器一致
+
+        Returns:
+            str: 生成的音频文件路径
+
+        Raises:
+            Exception: 所有服务均失败
+        """
+        ranked = self.rank(language)
+        if not ranked:
+            raise ValueError(f"没有可用于语言 {language} 的语音服务")
+
+        # 任一服务命中缓存时直接使用，不发请求；缓存查找涉及SQLite和文件读写，放到线程池中执行
+        if output_path and await asyncio.get_running_loop().run_in_executor(
+                None, self._fetch_cached, ranked, text, language, output_path):
+            return str(output_path)
+
+        queue = list(ranked)
+        pending = {}
+        errors = []
+
+        def launch():
+            name = queue.pop(0)
+            # 同时进行的请求各自写入独立的文件，胜出者再替换为目标文件
+            part_path = f"{output_path}.{name}.wav" if output_path else None
+            task = asyncio.ensure_future(self._attempt(name, text, type, language, part_path))
+            pending[task] = name
+
+        launch()
+        while pending:
+            can_hedge = self.hedge_delay and queue and len(pending) < 2
+            done, _ = await asyncio.wait(pending, timeout=self.hedge_delay if can_hedge else None,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                self.hedges += 1
+                self.logger.info(f"语音服务 {next(iter(pending.values()))} 超过 {self.hedge_delay}秒未返回，向 {queue[0]} 发出对冲请求: {text}")
+                launch()
+                continue
+
+            for task in done:
+                name = pending.pop(task)
+                try:
+                    path = task.result()
+                except Exception as e:
+                    self.logger.warning(f"语音服务 {name} 失败: {str(e)}")
+                    errors.append(f"{name}: {str(e)}")
+                    continue
+                for loser in pending:
+                    loser.add_done_callback(self._discard)
+                if name != ranked[0]:
+                    self.secondary_wins += 1
+                if output_path:
+                    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+                    os.replace(path, output_path)
+                    path = str(output_path)
+                return path
+
+            if not pending and queue:
+                launch()
+
+        raise Exception(f"所有语音服务均失败: {'; '.join(errors)}")
+
+    def summary(self) -> List[Dict]:
+        """各服务的统计信息"""
+        return [{
+            'name': name,
+            'completed': stats.completed,
+            'failed': stats.failed,
+            'p95': stats.p95(),
+            'error_rate': stats.error_rate,
+        } for name, stats in self.stats.items()]
@@ -1,207 +1,318 @@
+import asyncio
+import functools
+import math
 import os
 import subprocess
+import tempfile
 from pathlib import Path
 import time
-import tempfile
+from modules.audio_mix import AudioAssembler, WavFormatError
 from modules.config import ConfigManager
+from modules.duration import get_duration_service
+from modules.ffmpeg_pool import FFmpegError, FFmpegPool, get_ffmpeg_pool
 from modules.logger import get_logger
 
 class VideoGenerator:
-    def __init__(self):
+    # 根据质量设置编码参数
+    QUALITY_PRESETS = {
+        'low': {
+            'video_bitrate': '1M',
+            'preset': 'ultrafast',
+            'crf': '28'
+        },
+        'medium': {
+            'video_bitrate': '2M',
+            'preset': 'medium',
+            'crf': '23'
+        },
+        'high': {
+            'video_bitrate': '4M',
+            'preset': 'slow',
+            'crf': '18'
+        }
+    }
+
+    # 拼接前统一的音频格式
+    SAMPLE_RATE = 44100
+
+    # 输出视频高度
+    VIDEO_HEIGHT = 1080
+
+    # 非静态图模式下分段编码的帧率，各段时长补齐到整帧
+    SEGMENT_FPS = 25
+
+    def __init__(self, ffmpeg_config: dict = None, output_dir=None):
+        """
+        Args:
+            ffmpeg_config: FFmpeg配置，默认读取配置文件（供基准测试等场景直接传入）
+            output_dir: 默认输出目录，默认读取配置文件
+        """
         self.logger = get_logger(__name__)
-        self.config_manager = ConfigManager()
-        self.output_dir = self.config_manager.get_output_base_dir()
-        self.ffmpeg_config = self.config_manager.get_ffmpeg_config()
-    
+        if ffmpeg_config is None or output_dir is None:
+            self.config_manager = ConfigManager()
+            output_dir = output_dir or self.config_manager.get_output_base_dir()
+            ffmpeg_config = ffmpeg_config if ffmpeg_config is not None else self.config_manager.get_ffmpeg_config()
+        self.output_dir = Path(output_dir)
+        self.ffmpeg_config = ffmpeg_config
+        # 与FFmpeg滤镜图拼接的输出格式一致，两种方式生成的片段可以直接拼接
+        self.assembler = AudioAssembler(sample_rate=self.SAMPLE_RATE, channels=2)
+
+        # 静态图模式：图像预先缩放，以极低帧率和长GOP编码
+        self.still_image = self.ffmpeg_config.get('still_image', True)
+        self.still_fps = int(self.ffmpeg_config.get('still_fps', 5))
+        self.still_gop_seconds = int(self.ffmpeg_config.get('still_gop_seconds', 60))
+
+    def build_audio_filter(self, audio_count: int, lead_silence_duration: float = 1,
+                           audio_gap: float = 1, end_pause: float = 1, first_input: int = 1,
+                           prefix: str = '') -> str:
+        """
+        构建拼接音频的滤镜图
+
+        各段音频统一为立体声后拼接，段间间隔用apad补齐，前导静音用adelay，
+        结尾静置再用apad补齐，输出标签为 [aout]。
+
+        Args:
+            audio_count: 音频段数
+            lead_silence_duration: 前导静音时间（秒）
+            audio_gap: 各段音频之间的间隔时间（秒）
+            end_pause: 音频结束后的静置时间（秒）
+            first_input: 第一段音频的输入序号
+            prefix: 标签前缀，同一滤镜图中拼接多组音频时区分各组
+
+        Returns:
+            str: filter_complex 字符串
+        """
+        chains = []
+        labels = []
+        for i in range(audio_count):
+            chain = f"[{first_input + i}:a]aformat=sample_rates={self.SAMPLE_RATE}:channel_layouts=stereo"
+            if audio_gap > 0 and i < audio_count - 1:
+                chain += f",apad=pad_dur={audio_gap}"
+            chains.append(f"{chain}[{prefix}a{i}]")
+            labels.append(f"[{prefix}a{i}]")
+
+        mix = f"{''.join(labels)}concat=n={audio_count}:v=0:a=1"
+        if lead_silence_duration > 0:
+            mix += f",adelay=delays={int(round(lead_silence_duration * 1000))}:all=1"
+        if end_pause > 0:
+            mix += f",apad=pad_dur={end_pause}"
+        chains.append(f"{mix}[{prefix}aout]")
+        return ";".join(chains)
+
+    def build_command(self, image_path: str, audio_paths: list,
+                      quality: str = 'medium',
+                      lead_silence_duration: float = 1,
+                      end_pause: float = 1,
+                      audio_gap: float = 1,
+                      output_video_path: str = None,
+                      output_audio_path: str = None,
+                      assembled: bool = False,
+                      still: bool = False,
+                      duration: float = None,
+                      pcm_format: tuple = None,
+                      subtitles: list = None) -> list:
+        """
+        构建单次调用完成音频拼接和视频编码的FFmpeg命令
+
+        Args:
+            image_path: 图像路径
+            audio_paths: 按播放顺序排列的音频路径
+            output_audio_path: 拼接后音频的附带输出路径（可选）
+            assembled: audio_paths 为已拼接好的单条音轨，只需封装
+            still: 静态图模式，image_path 须已缩放到目标尺寸
+            duration: 视频总时长（秒），未知时以音频结束为准
+            pcm_format: (采样率, 声道数)，已拼接的音轨以16位PCM从标准输入传入，忽略audio_paths
+            subtitles: (SRT路径, ISO 639-2语言代码) 列表，作为mov_text软字幕流封装（可选）
+
+        Returns:
+            list: FFmpeg命令参数
+        """
+        # 使用默认质量如果未指定
+        quality_settings = self.QUALITY_PRESETS.get(quality, self.QUALITY_PRESETS['medium'])
+        audio_codec = self.ffmpeg_config.get('audio_codec', 'aac')
+        audio_bitrate = self.ffmpeg_config.get('audio_bitrate', '192k')
+
+        if still:
+            # 输入端就以低帧率循环，避免生成再丢弃大量相同帧
+            inputs = ['-loop', '1', '-framerate', str(self.still_fps), '-i', str(image_path)]
+        else:
+            inputs = ['-loop', '1', '-i', str(image_path)]
+        if pcm_format:
+            sample_rate, channels = pcm_format
+            inputs.extend(['-f', 's16le', '-ar', str(sample_rate), '-ac', str(channels), '-i', 'pipe:0'])
+            assembled = True
+        else:
+            for audio_path in audio_paths:
+                inputs.extend(['-i', str(audio_path)])
+
+        subtitle_options = self._add_subtitle_inputs(inputs, subtitles)
+
+        if assembled:
+            filter_complex = "[1:a]anull[aout]"
+        else:
+            filter_complex = self.build_audio_filter(len(audio_paths), lead_silence_duration, audio_gap, end_pause)
+        if output_audio_path:
+            filter_complex = filter_complex[:-len('[aout]')] + ",asplit=2[aout][aside]"
+        if still:
+            filter_complex += ";[0:v]format=yuv420p[vout]"
+            # 整段只有一个关键帧，其余帧几乎全是跳过宏块
+            video_options = [
+                '-r', str(self.still_fps),
+                '-g', str(self.still_fps * self.still_gop_seconds),
+            ]
+        else:
+            # 确保1080p和兼容性
+            filter_complex += f";[0:v]scale=-2:{self.VIDEO_HEIGHT},format=yuv420p[vout]"
+            video_options = ['-b:v', quality_settings['video_bitrate']]
+        # 图像无限循环，时长已知时精确截断，否则以音频结束为准
+        length_options = ['-t', f"{duration:.3f}"] if duration else ['-shortest']
+
+        command = [
+            'ffmpeg', '-y',
+            *inputs,
+            '-filter_complex', filter_complex,
+            '-map', '[vout]',
+            '-map', '[aout]',
+            *subtitle_options,
+            '-c:v', self.ffmpeg_config.get('video_codec', 'libx264'),
+            '-preset', quality_settings['preset'],
+            '-crf', quality_settings['crf'],
+            *video_options,
+            '-tune', 'stillimage',
+            '-c:a', audio_codec,
+            '-b:a', audio_bitrate,
+            '-pix_fmt', self.ffmpeg_config.get('pixel_format', 'yuv420p'),
+            *length_options,
+            str(output_video_path)
+        ]
+        if output_audio_path:
+            command.extend(['-map', '[aside]', '-c:a', audio_codec, '-b:a', audio_bitrate, str(output_audio_path)])
+        return command
+
+    @staticmethod
+    def _add_subtitle_inputs(inputs: list, subtitles: list) -> list:
+        """字幕作为额外输入，在同一次编码中封装为mov_text流，不再单独重写视频；返回输出端的映射参数"""
+        subtitle_options = []
+        first_subtitle = inputs.count('-i')
+        for index, (srt_path, language) in enumerate(subtitles or []):
+            inputs.extend(['-i', str(srt_path)])
+            subtitle_options.extend(['-map', f"{first_subtitle + index}:s", f"-metadata:s:s:{index}", f"language={language}"])
+        if subtitle_options:
+            subtitle_options.extend(['-c:s', 'mov_text'])
+        return subtitle_options
+
     def generate(self, image_path: str, audio_path: str, audio_zh_path: str = None, 
                 quality: str = 'medium',
                 lead_silence_duration: float = 1,
                 end_pause: float = 1,
                 audio_gap: float = 1,
                 output_video_path: str = None,
-                output_audio_path: str = None) -> str:
+                output_audio_path: str = None,
+                still: bool = None,
+                subtitles: list = None) -> str:
         """生成视频，将多个音频和一个图片合成为视频
-        
+
+        输入都是PCM WAV且numpy可用时，先在进程内拼接成一条音轨，
+        经标准输入传给FFmpeg，只负责编码封装；否则前导静音、段间间隔和结尾静置
+        由FFmpeg滤镜图完成。两种方式都只调用一次FFmpeg，音频只编码一次。
+        静态图模式下图像先缩放一次，再以低帧率、单关键帧编码。
+
         Args:
             image_path: 图像路径
-            audio_path: 音频路径
-            audio_zh_path: 中文音频路径（可选）
+            audio_path: 音频路径，或内存中的音频（Artifact）
+            audio_zh_path: 中文音频路径或Artifact（可选）
             quality: 视频质量，可选值: 'low', 'medium', 'high'
             lead_silence_duration: 前导静音时间（秒）
             end_pause: 音频结束后的静置时间（秒）
             audio_gap: 各段音频之间的间隔时间（秒）
-            output_path: 输出视频路径（可选）
+            output_video_path: 输出视频路径（可选）
+            output_audio_path: 同时输出拼接后的音频文件（可选）
+            still: 是否使用静态图模式，默认读取配置 ffmpeg.still_image
+            subtitles: (SRT路径, 语言代码如 eng/chi) 列表，在本次编码中封装为软字幕（可选）
 
         Returns:
             str: 生成的视频路径
         """
-        if output_video_path is None:
-            timestamp = int(time.time())
-            output_video_path = self.output_dir / f"video_{timestamp}.mp4"
-        
-        if output_audio_path is None:
-            timestamp = int(time.time()) if 'timestamp' not in locals() else timestamp
-            output_audio_path = self.output_dir / f"audio_{timestamp}.aac"
-
-        # Convert Path objects to strings
-        image_path = str(image_path)
-        audio_path = str(audio_path) if audio_path else None
-        audio_zh_path = str(audio_zh_path) if audio_zh_path else None
-        output_video_path = str(output_video_path)
-        output_audio_path = str(output_audio_path)
+        command, output_video_path, temp_paths, pcm = self._prepare_encode(
+            image_path, audio_path, audio_zh_path, quality, lead_silence_duration, end_pause, audio_gap,
+            output_video_path, output_audio_path, still, subtitles
+        )
+        try:
+            self.logger.debug(f"FFmpeg命令: {' '.join(command)}")
+            subprocess.run(command, input=pcm, check=True, capture_output=True)
+            self.logger.info(f"视频生成成功: {output_video_path}")
+            return output_video_path
+        except subprocess.CalledProcessError as e:
+            error_message = e.stderr.decode()
+            self.logger.error(f"生成视频时出错: {error_message}")
+            raise Exception(f"Error generating video: {error_message}")
+        finally:
+            self._cleanup(temp_paths)
+
+    async def generate_async(self, image_path: str, audio_path: str, audio_zh_path: str = None,
+                             quality: str = 'medium',
+                             lead_silence_duration: float = 1,
+                             end_pause: float = 1,
+                             audio_gap: float = 1,
+                             output_video_path: str = None,
+                             output_audio_path: str = None,
+                             still: bool = None,
+                             subtitles: list = None,
+                             pool: FFmpegPool = None) -> str:
+        """
+        异步生成视频，参数与generate相同
+
+        音轨拼接和图像缩放在线程池中完成，编码交给共享的FFmpeg调度排队执行，
+        不阻塞事件循环。
 
-        print("path", image_path, audio_path, audio_zh_path, output_video_path, output_audio_path)
-        # 创建临时目录
-        temp_dir = tempfile.mkdtemp()
-        
+        Args:
+            pool: FFmpeg编码调度，默认使用进程内共享的调度
+        """
+        loop = asyncio.get_running_loop()
+        command, output_video_path, temp_paths, pcm = await loop.run_in_executor(None, functools.partial(
+            self._prepare_encode,
+            image_path, audio_path, audio_zh_path, quality, lead_silence_duration, end_pause, audio_gap,
+            output_video_path, output_audio_path, still, subtitles
+        ))
+        try:
+            await (pool or get_ffmpeg_pool()).run(command, input=pcm)
+            self.logger.info(f"视频生成成功: {output_video_path}")
+            return output_video_path
+        except FFmpegError as e:
+            self.logger.error(f"生成视频时出错: {e.stderr or str(e)}")
+            raise Exception(f"Error generating video: {str(e)}")
+        finally:
+            self._cleanup(temp_paths)
+
+    def generate_segments(self, segments: list, quality: str = 'medium', output_video_path: str = None,
+                          output_audio_path: str = None, still: bool = None, subtitles: list = None) -> str:
+        """
+        一次编码把多个（图像, 音频）片段依次渲染到同一个视频
+
+        每段的时长补齐到整帧，切换点落在帧边界上并强制为关键帧；
+        音频在进程内逐段拼接后经标准输入传给FFmpeg（不满足条件时由滤镜图拼接并按段截齐）。
+        与分别生成再合并相比，只启动一次FFmpeg、只预热一次编码器。
+
+        Args:
+            segments: 片段列表，每项为dict：
+                image_path: 图像路径
+                audio: 按播放顺序排列的音频路径或Artifact
+                lead_silence_duration / audio_gap / end_pause: 与generate相同，默认均为1秒
+            quality: 视频质量，可选值: 'low', 'medium', 'high'
+            output_video_path: 输出视频路径（可选）
+            output_audio_path: 同时输出拼接后的音频文件（可选）
+            still: 是否使用静态图模式，默认读取配置 ffmpeg.still_image
+            subtitles: (SRT路径, 语言代码) 列表，时间以整个输出视频为准（可选）
+
+        Returns:
+            str: 生成的视频路径
+        """
+        command, output_video_path, temp_paths, pcm = self._prepare_segments(
+            segments, quality, output_video_path, output_audio_path, still, subtitles
+        )
         try:
-            # 收集所有存在的音频文件路径
-            audio_paths = []
-            if audio_path and os.path.exists(audio_path):
-                audio_paths.append(audio_path)
-            if audio_zh_path and os.path.exists(audio_zh_path):
-                audio_paths.append(audio_zh_path)
-            
-            if not audio_paths:
-                self.logger.error("没有提供有效的音频文件")
-                raise ValueError("至少需要提供一个有效的音频文件")
-            
-            # 计算所有音频的总时长
-            total_audio_duration = 0
-            for audio_path in audio_paths:
-                try:
-                    cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", 
-                          "default=noprint_wrappers=1:nokey=1", audio_path]
-                    duration = float(subprocess.check_output(cmd).decode().strip())
-                    total_audio_duration += duration
-                    self.logger.debug(f"音频 {audio_path} 时长: {duration}秒")
-                except Exception as e:
-                    self.logger.warning(f"无法获取音频 {audio_path} 时长，使用默认值: {e}")
-                    total_audio_duration += 2.0  # 默认每个音频2秒
-            
-            # 添加音频间隔时间
-            total_audio_duration += audio_gap * (len(audio_paths) - 1)
-            
-            # 在音频结束后添加指定的静置时间
-            total_duration = total_audio_duration + end_pause
-            self.logger.debug(f"添加 {end_pause}秒 结束暂停，总时长: {total_duration}秒")
-
-            # 添加前导静音
-            silence_file = os.path.join(temp_dir, "silence.aac")
-            silence_cmd = [
-                "ffmpeg",
-                "-f", "lavfi",
-                "-i", f"anullsrc=r=44100:cl=stereo",
-                "-t", str(lead_silence_duration),
-                "-c:a", "aac",
-                "-b:a", "192k",
-                silence_file
-            ]
-            subprocess.run(silence_cmd, check=True, capture_output=True)
-            
-            # 创建音频间隔文件
-            gap_file = os.path.join(temp_dir, "gap.aac")
-            if audio_gap > 0:
-                gap_cmd = [
-                    "ffmpeg",
-                    "-f", "lavfi",
-                    "-i", f"anullsrc=r=44100:cl=stereo",
-                    "-t", str(audio_gap),
-                    "-c:a", "aac",
-                    "-b:a", "192k",
-                    gap_file
-                ]
-                subprocess.run(gap_cmd, check=True, capture_output=True)
-            
-            # 准备合并所有音频
-            concat_parts = []
-            concat_inputs = []
-            
-            # 添加前导静音
-            concat_inputs = ["-i", silence_file]
-            concat_parts = ["[0:a]"]
-            
-            # 添加所有音频文件和间隔
-            for i, audio_path in enumerate(audio_paths):
-                # 添加音频文件
-                concat_inputs.extend(["-i", audio_path])
-                concat_parts.append(f"[{len(concat_parts)}:a]")
-
-                # 添加间隔文件
-                if i < len(audio_paths) - 1:
-                    concat_inputs.extend(["-i", gap_file])
-                    concat_parts.append(f"[{len(concat_parts)}:a]")
-
-            self.logger.debug(f'concat_inputs: {concat_inputs}')
-            self.logger.debug(f'concat_parts: {concat_parts}')
-            
-            # 拼接所有音频
-            concat_string = "".join(concat_parts)
-            concat_count = len(concat_parts)
-            filter_complex = f"{concat_string}concat=n={concat_count}:v=0:a=1[out]"
-            
-            # 合并所有音频文件
-            combined_audio = output_audio_path
-            concat_audio_cmd = [
-                "ffmpeg",
-                *concat_inputs,
-                "-filter_complex", filter_complex,
-                "-map", "[out]",
-                "-c:a", "aac",
-                "-b:a", "192k",
-                combined_audio
-            ]
-            
-            self.logger.debug(f"合并音频命令: {' '.join(concat_audio_cmd)}")
-            subprocess.run(concat_audio_cmd, check=True, capture_output=True)
-            
-            # 根据质量设置编码参数
-            quality_presets = {
-                'low': {
-                    'video_bitrate': '1M',
-                    'preset': 'ultrafast',
-                    'crf': '28'
-                },
-                'medium': {
-                    'video_bitrate': '2M',
-                    'preset': 'medium',
-                    'crf': '23'
-                },
-                'high': {
-                    'video_bitrate': '4M',
-                    'preset': 'slow',
-                    'crf': '18'
-                }
-            }
-            
-            # 使用默认质量如果未指定
-            quality_settings = quality_presets.get(quality, quality_presets['medium'])
-            
-            # 更新总时长，加上前导静音时长
-            total_duration += lead_silence_duration
-            
-            # 使用FFmpeg将图片和音频合成为视频
-            command = [
-                'ffmpeg',
-                '-loop', '1',
-                '-i', image_path,
-                '-i', combined_audio,
-                '-c:v', self.ffmpeg_config.get('video_codec', 'libx264'),
-                '-preset', quality_settings['preset'],
-                '-crf', quality_settings['crf'],
-                '-b:v', quality_settings['video_bitrate'],
-                '-tune', 'stillimage',
-                '-c:a', self.ffmpeg_config.get('audio_codec', 'aac'),
-                '-b:a', self.ffmpeg_config.get('audio_bitrate', '192k'),
-                '-pix_fmt', self.ffmpeg_config.get('pixel_format', 'yuv420p'),
-                '-vf', 'scale=-2:1080,format=yuv420p', # 确保1080p和兼容性
-                '-t', str(total_duration),  # 指定时长确保音频完全播放
-                output_video_path
-            ]
-            
-            self.logger.info(f"开始生成视频，使用图像: {image_path} 和 {len(audio_paths)} 个音频文件")
             self.logger.debug(f"FFmpeg命令: {' '.join(command)}")
-            subprocess.run(command, check=True, capture_output=True)
+            subprocess.run(command, input=pcm, check=True, capture_output=True)
             self.logger.info(f"视频生成成功: {output_video_path}")
             return output_video_path
         except subprocess.CalledProcessError as e:
@@ -209,6 +320,391 @@ class VideoGenerator:
             self.logger.error(f"生成视频时出错: {error_message}")
             raise Exception(f"Error generating video: {error_message}")
         finally:
-            # 清理临时文件
-            import shutil
-            shutil.rmtree(temp_dir) 
\ No newline at end of file
+            self._cleanup(temp_paths)
+
+    async def generate_segments_async(self, segments: list, quality: str = 'medium', output_video_path: str = None,
+                                      output_audio_path: str = None, still: bool = None, subtitles: list = None,
+                                      pool: FFmpegPool = None) -> str:
+        """
+        异步的分段编码，参数与generate_segments相同
+
+        Args:
+            pool: FFmpeg编码调度，默认使用进程内共享的调度
+        """
+        loop = asyncio.get_running_loop()
+        command, output_video_path, temp_paths, pcm = await loop.run_in_executor(None, functools.partial(
+            self._prepare_segments, segments, quality, output_video_path, output_audio_path, still, subtitles
+        ))
+        try:
+            await (pool or get_ffmpeg_pool()).run(command, input=pcm)
+            self.logger.info(f"视频生成成功: {output_video_path}")
+            return output_video_path
+        except FFmpegError as e:
+            self.logger.error(f"生成视频时出错: {e.stderr or str(e)}")
+            raise Exception(f"Error generating video: {str(e)}")
+        finally:
+            self._cleanup(temp_paths)
+
+    def segment_timeline(self, segments: list, still: bool = None) -> list:
+        """
+        分段编码的时间轴，与generate_segments的切换点完全一致
+
+        Returns:
+            list: 每段一个dict，start 为该段在视频中的开始时间，duration 为该段时长，
+                  segments 为段内各音频的 [开始, 结束]（秒，相对该段开始）
+        """
+        still = self.still_image if still is None else still
+        return [{'start': plan['start'], 'duration': plan['duration'], 'segments': plan['segments']}
+                for plan in self._plan_segments(segments, still)]
+
+    def _plan_segments(self, segments: list, still: bool) -> list:
+        """计算各段的音频、对齐到整帧的时长和在视频中的开始时间"""
+        if not segments:
+            raise ValueError("至少需要提供一个片段")
+        fps = self.still_fps if still else self.SEGMENT_FPS
+        plans = []
+        start = 0.0
+        for index, segment in enumerate(segments):
+            sources = self._collect_sources(*(segment.get('audio') or []))
+            lead_silence_duration = segment.get('lead_silence_duration', 1)
+            audio_gap = segment.get('audio_gap', 1)
+            timeline = self._timeline(sources, lead_silence_duration, audio_gap, segment.get('end_pause', 1), fps)
+            if not timeline['duration']:
+                raise ValueError(f"无法获取第{index + 1}段音频的时长，不能分段编码")
+            # 按帧数累计，切换点不受浮点误差影响
+            frames = int(round(timeline['duration'] * fps))
+            plans.append({
+                'image_path': segment['image_path'],
+                'sources': sources,
+                'lead_silence_duration': lead_silence_duration,
+                'audio_gap': audio_gap,
+                'end_pause': timeline['end_pause'],
+                'frames': frames,
+                'duration': frames / fps,
+                'start': start,
+                'segments': timeline['segments'],
+            })
+            start += frames / fps
+        return plans
+
+    def _prepare_segments(self, segments, quality, output_video_path, output_audio_path, still, subtitles):
+        """准备分段编码，返回 (命令, 输出视频路径, 临时文件列表, 标准输入数据)"""
+        if output_video_path is None:
+            timestamp = int(time.time())
+            output_video_path = self.output_dir / f"video_{timestamp}.mp4"
+        output_video_path = str(output_video_path)
+        still = self.still_image if still is None else still
+        plans = self._plan_segments(segments, still)
+
+        temp_paths = []
+        audio_paths = []
+        try:
+            track = self._render_segments(plans)
+            if track is None:
+                for plan in plans:
+                    audio_paths.append(self._materialize(plan['sources'], temp_paths))
+            images = []
+            for plan in plans:
+                image = self._prescale_image(plan['image_path']) if still else str(plan['image_path'])
+                if image != str(plan['image_path']):
+                    temp_paths.append(image)
+                images.append(image)
+        except Exception:
+            self._cleanup(temp_paths)
+            raise
+
+        command = self.build_segments_command(
+            plans, images, audio_paths,
+            quality=quality,
+            output_video_path=output_video_path,
+            output_audio_path=str(output_audio_path) if output_audio_path else None,
+            still=still,
+            pcm_format=(track['sample_rate'], track['channels']) if track else None,
+            subtitles=[(path, language) for path, language in subtitles or [] if path and os.path.exists(path)]
+        )
+        self.logger.info(f"开始分段生成视频: {len(plans)} 段，总时长 {sum(plan['duration'] for plan in plans):.3f}秒")
+        return command, output_video_path, temp_paths, track['pcm'] if track else None
+
+    def _render_segments(self, plans: list) -> dict:
+        """在进程内逐段拼接音轨并首尾相接，各段按整帧时长截齐；不满足条件时返回None"""
+        if not self.assembler.available():
+            return None
+        try:
+            chunks = []
+            for plan in plans:
+                track = self.assembler.render(self._wav_inputs(plan['sources']), plan['lead_silence_duration'],
+                                         plan['audio_gap'], plan['end_pause'])
+                size = int(round(plan['duration'] * track['sample_rate'])) * track['channels'] * 2
+                chunks.append(track['pcm'][:size].ljust(size, b'\x00'))
+        except WavFormatError as e:
+            self.logger.debug(f"音频不是PCM WAV，使用FFmpeg拼接: {str(e)}")
+            return None
+        return {'sample_rate': self.assembler.sample_rate, 'channels': self.assembler.channels,
+                'pcm': b''.join(chunks)}
+
+    def build_segments_command(self, plans: list, images: list, audio_paths: list,
+                               quality: str = 'medium',
+                               output_video_path: str = None,
+                               output_audio_path: str = None,
+                               still: bool = False,
+                               pcm_format: tuple = None,
+                               subtitles: list = None) -> list:
+        """
+        构建分段编码的FFmpeg命令
+
+        Args:
+            plans: _plan_segments() 的结果
+            images: 各段的图像路径，静态图模式下须已缩放到目标尺寸
+            audio_paths: 各段的音频路径列表，pcm_format给定时忽略
+            output_audio_path: 拼接后音频的附带输出路径（可选）
+            still: 静态图模式
+            pcm_format: (采样率, 声道数)，整条音轨以16位PCM从标准输入传入
+            subtitles: (SRT路径, 语言代码) 列表（可选）
+
+        Returns:
+            list: FFmpeg命令参数
+        """
+        quality_settings = self.QUALITY_PRESETS.get(quality, self.QUALITY_PRESETS['medium'])
+        audio_codec = self.ffmpeg_config.get('audio_codec', 'aac')
+        audio_bitrate = self.ffmpeg_config.get('audio_bitrate', '192k')
+        fps = self.still_fps if still else self.SEGMENT_FPS
+
+        # 各段图像以目标帧率循环，-t 取在最后一帧和下一帧之间，恰好得到 frames 帧
+        inputs = []
+        for plan, image in zip(plans, images):
+            inputs.extend(['-loop', '1', '-framerate', str(fps), '-t', f"{(plan['frames'] - 0.5) / fps:.6f}",
+                           '-i', str(image)])
+
+        # 输出尺寸以第一段图像为准，其他尺寸的图像等比缩放后居中补边
+        from PIL import Image
+        with Image.open(images[0]) as image:
+            width = max(2, int(round(image.width * self.VIDEO_HEIGHT / image.height / 2)) * 2)
+        height = self.VIDEO_HEIGHT
+        chains = [
+            f"[{index}:v]scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,format=yuv420p[v{index}]"
+            for index in range(len(plans))
+        ]
+        chains.append(f"{''.join(f'[v{index}]' for index in range(len(plans)))}concat=n={len(plans)}:v=1:a=0[vout]")
+
+        if pcm_format:
+            sample_rate, channels = pcm_format
+            audio_input = inputs.count('-i')
+            inputs.extend(['-f', 's16le', '-ar', str(sample_rate), '-ac', str(channels), '-i', 'pipe:0'])
+            chains.append(f"[{audio_input}:a]anull[aout]")
+        else:
+            labels = []
+            for index, (plan, paths) in enumerate(zip(plans, audio_paths)):
+                first_input = inputs.count('-i')
+                inputs.extend(arg for path in paths for arg in ('-i', str(path)))
+                chains.append(self.build_audio_filter(len(paths), plan['lead_silence_duration'], plan['audio_gap'],
+                                                      0, first_input=first_input, prefix=f"s{index}"))
+                # 补齐并截断到该段的整帧时长，切换点与视频一致
+                chains.append(f"[s{index}aout]apad=whole_dur={plan['duration']:.6f},"
+                              f"atrim=duration={plan['duration']:.6f}[sa{index}]")
+                labels.append(f"[sa{index}]")
+            chains.append(f"{''.join(labels)}concat=n={len(plans)}:v=0:a=1[aout]")
+        if output_audio_path:
+            chains[-1] = chains[-1][:-len('[aout]')] + ",asplit=2[aout][aside]"
+        subtitle_options = self._add_subtitle_inputs(inputs, subtitles)
+
+        if still:
+            video_options = ['-g', str(fps * self.still_gop_seconds)]
+        else:
+            video_options = ['-b:v', quality_settings['video_bitrate']]
+        # 每段开头都是关键帧，切换点可精确定位和无损切分
+        cut_points = ','.join(f"{plan['start']:.6f}" for plan in plans[1:])
+        if cut_points:
+            video_options.extend(['-force_key_frames', cut_points])
+
+        command = [
+            'ffmpeg', '-y',
+            *inputs,
+            '-filter_complex', ';'.join(chains),
+            '-map', '[vout]',
+            '-map', '[aout]',
+            *subtitle_options,
+            '-c:v', self.ffmpeg_config.get('video_codec', 'libx264'),
+            '-preset', quality_settings['preset'],
+            '-crf', quality_settings['crf'],
+            '-r', str(fps),
+            *video_options,
+            '-tune', 'stillimage',
+            '-c:a', audio_codec,
+            '-b:a', audio_bitrate,
+            '-pix_fmt', self.ffmpeg_config.get('pixel_format', 'yuv420p'),
+            str(output_video_path)
+        ]
+        if output_audio_path:
+            command.extend(['-map', '[aside]', '-c:a', audio_codec, '-b:a', audio_bitrate, str(output_audio_path)])
+        return command
+
+    def _prepare_encode(self, image_path, audio_path, audio_zh_path, quality, lead_silence_duration,
+                        end_pause, audio_gap, output_video_path, output_audio_path, still, subtitles=None):
+        """准备编码：拼接音轨、缩放图像并构建FFmpeg命令，返回 (命令, 输出视频路径, 临时文件列表, 标准输入数据)"""
+        if output_video_path is None:
+            timestamp = int(time.time())
+            output_video_path = self.output_dir / f"video_{timestamp}.mp4"
+
+        sources = self._collect_sources(audio_path, audio_zh_path)
+        output_video_path = str(output_video_path)
+        still = self.still_image if still is None else still
+        timeline = self._timeline(sources, lead_silence_duration, audio_gap, end_pause,
+                                  self.still_fps if still else None)
+        duration, end_pause = timeline['duration'], timeline['end_pause']
+        temp_paths = []
+        audio_paths = []
+        try:
+            track = self._render_track(sources, lead_silence_duration, audio_gap, end_pause)
+            if track is None:
+                audio_paths = self._materialize(sources, temp_paths)
+            still_path = self._prescale_image(image_path) if still else None
+            if still_path != str(image_path):
+                temp_paths.append(still_path)
+        except Exception:
+            self._cleanup(temp_paths)
+            raise
+
+        command = self.build_command(
+            still_path or image_path, audio_paths,
+            quality=quality,
+            lead_silence_duration=lead_silence_duration,
+            end_pause=end_pause,
+            audio_gap=audio_gap,
+            output_video_path=output_video_path,
+            output_audio_path=str(output_audio_path) if output_audio_path else None,
+            still=still,
+            duration=duration,
+            pcm_format=(track['sample_rate'], track['channels']) if track else None,
+            subtitles=[(path, language) for path, language in subtitles or [] if path and os.path.exists(path)]
+        )
+        self.logger.info(f"开始生成视频，使用图像: {image_path} 和 {len(sources)} 个音频")
+        return command, output_video_path, [path for path in temp_paths if path], track['pcm'] if track else None
+
+    @staticmethod
+    def _wav_inputs(sources: list) -> list:
+        """AudioAssembler的输入：内存数据直接传缓冲区"""
+        return [source.view if hasattr(source, 'view') else source for source in sources]
+
+    def _materialize(self, sources: list, temp_paths: list) -> list:
+        """FFmpeg滤镜图需要文件输入，未保存的内存数据写入本地临时文件"""
+        paths = []
+        for source in sources:
+            if not hasattr(source, 'view'):
+                paths.append(source)
+            elif source.path and os.path.exists(source.path):
+                paths.append(source.path)
+            else:
+                fd, temp_path = tempfile.mkstemp(prefix='pictale-', suffix=source.meta.get('suffix', '.wav'))
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(source.data)
+                temp_paths.append(temp_path)
+                paths.append(temp_path)
+        return paths
+
+    def _cleanup(self, temp_paths: list):
+        """删除编码用的临时文件"""
+        for temp_path in temp_paths:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def timeline(self, audio_path, audio_zh_path=None, lead_silence_duration: float = 1,
+                 audio_gap: float = 1, end_pause: float = 1, still: bool = None) -> dict:
+        """
+        计算视频的时间轴，与编码时的拼接方式和结尾对齐完全一致
+
+        WAV只读取文件头（内存数据直接解析缓冲区），不需要再次探测音频。
+
+        Args:
+            audio_path: 音频路径或Artifact
+            audio_zh_path: 中文音频路径或Artifact（可选）
+            lead_silence_duration: 前导静音时间（秒）
+            audio_gap: 各段音频之间的间隔时间（秒）
+            end_pause: 音频结束后的静置时间（秒）
+            still: 是否使用静态图模式，默认读取配置 ffmpeg.still_image
+
+        Returns:
+            dict: duration 为视频总时长（无法获取时为None），segments 为各段音频的 [开始, 结束]（秒）
+        """
+        still = self.still_image if still is None else still
+        timeline = self._timeline(self._collect_sources(audio_path, audio_zh_path),
+                                  lead_silence_duration, audio_gap, end_pause, self.still_fps if still else None)
+        return {'duration': timeline['duration'], 'segments': timeline['segments']}
+
+    def _collect_sources(self, *candidates) -> list:
+        """收集所有存在的音频（文件路径或内存数据）"""
+        sources = []
+        for source in candidates:
+            if hasattr(source, 'view'):
+                sources.append(source)
+            elif source and os.path.exists(str(source)):
+                sources.append(str(source))
+
+        if not sources:
+            self.logger.error("没有提供有效的音频文件")
+            raise ValueError("至少需要提供一个有效的音频文件")
+        return sources
+
+    def _timeline(self, sources: list, lead_silence_duration: float, audio_gap: float, end_pause: float,
+                  fps: int = None) -> dict:
+        """计算总时长、各段位置和对齐后的结尾静置时间，给定fps时总时长补齐到整帧"""
+        layout = self._layout(sources, lead_silence_duration, audio_gap, end_pause)
+        duration = layout['duration'] if layout else None
+        if fps and duration:
+            # 低帧率下把结尾补齐到整帧，音视频时长一致，拼接时不会错位
+            aligned = math.ceil(duration * fps - 1e-6) / fps
+            end_pause += aligned - duration
+            duration = aligned
+        return {
+            'duration': duration,
+            'segments': [list(segment) for segment in layout['segments']] if layout else [],
+            'end_pause': end_pause,
+        }
+
+    def _layout(self, audio_paths: list, lead_silence_duration: float, audio_gap: float,
+                end_pause: float) -> dict:
+        """根据各段音频时长计算各段位置和总时长，无法获取时返回None"""
+        try:
+            # 与AudioAssembler按同样的方式取整到采样点
+            return self.assembler.layout(self._wav_inputs(audio_paths), lead_silence_duration, audio_gap,
+                                         end_pause)
+        except WavFormatError:
+            pass
+        if any(hasattr(source, 'view') and not source.path for source in audio_paths):
+            return None
+        audio_paths = [source.path if hasattr(source, 'view') else source for source in audio_paths]
+        durations = get_duration_service().get_durations(audio_paths)
+        if len(durations) < len(audio_paths):
+            return None
+        segments = []
+        current_time = lead_silence_duration
+        for path in audio_paths:
+            segments.append((current_time, current_time + durations[path]))
+            current_time += durations[path] + audio_gap
+        return {'duration': segments[-1][1] + end_pause, 'segments': segments}
+
+    def _prescale_image(self, image_path: str) -> str:
+        """将图像缩放到输出尺寸（宽度取偶数），只在编码前做一次，结果写入本地临时目录"""
+        from PIL import Image
+        with Image.open(image_path) as image:
+            width, height = image.size
+            target_width = max(2, int(round(width * self.VIDEO_HEIGHT / height / 2)) * 2)
+            if (width, height) == (target_width, self.VIDEO_HEIGHT) and image.mode == 'RGB':
+                return str(image_path)
+            scaled = image.convert('RGB').resize((target_width, self.VIDEO_HEIGHT), Image.LANCZOS)
+        fd, still_path = tempfile.mkstemp(prefix='pictale-still-', suffix='.png')
+        # 临时文件，压缩级别越低写入越快
+        with os.fdopen(fd, 'wb') as f:
+            scaled.save(f, format='PNG', compress_level=1)
+        return still_path
+
+    def _render_track(self, sources: list, lead_silence_duration: float, audio_gap: float,
+                      end_pause: float) -> dict:
+        """在进程内拼接音轨，返回AudioAssembler的拼接结果（含PCM数据）；不满足条件时返回None，由FFmpeg滤镜图拼接"""
+        if not self.assembler.available():
+            return None
+        try:
+            return self.assembler.render(self._wav_inputs(sources), lead_silence_duration, audio_gap, end_pause)
+        except WavFormatError as e:
+            self.logger.debug(f"音频不是PCM WAV，使用FFmpeg拼接: {str(e)}")
+            return None
@@ -0,0 +1,43 @@
+import wave
+import pytest
+from unittest.mock import MagicMock, patch
+from modules.config import ConfigManager
+from modules.video import VideoGenerator
+
+@pytest.fixture
+def video_gen(tmp_path):
+    """输出到临时目录、使用固定FFmpeg配置的视频生成器"""
+    mock_config_manager = MagicMock(spec=ConfigManager)
+    mock_config_manager.get_output_base_dir.return_value = tmp_path
+    mock_config_manager.get_ffmpeg_config.return_value = {
+        'video_codec': 'libx264', 'audio_codec': 'aac', 'audio_bitrate': '192k', 'pixel_format': 'yuv420p'
+    }
+    with patch('modules.video.ConfigManager', return_value=mock_config_manager):
+        return VideoGenerator()
+
+def _write_wav(path, audio, sample_rate=16000, channels=1):
+    """
+    写入16位PCM WAV
+
+    Args:
+        path: 输出路径
+        audio: 时长（秒，写入静音）或按声道交错的样本数组
+        sample_rate: 采样率
+        channels: 声道数
+    """
+    if isinstance(audio, (int, float)):
+        frames = b'\x00\x00' * channels * int(audio * sample_rate)
+    else:
+        import numpy as np
+        frames = np.asarray(audio, dtype='<i2').tobytes()
+    with wave.open(str(path), 'wb') as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(frames)
+    return str(path)
+
+@pytest.fixture
+def write_wav():
+    """写入测试用WAV文件的函数"""
+    return _write_wav
@@ -0,0 +1,79 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock, patch
+import app
+from modules.artifacts import ArtifactBus
+from modules.manifest import WordManifest
+
+def test_parse_resume_without_words():
+    """测试只指定 --resume 时可以解析，单词列表从任务记录中读取"""
+    args = app.parse_args(['--resume', '123'])
+    assert args.resume == 123
+    assert args.word is None and args.words is None and args.words_file is None
+
+def test_parse_requires_words_or_resume(capsys):
+    """测试既没有单词也没有 --resume 时报错退出"""
+    with pytest.raises(SystemExit):
+        app.parse_args([])
+    assert "--resume" in capsys.readouterr().err
+
+def test_prompt_stage_handler_with_parsed_args(tmp_path):
+    """测试用真实的命令行参数运行提示词阶段，处理结果写入清单"""
+    args = app.parse_args(['--word', 'apple', '--skip-prompt', '--custom-prompt', 'a red apple'])
+    job = {
+        'word': 'apple',
+        'output_dir': tmp_path,
+        'manifest': WordManifest(tmp_path / "result.json"),
+        'artifacts': ArtifactBus(),
+        'start_time': 0,
+        'results': {'task_id': 1, 'word': 'apple'},
+    }
+    config_manager = MagicMock()
+    config_manager.settings = {'azure_openai': {'deployment_name': 'gpt-4o'}}
+    with patch('app.ConfigManager', return_value=config_manager):
+        result = asyncio.run(app.make_stage_handler('prompt', args)(job))
+
+    assert result is job
+    assert job['results']['word_prompt'] == 'a red apple'
+    assert job['manifest'].stages['prompt']['status'] == 'done'
+
+def test_prompt_hash_follows_template_content(tmp_path):
+    """测试提示词阶段的输入哈希随模板内容变化，模板路径不变时也能发现修改"""
+    prompts_file = tmp_path / "prompts.json"
+    prompts_file.write_text('{"system_prompt": "v1", "assistant_prompt": {}}', encoding='utf-8')
+    config_manager = MagicMock()
+    config_manager.settings = {'azure_openai': {'deployment_name': 'gpt-4o'}}
+    config_manager.get_azure_config.return_value = {
+        'endpoint': 'https://mock.openai.azure.com', 'api_key': 'key', 'api_version': '2024-02-15-preview',
+        'deployment_name': 'gpt-4o', 'prompts_file': str(prompts_file),
+    }
+    args = app.parse_args(['--word', 'apple', '--no-cache'])
+    job = {'word': 'apple', 'results': {}, 'artifacts': ArtifactBus()}
+
+    def prompt_hash():
+        app._prompt_generator = None
+        try:
+            return app.stage_inputs_hash('prompt', job, args)
+        finally:
+            app._prompt_generator = None
+
+    with patch('app.ConfigManager', return_value=config_manager), \
+            patch('modules.prompt.ConfigManager', return_value=config_manager), \
+            patch('modules.prompt.AsyncAzureOpenAI'):
+        first = prompt_hash()
+        assert prompt_hash() == first
+        prompts_file.write_text('{"system_prompt": "v2", "assistant_prompt": {}}', encoding='utf-8')
+        assert prompt_hash() != first
+
+def test_subtitle_stage_skipped_for_segment_encode(tmp_path):
+    """测试分段编码时字幕阶段不再为单词和短语分别生成SRT"""
+    args = app.parse_args(['--word', 'apple'])
+    job = {'word': 'apple', 'output_dir': tmp_path, 'artifacts': ArtifactBus(),
+           'results': {'word': 'apple', 'word_zh': '苹果', 'phrase': 'an apple', 'phrase_zh': '一个苹果'}}
+    with patch('app.segment_encode_enabled', return_value=True), patch('app.SrtGenerator') as srt_gen:
+        result = asyncio.run(app.run_subtitle_stage(job, args))
+
+    assert result is job
+    srt_gen.assert_not_called()
+    assert 'word_srt_en_path' not in job['results']
+    assert list(tmp_path.iterdir()) == []
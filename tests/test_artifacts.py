@@ -0,0 +1,69 @@
+import shutil
+import subprocess
+import pytest
+from unittest.mock import patch
+from modules.artifacts import Artifact, ArtifactBus
+from modules.audio_mix import AudioAssembler, read_wav_info
+
+np = pytest.importorskip("numpy")
+
+def test_artifact_from_file_and_persist(tmp_path, write_wav):
+    """测试读取临时文件后删除，需要时再原子写回磁盘"""
+    source = write_wav(tmp_path / "tts.wav", np.arange(100))
+    artifact = Artifact.from_file(source, meta={'language': 'en'}, remove=True)
+    assert not (tmp_path / "tts.wav").exists()
+    assert artifact.name == "tts" and artifact.path is None
+
+    bus = ArtifactBus()
+    bus.put('word_audio', artifact)
+    assert 'word_audio' in bus and bus.nbytes == len(artifact)
+
+    saved = artifact.persist(tmp_path / "keep" / "word_audio.wav")
+    assert artifact.path == saved
+    assert read_wav_info(saved).frames == 100
+    bus.clear()
+    assert bus.get('word_audio') is None
+
+def test_render_from_memory_matches_files(tmp_path, write_wav):
+    """测试内存中的WAV与文件拼接出完全相同的音轨"""
+    en = write_wav(tmp_path / "en.wav", np.full(160, 1000))
+    zh = write_wav(tmp_path / "zh.wav", np.full(80, -1000))
+    assembler = AudioAssembler()
+    from_files = assembler.render([en, zh], lead_silence=0.01, audio_gap=0.005)
+    buffers = [Artifact.from_file(path).view for path in (en, zh)]
+    from_memory = assembler.render(buffers, lead_silence=0.01, audio_gap=0.005)
+    assert from_memory['pcm'] == from_files['pcm']
+    assert from_memory['segments'] == from_files['segments']
+    assert read_wav_info(buffers[0]).path is None
+
+def test_video_pipes_track_to_stdin(video_gen, tmp_path, write_wav):
+    """测试内存中的音频拼接后经标准输入传给FFmpeg，不再读写音频文件"""
+    from PIL import Image
+    Image.new('RGB', (64, 64), 'white').save(tmp_path / "img.png")
+    en = Artifact.from_file(write_wav(tmp_path / "en.wav", np.ones(16000)), remove=True)
+    zh = Artifact.from_file(write_wav(tmp_path / "zh.wav", np.ones(8000)), remove=True)
+
+    with patch('modules.video.subprocess.run') as mock_run:
+        video_gen.generate(str(tmp_path / "img.png"), en, zh, lead_silence_duration=0.5, audio_gap=0.25,
+                           end_pause=0, output_video_path=tmp_path / "out.mp4", still=False)
+    command = mock_run.call_args[0][0]
+    assert 'pipe:0' in command
+    assert command.count('-i') == 2
+    # 0.5 + 1 + 0.25 + 0.5 秒，统一为44.1kHz立体声16位
+    assert len(mock_run.call_args[1]['input']) == round(2.25 * 44100) * 2 * 2
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="需要FFmpeg")
+def test_video_from_memory_duration(video_gen, tmp_path, write_wav):
+    """测试经标准输入传入音轨生成的视频时长正确"""
+    from PIL import Image
+    Image.new('RGB', (64, 64), 'white').save(tmp_path / "img.png")
+    en = Artifact.from_file(write_wav(tmp_path / "en.wav", np.zeros(16000)), remove=True)
+    zh = Artifact.from_file(write_wav(tmp_path / "zh.wav", np.zeros(8000)), remove=True)
+
+    output = video_gen.generate(str(tmp_path / "img.png"), en, zh, quality='low',
+                                lead_silence_duration=0.3, audio_gap=0.2, end_pause=0.55,
+                                output_video_path=tmp_path / "still.mp4", still=True)
+    probe = subprocess.run(['ffmpeg', '-i', output], capture_output=True, text=True).stderr
+    assert "Duration: 00:00:02.60" in probe
+    # 缩放后的静态图写在本地临时目录，输出目录只有视频
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["img.png", "still.mp4"]
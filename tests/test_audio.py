@@ -0,0 +1,60 @@
+import asyncio
+import base64
+import threading
+from unittest.mock import MagicMock, patch
+import pytest
+from tencentcloud.common.exception.tencent_cloud_sdk_exception import TencentCloudSDKException
+from modules.audio import TencentTtsClient, is_retryable
+
+TENCENT_CONFIG = {
+    'secret_id': 'id',
+    'secret_key': 'key',
+    'qps': 1000,
+    'max_retries': 2,
+}
+
+def make_client(responses):
+    """SDK客户端按顺序返回结果或抛出异常"""
+    client = TencentTtsClient(TENCENT_CONFIG)
+    threads = set()
+
+    def text_to_voice(req):
+        threads.add(threading.current_thread().name)
+        result = responses.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return MagicMock(Audio=base64.b64encode(result).decode())
+
+    client.client.TextToVoice = MagicMock(side_effect=text_to_voice)
+    return client, threads
+
+def test_retryable_codes():
+    """测试限频和临时错误可以重试，参数错误不重试"""
+    assert is_retryable(TencentCloudSDKException("RequestLimitExceeded", "limit"))
+    assert is_retryable(TencentCloudSDKException("RequestLimitExceeded.UinLimitExceeded", "limit"))
+    assert is_retryable(TencentCloudSDKException("ClientNetworkError", "timeout"))
+    assert not is_retryable(TencentCloudSDKException("InvalidParameter", "bad"))
+    assert not is_retryable(ValueError("x"))
+
+@patch('modules.throttle.backoff_delay', return_value=0)
+def test_client_retries_throttling(mock_delay):
+    """测试限频错误重试后成功，同一个SDK客户端被复用"""
+    client, _ = make_client([TencentCloudSDKException("RequestLimitExceeded", "limit"), b'RIFF'])
+    assert client.synthesize({'Text': 'hi'}) == b'RIFF'
+    assert client.client.TextToVoice.call_count == 2
+
+    client, _ = make_client([TencentCloudSDKException("InvalidParameter", "bad")])
+    with pytest.raises(TencentCloudSDKException):
+        client.synthesize({'Text': 'hi'})
+    assert client.client.TextToVoice.call_count == 1
+
+@patch('modules.throttle.backoff_delay', return_value=0)
+def test_client_async(mock_delay):
+    """测试异步接口在专用线程池中并发执行"""
+    client, threads = make_client([b'a', TencentCloudSDKException("InternalError", "busy"), b'b', b'c'])
+
+    async def main():
+        return await asyncio.gather(*[client.synthesize_async({'Text': str(i)}) for i in range(3)])
+
+    assert sorted(asyncio.run(main())) == [b'a', b'b', b'c']
+    assert all(name.startswith('tencent-tts') for name in threads)
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import threading
+import time
+from unittest.mock import MagicMock, patch
+import pytest
+from modules.audio_ali import AliNlsClient, AliSynthesisError, AliTokenProvider
+
+ALI_CONFIG = {
+    'access_key_id': 'id',
+    'access_key_secret': 'secret',
+    'appkey': 'appkey',
+    'max_sessions': 2,
+    'max_retries': 1,
+}
+
+def token_response(token, expire_in):
+    return json.dumps({'Token': {'Id': token, 'ExpireTime': int(time.time() + expire_in)}}).encode()
+
+def test_token_cached_until_refresh_window():
+    """测试令牌在刷新窗口前一直复用，进入窗口后重新获取"""
+    client = MagicMock()
+    client.do_action_with_exception.side_effect = [token_response('t1', 3600), token_response('t2', 3600)]
+    provider = AliTokenProvider(client, refresh_margin=600)
+    assert provider.get() == 't1'
+    assert provider.get() == 't1'
+    assert client.do_action_with_exception.call_count == 1
+    # 后台刷新已排期，且在过期前refresh_margin秒触发
+    assert 2900 < provider._timer.interval <= 3000
+    provider._timer.cancel()
+
+    provider.invalidate()
+    assert provider.get() == 't2'
+    assert provider.refreshes == 2
+    provider._timer.cancel()
+
+def test_token_background_refresh():
+    """测试后台线程在令牌即将过期时刷新"""
+    client = MagicMock()
+    client.do_action_with_exception.side_effect = [token_response('t1', 601), token_response('t2', 3600)]
+    provider = AliTokenProvider(client, refresh_margin=600)
+    assert provider.get() == 't1'
+    provider._timer.join(timeout=3)
+    assert provider.token == 't2'
+    provider._timer.cancel()
+
+class FakeSynthesizer:
+    """模拟NLS会话：记录并发数，按文本决定成功或失败"""
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def __init__(self, url, token, appkey, on_data, on_error, on_completed, on_close):
+        self.on_data, self.on_error, self.on_completed = on_data, on_error, on_completed
+
+    def start(self, text, wait_complete=True, **params):
+        with FakeSynthesizer.lock:
+            FakeSynthesizer.active += 1
+            FakeSynthesizer.peak = max(FakeSynthesizer.peak, FakeSynthesizer.active)
+        time.sleep(0.05)
+        with FakeSynthesizer.lock:
+            FakeSynthesizer.active -= 1
+        if text == 'fail':
+            self.on_error('{"status": 40000000}')
+            return
+        self.on_data(f"audio:{text}".encode())
+        self.on_completed('done')
+
+@pytest.fixture
+def client():
+    client = AliNlsClient(ALI_CONFIG)
+    client.tokens = MagicMock(get=MagicMock(return_value='token'))
+    FakeSynthesizer.active = FakeSynthesizer.peak = 0
+    with patch('modules.audio_ali.nls.NlsSpeechSynthesizer', FakeSynthesizer), \
+            patch('modules.throttle.backoff_delay', return_value=0):
+        yield client
+
+def test_concurrent_sessions_use_own_sinks(client, tmp_path):
+    """测试并发会话各自写入自己的文件，会话数不超过上限"""
+    async def main():
+        return await asyncio.gather(*[
+            client.synthesize_async(f"text{i}", {}, tmp_path / f"{i}.wav") for i in range(5)
+        ])
+
+    paths = asyncio.run(main())
+    for i, path in enumerate(paths):
+        assert open(path, 'rb').read() == f"audio:text{i}".encode()
+    assert FakeSynthesizer.peak == 2
+    assert client.tokens.get.call_count == 5
+
+def test_failed_session_leaves_no_file(client, tmp_path):
+    """测试合成失败后重试，最终失败时不留下输出和临时文件"""
+    with pytest.raises(AliSynthesisError):
+        client.synthesize('fail', {}, tmp_path / "out.wav")
+    assert client.policy.retries == 1
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,61 @@
+import struct
+import wave
+import pytest
+from modules.audio_mix import AudioAssembler, WavFormatError, read_wav_info
+
+np = pytest.importorskip("numpy")
+
+def test_layout_offsets(tmp_path, write_wav):
+    """测试各段音频的起止时间由文件头精确计算"""
+    en = write_wav(tmp_path / "en.wav", np.ones(16000))
+    zh = write_wav(tmp_path / "zh.wav", np.ones(8000))
+    plan = AudioAssembler().layout([en, zh], lead_silence=0.5, audio_gap=0.25, end_pause=1)
+    assert plan['segments'] == [(0.5, 1.5), (1.75, 2.25)]
+    assert plan['duration'] == 3.25
+
+def test_assemble_zero_fills_silence(tmp_path, write_wav):
+    """测试静音补零，音频样本原样写入对应位置"""
+    en = write_wav(tmp_path / "en.wav", np.full(100, 1000))
+    zh = write_wav(tmp_path / "zh.wav", np.full(50, -1000))
+    plan = AudioAssembler().assemble([en, zh], tmp_path / "out.wav",
+                                     lead_silence=10 / 16000, audio_gap=20 / 16000, end_pause=5 / 16000)
+
+    with wave.open(plan['path'], 'rb') as f:
+        assert f.getframerate() == 16000
+        track = np.frombuffer(f.readframes(f.getnframes()), dtype='<i2')
+    assert len(track) == 10 + 100 + 20 + 50 + 5
+    assert not track[:10].any()
+    assert (track[10:110] == 1000).all()
+    assert not track[110:130].any()
+    assert (track[130:180] == -1000).all()
+    assert not track[180:].any()
+
+def test_assemble_converts_to_common_format(tmp_path, write_wav):
+    """测试不同采样率和声道数统一为最高采样率和最多声道"""
+    mono = write_wav(tmp_path / "mono.wav", np.full(16000, 500), sample_rate=16000)
+    stereo = write_wav(tmp_path / "stereo.wav", np.full(2 * 24000, 200), sample_rate=24000, channels=2)
+    plan = AudioAssembler().assemble([mono, stereo], tmp_path / "out.wav")
+
+    assert (plan['sample_rate'], plan['channels']) == (24000, 2)
+    assert plan['segments'] == [(0.0, 1.0), (1.0, 2.0)]
+    with wave.open(plan['path'], 'rb') as f:
+        track = np.frombuffer(f.readframes(f.getnframes()), dtype='<i2').reshape(-1, 2)
+    assert len(track) == 48000
+    assert (track[:24000] == 500).all()
+
+def test_streaming_header_without_data_size(tmp_path):
+    """测试data长度为0的流式WAV按文件实际长度计算"""
+    path = tmp_path / "stream.wav"
+    data = np.ones(160, dtype='<i2').tobytes()
+    fmt = struct.pack('<HHIIHH', 1, 1, 16000, 32000, 2, 16)
+    path.write_bytes(b'RIFF' + struct.pack('<I', 0) + b'WAVE'
+                     + b'fmt ' + struct.pack('<I', 16) + fmt
+                     + b'data' + struct.pack('<I', 0) + data)
+    assert read_wav_info(path).frames == 160
+
+def test_non_pcm_rejected(tmp_path):
+    """测试非WAV文件抛出WavFormatError，由调用方退回FFmpeg"""
+    path = tmp_path / "audio.mp3"
+    path.write_bytes(b'ID3' + b'\x00' * 100)
+    with pytest.raises(WavFormatError):
+        AudioAssembler().layout([path])
@@ -0,0 +1,87 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from modules.audio_my import MoyinClient
+
+class StubMoyin(BaseHTTPRequestHandler):
+    """模拟魔音接口：前几次返回503，之后分块返回音频"""
+    failures = 0
+    requests = []
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        StubMoyin.requests.append((payload, self.client_address[1]))
+        if StubMoyin.failures > 0:
+            StubMoyin.failures -= 1
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if payload['text'] == 'bad':
+            body = b'{"error": "invalid speaker"}'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/wav')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for i in range(3):
+            chunk = f"{payload['text']}-{i};".encode()
+            self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    StubMoyin.failures = 0
+    StubMoyin.requests = []
+    StubMoyin.protocol_version = 'HTTP/1.1'
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), StubMoyin)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/api/tts/v1"
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.fixture
+def client():
+    return MoyinClient({'max_retries': 2, 'backoff_factor': 0.01, 'read_timeout': 5, 'max_connections': 4})
+
+def test_streams_audio_and_retries_5xx(server, client, tmp_path):
+    """测试5xx自动重试，音频分块写入文件，连接被复用"""
+    StubMoyin.failures = 2
+    path = client.synthesize(server, {'text': 'apple'}, tmp_path / "a.wav")
+    assert open(path, 'rb').read() == b"apple-0;apple-1;apple-2;"
+    assert len(StubMoyin.requests) == 3
+
+    client.synthesize(server, {'text': 'pear'}, tmp_path / "b.wav")
+    # 同一个会话复用长连接，客户端端口不变
+    assert StubMoyin.requests[-1][1] == StubMoyin.requests[-2][1]
+
+def test_error_response_leaves_no_file(server, client, tmp_path):
+    """测试重试用尽或返回非音频时抛出异常，不留下输出文件"""
+    StubMoyin.failures = 5
+    with pytest.raises(Exception, match="503"):
+        client.synthesize(server, {'text': 'apple'}, tmp_path / "a.wav")
+    StubMoyin.failures = 0
+    with pytest.raises(Exception, match="invalid speaker"):
+        client.synthesize(server, {'text': 'bad'}, tmp_path / "b.wav")
+    assert list(tmp_path.iterdir()) == []
+
+def test_async_requests_in_flight(server, client, tmp_path):
+    """测试异步接口并发发送请求"""
+    async def main():
+        return await asyncio.gather(*[
+            client.synthesize_async(server, {'text': f"w{i}"}, tmp_path / f"{i}.wav") for i in range(8)
+        ])
+
+    paths = asyncio.run(main())
+    assert [open(path, 'rb').read() for path in paths] == [f"w{i}-0;w{i}-1;w{i}-2;".encode() for i in range(8)]
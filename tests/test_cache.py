@@ -0,0 +1,159 @@
+import asyncio
+import os
+import threading
+from unittest.mock import patch
+from modules.cache import CachedAudioGenerator, FileCache, PromptCache, make_cache_key
+
+class FakeAudioGenerator:
+    """模拟语音生成器，记录调用次数"""
+    def __init__(self):
+        self.calls = 0
+
+    def get_voice_params(self, language="en"):
+        return {'voice': f'voice-{language}', 'sample_rate': 16000}
+
+    def generate(self, text, type="word", language="en", output_path=None):
+        self.calls += 1
+        with open(output_path, 'wb') as f:
+            f.write(f"{language}:{text}".encode())
+        return str(output_path)
+
+    async def generate_async(self, text, type="word", language="en", output_path=None):
+        return self.generate(text, type, language, output_path)
+
+def test_cache_key_is_order_independent():
+    """测试缓存键与参数顺序无关"""
+    assert make_cache_key(a=1, b='x') == make_cache_key(b='x', a=1)
+    assert make_cache_key(a=1) != make_cache_key(a=2)
+
+def test_put_and_get(tmp_path):
+    """测试写入后命中并放置到目标路径"""
+    cache = FileCache(tmp_path / "cache", max_bytes=1024)
+    src = tmp_path / "src.wav"
+    src.write_bytes(b"audio")
+    cache.put("k1", src, meta={'seconds': 1.5})
+
+    dest = tmp_path / "out" / "dest.wav"
+    assert cache.get("k1", dest) == {'seconds': 1.5}
+    assert dest.read_bytes() == b"audio"
+    assert cache.get("missing", tmp_path / "none.wav") is None
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+
+def test_lru_eviction(tmp_path):
+    """测试超过容量时淘汰最久未访问的条目"""
+    cache = FileCache(tmp_path / "cache", max_bytes=10)
+    for key in ("a", "b"):
+        src = tmp_path / f"{key}.wav"
+        src.write_bytes(b"12345")
+        cache.put(key, src)
+    # 访问a，使b成为最久未访问的条目
+    assert cache.get("a", tmp_path / "a_out.wav") is not None
+    src = tmp_path / "c.wav"
+    src.write_bytes(b"12345")
+    cache.put("c", src)
+
+    assert cache.get("b", tmp_path / "b_out.wav") is None
+    assert cache.get("a", tmp_path / "a_out2.wav") is not None
+    assert cache.stats()['evictions'] == 1
+
+def test_modified_entry_is_dropped(tmp_path):
+    """测试缓存文件被改写后不再命中"""
+    cache = FileCache(tmp_path / "cache", max_bytes=1024)
+    src = tmp_path / "src.wav"
+    src.write_bytes(b"audio")
+    cache.put("k", src)
+    dest = tmp_path / "dest.wav"
+    cache.get("k", dest)
+    # 硬链接共享inode，截断写入会破坏缓存条目
+    with open(dest, 'wb') as f:
+        f.write(b"x")
+    assert cache.get("k", tmp_path / "dest2.wav") is None
+
+def test_entry_removed_during_get_is_miss(tmp_path):
+    """测试放置文件时条目已被删除，按未命中处理而不是抛出异常"""
+    cache = FileCache(tmp_path / "cache", max_bytes=1024)
+    src = tmp_path / "src.wav"
+    src.write_bytes(b"audio")
+    cache.put("k", src)
+
+    with patch('modules.cache.os.link', side_effect=FileNotFoundError), \
+            patch('modules.cache.shutil.copyfile', side_effect=FileNotFoundError):
+        assert cache.get("k", tmp_path / "dest.wav") is None
+    assert cache.stats()['misses'] == 1
+    assert cache.get("k", tmp_path / "dest2.wav") is None
+
+def test_peek_does_not_count(tmp_path):
+    """测试探查缓存不计入命中统计"""
+    cache = FileCache(tmp_path / "cache", max_bytes=1024)
+    src = tmp_path / "src.wav"
+    src.write_bytes(b"audio")
+    cache.put("k", src)
+
+    assert cache.peek("k") is True
+    assert cache.peek("missing") is False
+    stats = cache.stats()
+    assert stats['hits'] == stats['misses'] == 0
+
+def test_cached_audio_generator(tmp_path):
+    """测试相同文本和参数只调用一次生成器"""
+    cache = FileCache(tmp_path / "cache", max_bytes=1024)
+    generator = FakeAudioGenerator()
+    cached = CachedAudioGenerator(generator, 'fake', cache)
+
+    os.makedirs(tmp_path / "run1")
+    first = cached.generate("hello", 'word', 'en', output_path=tmp_path / "run1" / "a.wav")
+    os.makedirs(tmp_path / "run2")
+    second = cached.generate("hello", 'word', 'en', output_path=tmp_path / "run2" / "a.wav")
+    cached.generate("hello", 'word', 'zh', output_path=tmp_path / "run2" / "b.wav")
+
+    assert generator.calls == 2
+    assert open(first, 'rb').read() == open(second, 'rb').read() == b"en:hello"
+
+def test_cached_audio_generator_async_off_loop(tmp_path):
+    """测试异步生成时缓存的读写不在事件循环线程中执行"""
+    cache = FileCache(tmp_path / "cache", max_bytes=1024)
+    cached = CachedAudioGenerator(FakeAudioGenerator(), 'fake', cache)
+    threads = []
+    get, put = cache.get, cache.put
+
+    def record(method):
+        def wrapper(*args, **kwargs):
+            threads.append(threading.current_thread())
+            return method(*args, **kwargs)
+        return wrapper
+
+    with patch.object(cache, 'get', record(get)), patch.object(cache, 'put', record(put)):
+        asyncio.run(cached.generate_async("hello", output_path=tmp_path / "a.wav"))
+        asyncio.run(cached.generate_async("hello", output_path=tmp_path / "b.wav"))
+
+    assert cached.generator.calls == 1
+    # 未命中时查找和写入，命中时查找
+    assert len(threads) == 3
+    assert threading.main_thread() not in threads
+
+def test_prompt_cache_normalizes_word(tmp_path):
+    """测试提示词缓存按规范化单词、模板哈希和部署名称区分"""
+    cache = PromptCache(tmp_path / "prompts.db")
+    cache.put("Apple ", "hash1", "gpt-4", '{"word": "apple"}')
+
+    assert cache.get(" apple", "hash1", "gpt-4") == '{"word": "apple"}'
+    assert cache.get("apple", "hash2", "gpt-4") is None
+    assert cache.get("apple", "hash1", "gpt-4o") is None
+    assert cache.hits == 1
+
+def test_prompt_cache_ttl_and_invalidate(tmp_path):
+    """测试过期和主动失效"""
+    cache = PromptCache(tmp_path / "prompts.db", ttl_seconds=0)
+    cache.put("apple", "h", "d", "{}")
+    assert cache.get("apple", "h", "d") is None
+    assert cache.purge_expired() == 1
+
+    cache = PromptCache(tmp_path / "prompts.db")
+    cache.put("apple", "h", "d", "{}")
+    cache.put("pear", "h", "d", "{}")
+    assert cache.invalidate("APPLE") == 1
+    assert cache.get("apple", "h", "d") is None
+    assert cache.get("pear", "h", "d") == "{}"
+    assert cache.invalidate() == 1
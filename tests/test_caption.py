@@ -0,0 +1,44 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from modules.caption import CaptionCompositor, load_font
+from modules.config import ConfigManager
+
+Image = pytest.importorskip("PIL.Image")
+
+@pytest.fixture
+def compositor():
+    mock_config_manager = MagicMock(spec=ConfigManager)
+    mock_config_manager.get_caption_config.return_value = {
+        'font_path': None, 'font_size_ratio': 0.1, 'secondary_scale': 0.75, 'line_spacing': 0.25,
+        'bottom_margin_ratio': 0.08, 'side_margin_ratio': 0.05, 'fill': '#FFFFFF', 'stroke_fill': '#000000',
+        'stroke_ratio': 0.08, 'layout_cache_size': 16,
+    }
+    with patch('modules.caption.ConfigManager', return_value=mock_config_manager), \
+            patch('modules.caption.find_font', return_value=None):
+        return CaptionCompositor(height=240)
+
+def test_compose_scales_and_draws_bottom(compositor, tmp_path):
+    """测试输出为视频高度的RGB图，文字只画在底部区域"""
+    Image.new('RGB', (512, 512), (40, 90, 160)).save(tmp_path / "img.png")
+    output = compositor.compose(tmp_path / "img.png", ["apple", ""], tmp_path / "caption.png")
+
+    with Image.open(output) as frame:
+        assert frame.size == (240, 240) and frame.mode == 'RGB'
+        top = frame.crop((0, 0, 240, 120)).getcolors()
+        bottom = frame.crop((0, 120, 240, 240)).getcolors(maxcolors=100000)
+    assert top == [(240 * 120, (40, 90, 160))]
+    assert len(bottom) > 1
+
+def test_layout_and_fonts_cached(compositor, tmp_path):
+    """测试相同文字和尺寸只排版一次，过长的文字缩小字号放入画面"""
+    Image.new('RGB', (240, 240), 'white').save(tmp_path / "img.png")
+    load_font.cache_clear()
+    for index in range(3):
+        compositor.compose(tmp_path / "img.png", ["an apple a day keeps the doctor away", "苹果"],
+                           tmp_path / f"caption{index}.png")
+    assert compositor._layout.cache_info().hits == 2
+    assert compositor._layout.cache_info().misses == 1
+
+    (text, size, stroke, (x, y)), second = compositor._layout(("an apple a day keeps the doctor away", "苹果"), 240, 240)
+    assert size < 24 and x >= 0
+    assert second[3][1] > y
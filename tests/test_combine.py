@@ -0,0 +1,92 @@
+import asyncio
+import re
+import shutil
+import subprocess
+import pytest
+from modules.combine import IncrementalCombiner
+from modules.ffmpeg_pool import FFmpegPool
+
+class FakePool:
+    """按concat列表把输入文件内容依次拼接，便于检查顺序"""
+
+    def __init__(self):
+        self.commands = []
+
+    async def run(self, command, timeout=None):
+        self.commands.append(command)
+        list_path = command[command.index('-i') + 1]
+        with open(list_path, encoding='utf-8') as f:
+            inputs = re.findall(r"file '(.*)'", f.read())
+        with open(command[-1], 'w', encoding='utf-8') as out:
+            for path in inputs:
+                with open(path, encoding='utf-8') as f:
+                    out.write(f.read())
+        await asyncio.sleep(0)
+        return ''
+
+def test_combine_order_and_failed_words(tmp_path):
+    """测试乱序完成的单词按原顺序合并，失败的单词只留下自己的空缺"""
+    clips = {}
+    for index in range(7):
+        clips[index] = []
+        for part in ('w', 'p'):
+            path = tmp_path / f"{index}{part}.mp4"
+            path.write_text(f"{index}{part} ", encoding='utf-8')
+            clips[index].append(str(path))
+
+    pool = FakePool()
+    combiner = IncrementalCombiner(tmp_path / "out" / "combined.mp4", fanout=3, pool=pool)
+
+    async def main():
+        for index in (1, 0, 3, 2, 6, 4):
+            combiner.add(index, clips[index])
+            await asyncio.sleep(0)
+        combiner.add(5, None)
+        return await combiner.finish()
+
+    combined = asyncio.run(main())
+    assert open(combined, encoding='utf-8').read() == "0w 0p 1w 1p 2w 2p 3w 3p 4w 4p 6w 6p "
+    # 12个片段在后台合并为中间文件，最后一次合并只需处理少量输入
+    assert len(pool.commands) > 1
+    final_list = pool.commands[-1]
+    assert final_list[-1] == str(tmp_path / "out" / "combined.mp4")
+    # 中间文件和列表文件都已清理，单词自己的片段保留
+    assert not (tmp_path / "out" / "combine_parts").exists()
+    assert (tmp_path / "0w.mp4").exists()
+
+def test_combine_nothing_to_merge(tmp_path):
+    """测试全部单词失败时不生成合并文件"""
+    combiner = IncrementalCombiner(tmp_path / "combined.mp4", pool=FakePool())
+
+    async def main():
+        combiner.add(0, None)
+        return await combiner.finish()
+
+    assert asyncio.run(main()) is None
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="需要FFmpeg")
+def test_combine_with_ffmpeg(tmp_path):
+    """测试用FFmpeg逐层合并真实视频片段"""
+    paths = []
+    for index in range(5):
+        path = tmp_path / f"clip{index}.mp4"
+        subprocess.run([
+            'ffmpeg', '-y', '-v', 'error',
+            '-f', 'lavfi', '-i', 'color=c=blue:s=64x64:r=5:d=0.4',
+            '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=44100:duration=0.4',
+            '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-shortest', str(path)
+        ], check=True)
+        paths.append(str(path))
+
+    combiner = IncrementalCombiner(tmp_path / "combined.mp4", fanout=2, pool=FFmpegPool(workers=2))
+
+    async def main():
+        for index, path in reversed(list(enumerate(paths))):
+            combiner.add(index, [path])
+        return await combiner.finish()
+
+    combined = asyncio.run(main())
+    result = subprocess.run(['ffmpeg', '-hide_banner', '-i', combined], capture_output=True, text=True)
+    hours, minutes, seconds = re.search(r"Duration: (\d+):(\d+):([\d.]+)", result.stderr).groups()
+    assert float(seconds) == pytest.approx(2.0, abs=0.15)
+    assert combiner.merges >= 3
@@ -0,0 +1,126 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import patch
+from modules.comfy import ComfyBackend, ComfyBackendPool, ComfyEventDispatcher, ComfyExecutionError
+
+@pytest.fixture
+def dispatcher():
+    # 不启动后台线程，直接注入事件
+    return ComfyEventDispatcher("http://127.0.0.1:8188", history_interval=0.01)
+
+def test_executing_event_resolves_future(dispatcher):
+    """测试 executing(node=None) 事件完成对应的Future"""
+    future = dispatcher.watch("p1")
+    dispatcher._handle({'type': 'executing', 'data': {'node': '30', 'prompt_id': 'p1'}})
+    assert not future.done()
+    dispatcher._handle({'type': 'executing', 'data': {'node': None, 'prompt_id': 'p1'}})
+    assert future.result(timeout=0) == "p1"
+
+def test_event_before_watch(dispatcher):
+    """测试事件先于等待注册到达时仍能完成"""
+    dispatcher._handle({'type': 'execution_success', 'data': {'prompt_id': 'p2'}})
+    assert dispatcher.watch("p2").result(timeout=0) == "p2"
+
+def test_execution_error(dispatcher):
+    """测试执行失败事件"""
+    future = dispatcher.watch("p3")
+    dispatcher._handle({'type': 'execution_error', 'data': {'prompt_id': 'p3', 'exception_message': 'OOM'}})
+    with pytest.raises(ComfyExecutionError):
+        future.result(timeout=0)
+
+def test_status_queue_remaining(dispatcher):
+    """测试解析队列长度"""
+    dispatcher._handle({'type': 'status', 'data': {'status': {'exec_info': {'queue_remaining': 3}}}})
+    assert dispatcher.queue_remaining == 3
+
+def test_wait_falls_back_to_history(dispatcher):
+    """测试没有WebSocket事件时通过 /history/{prompt_id} 兜底"""
+    with patch.object(dispatcher, 'fetch_history', side_effect=[None, {'status': {'status_str': 'success'}}]) as fetch:
+        assert dispatcher.wait("p4", timeout=1)
+    fetch.assert_called_with("p4")
+
+def test_wait_async_timeout(dispatcher):
+    """测试异步等待超时"""
+    with patch.object(dispatcher, 'fetch_history', return_value=None):
+        assert asyncio.run(dispatcher.wait_async("p5", timeout=0.05)) is False
+
+def test_wait_async_resolved_by_event(dispatcher):
+    """测试异步等待被WebSocket事件唤醒"""
+    async def main():
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.01, dispatcher._handle, {'type': 'executing', 'data': {'node': None, 'prompt_id': 'p6'}})
+        with patch.object(dispatcher, 'fetch_history', return_value=None):
+            return await dispatcher.wait_async("p6", timeout=1)
+
+    assert asyncio.run(main()) is True
+
+def test_wait_connected_skips_history_polling(dispatcher):
+    """测试WebSocket连接期间不轮询历史，只在超时前查询一次"""
+    dispatcher.connected = True
+    with patch.object(dispatcher, 'fetch_history', return_value=None) as fetch:
+        assert dispatcher.wait("p7", timeout=0.1) is False
+        assert fetch.call_count == 1
+        fetch.reset_mock()
+        assert asyncio.run(dispatcher.wait_async("p7", timeout=0.1)) is False
+        assert fetch.call_count == 1
+
+    # 超时前的最后一次查询发现已完成
+    with patch.object(dispatcher, 'fetch_history', return_value={'status': {'status_str': 'success'}}):
+        assert dispatcher.wait("p8", timeout=0.05) is True
+
+def test_wait_checks_history_after_reconnect(dispatcher):
+    """测试等待期间WebSocket重连过时查询历史，补上可能漏掉的事件"""
+    dispatcher.connected = True
+    poll_interval = dispatcher._poll_interval
+
+    def reconnect_during_wait():
+        # 每次等待开始后都发生一次重连
+        dispatcher.connections += 1
+        return poll_interval()
+
+    with patch.object(dispatcher, '_poll_interval', reconnect_during_wait), \
+            patch.object(dispatcher, 'fetch_history', return_value={'status': {'status_str': 'success'}}) as fetch:
+        assert dispatcher.wait("p9", timeout=1) is True
+    assert fetch.call_count == 1
+
+class FakeStatusDispatcher:
+    """只提供队列长度的分发器"""
+    def __init__(self, queue_remaining=None):
+        self.queue_remaining = queue_remaining
+
+def make_pool(*queues, **kwargs):
+    backends = [ComfyBackend(f"http://host{i}", FakeStatusDispatcher(q)) for i, q in enumerate(queues)]
+    return ComfyBackendPool(backends, **kwargs)
+
+def test_pool_picks_least_loaded_backend():
+    """测试按队列长度和平均耗时选择后端"""
+    pool = make_pool(3, 1)
+    assert pool.pick().base_url == "http://host1"
+    # host1队列较短但明显更慢
+    pool.backends[0].latency = 1.0
+    pool.backends[1].latency = 10.0
+    assert pool.pick().base_url == "http://host0"
+
+def test_pool_respects_target_queue_depth():
+    """测试所有后端达到目标队列深度时不再分配"""
+    pool = make_pool(None, None)
+    first = pool.acquire(max_queue=1)
+    second = pool.acquire(max_queue=1)
+    assert {first.base_url, second.base_url} == {"http://host0", "http://host1"}
+    assert pool.acquire(max_queue=1) is None
+    pool.release(first, started=time.time())
+    assert pool.acquire(max_queue=1) is first
+
+def test_pool_takes_failing_backend_out_of_rotation():
+    """测试连续失败的后端被摘除，冷却后恢复"""
+    pool = make_pool(0, 0, max_failures=2, cooldown=60)
+    bad = pool.backends[0]
+    for _ in range(2):
+        backend = pool.acquire()
+        assert backend is bad
+        pool.release(backend, ok=False)
+    assert not bad.is_available()
+    assert all(pool.pick() is pool.backends[1] for _ in range(3))
+    bad.down_until = 0
+    assert bad.is_available()
@@ -0,0 +1,77 @@
+import shutil
+import subprocess
+import pytest
+from unittest.mock import patch
+from modules.duration import DurationError, DurationService, adts_duration, wav_duration
+
+def write_adts(path, frames, rate_index=8):
+    """写入只有帧头的ADTS流（16kHz，单声道）"""
+    frame_length = 7 + 10
+    header = bytes([
+        0xFF, 0xF1,
+        (1 << 6) | (rate_index << 2),
+        (1 << 6) | ((frame_length >> 11) & 0x03),
+        (frame_length >> 3) & 0xFF,
+        ((frame_length & 0x07) << 5) | 0x1F,
+        0xFC,
+    ])
+    with open(path, 'wb') as f:
+        for _ in range(frames):
+            f.write(header + b'\x00' * 10)
+    return str(path)
+
+def test_wav_and_adts_headers(tmp_path, write_wav):
+    """测试直接解析WAV和ADTS文件头"""
+    assert wav_duration(write_wav(tmp_path / "a.wav", 1.5)) == 1.5
+    assert adts_duration(write_adts(tmp_path / "a.aac", 125)) == 125 * 1024 / 16000
+    with pytest.raises(DurationError):
+        adts_duration(write_wav(tmp_path / "b.aac", 0.1))
+
+def test_memoized_by_mtime_and_size(tmp_path, write_wav):
+    """测试结果按修改时间和大小缓存，文件改变后重新解析"""
+    service = DurationService()
+    path = write_wav(tmp_path / "a.wav", 1.0)
+    with patch('modules.duration.wav_duration', wraps=wav_duration) as parser:
+        assert service.get_duration(path) == 1.0
+        assert service.get_duration(path) == 1.0
+        assert parser.call_count == 1
+        write_wav(path, 2.0)
+        assert service.get_duration(path) == 2.0
+        assert parser.call_count == 2
+
+def test_unknown_formats_probed_in_one_call(tmp_path):
+    """测试未知格式合并为一次FFmpeg调用，无法识别的文件不编造时长"""
+    stderr = (
+        "Input #0, mp3, from 'a.mp3':\n  Duration: 00:00:01.25, start: 0.0\n"
+        "Input #1, mp3, from 'b.mp3':\n  Duration: 00:01:02.50, start: 0.0\n"
+        "junk.bin: Invalid data found when processing input\n"
+    )
+    paths = []
+    for name in ("a.mp3", "b.mp3", "junk.bin"):
+        (tmp_path / name).write_bytes(b'\x00' * 16)
+        paths.append(str(tmp_path / name))
+
+    service = DurationService()
+    with patch('modules.duration.subprocess.run') as mock_run:
+        mock_run.return_value.stderr = stderr
+        durations = service.get_durations(paths)
+        assert mock_run.call_count == 1
+        assert mock_run.call_args[0][0].count('-i') == 3
+    assert durations == {paths[0]: 1.25, paths[1]: 62.5}
+    with pytest.raises(DurationError):
+        with patch('modules.duration.subprocess.run') as mock_run:
+            mock_run.return_value.stderr = ""
+            service.get_duration(paths[2])
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="需要ffmpeg")
+def test_probe_continues_after_bad_input(tmp_path):
+    """测试FFmpeg因无法打开的输入中止时，继续探测后面的文件"""
+    bad = tmp_path / "bad.bin"
+    bad.write_bytes(b'not audio')
+    good = tmp_path / "good.mp3"
+    subprocess.run(['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'sine=d=0.5', str(good)], check=True)
+    service = DurationService()
+    durations = service.get_durations([str(bad), str(good)])
+    assert list(durations) == [str(good)]
+    assert abs(durations[str(good)] - 0.5) < 0.1
+    assert service.probes == 2
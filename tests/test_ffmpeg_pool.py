@@ -0,0 +1,76 @@
+import asyncio
+import sys
+import time
+import pytest
+from modules.ffmpeg_pool import FFmpegError, FFmpegPool, with_thread_limit
+
+def sleeper(seconds, code=0):
+    """用Python代替FFmpeg，便于测试调度本身"""
+    return [sys.executable, '-c', f"import sys, time; time.sleep({seconds}); sys.stderr.write('done'); sys.exit({code})"]
+
+def test_thread_limit_inserted_after_inputs():
+    """测试线程数限制放在最后一个输入之后，作用于输出编码器"""
+    command = ['ffmpeg', '-y', '-i', 'a.png', '-i', 'b.wav', '-c:v', 'libx264', 'out.mp4']
+    assert with_thread_limit(command, 2) == [
+        'ffmpeg', '-filter_threads', '2', '-y', '-i', 'a.png', '-i', 'b.wav',
+        '-threads', '2', '-c:v', 'libx264', 'out.mp4'
+    ]
+    # 已指定线程数时不修改
+    assert with_thread_limit(['ffmpeg', '-threads', '8', 'out.mp4'], 2) == ['ffmpeg', '-threads', '8', 'out.mp4']
+
+def test_pool_bounds_concurrency():
+    """测试同时运行的进程数不超过workers"""
+    pool = FFmpegPool(workers=2, threads_per_job=1)
+    peak = {'value': 0}
+
+    async def track():
+        while True:
+            peak['value'] = max(peak['value'], pool.running)
+            await asyncio.sleep(0.005)
+
+    async def main():
+        watcher = asyncio.ensure_future(track())
+        results = await asyncio.gather(*[pool.run(sleeper(0.1)) for _ in range(5)])
+        watcher.cancel()
+        return results
+
+    results = asyncio.run(main())
+    assert results == ['done'] * 5
+    assert peak['value'] == 2
+    assert pool.completed == 5
+
+def test_pool_errors_and_timeout():
+    """测试非零返回码和超时都抛出FFmpegError，超时进程被终止"""
+    pool = FFmpegPool(workers=1, threads_per_job=1)
+    with pytest.raises(FFmpegError) as error:
+        asyncio.run(pool.run(sleeper(0, code=3)))
+    assert error.value.returncode == 3
+
+    start = time.time()
+    with pytest.raises(FFmpegError):
+        asyncio.run(pool.run(sleeper(5), timeout=0.2))
+    assert time.time() - start < 2
+
+def test_pool_cancellation_kills_process():
+    """测试取消任务时终止进程并释放名额"""
+    pool = FFmpegPool(workers=1, threads_per_job=1)
+
+    async def main():
+        task = asyncio.ensure_future(pool.run(sleeper(5)))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # 名额已释放，后续任务可以立即执行
+        return await asyncio.wait_for(pool.run(sleeper(0)), timeout=2)
+
+    start = time.time()
+    assert asyncio.run(main()) == 'done'
+    assert time.time() - start < 2
+    assert pool.running == 0
+
+def test_pool_feeds_stdin():
+    """测试input数据通过标准输入传给进程"""
+    pool = FFmpegPool(workers=1, threads_per_job=1)
+    command = [sys.executable, '-c', "import sys; sys.stderr.write(str(len(sys.stdin.buffer.read())))"]
+    assert asyncio.run(pool.run(command, input=b'\x00' * 100000)) == '100000'
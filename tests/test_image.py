@@ -0,0 +1,190 @@
+import asyncio
+import json
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+from modules.config import ConfigManager
+from modules.image import ImageGenerator
+
+WORKFLOW = {
+    "5": {"class_type": "EmptyLatentImage", "inputs": {"width": 8, "height": 8, "batch_size": 1}},
+    "35": {"class_type": "CLIPTextEncode", "inputs": {"text": ""}},
+    "3": {"class_type": "KSampler", "inputs": {"seed": 1, "positive": ["35", 0], "latent_image": ["5", 0]}},
+}
+
+class FakeDispatcher:
+    """模拟WebSocket分发器，prompt提交后立即完成"""
+    client_id = "test-client"
+    queue_remaining = 0
+    status_data = {}
+
+    async def wait_async(self, prompt_id, timeout):
+        await asyncio.sleep(0.01)
+        return True
+
+def make_generator(tmp_path, **comfy_config):
+    workflow_file = tmp_path / "workflow.json"
+    workflow_file.write_text(json.dumps(WORKFLOW))
+    config = {'workflow_file': str(workflow_file), 'positive_prompt_nodes': ["35"],
+              'preload_model': False, **comfy_config}
+    mock_config_manager = MagicMock(spec=ConfigManager)
+    mock_config_manager.get_comfy_config.return_value = config
+    mock_config_manager.get_output_base_dir.return_value = tmp_path
+    with patch('modules.image.ConfigManager', return_value=mock_config_manager):
+        generator = ImageGenerator()
+    for backend in generator.backend_pool.backends:
+        backend._dispatcher = FakeDispatcher()
+    return generator
+
+def test_generate_many_respects_queue_depth(tmp_path):
+    """测试同时提交的任务数不超过目标队列深度，结果与输入顺序一致"""
+    generator = make_generator(tmp_path, target_queue_depth=2)
+    submitted = []
+    peak = {'value': 0}
+
+    def submit(base_url, workflow):
+        submitted.append(workflow["35"]["inputs"]["text"])
+        peak['value'] = max(peak['value'], generator._inflight)
+        return f"id-{len(submitted)}"
+
+    generator._submit_workflow = submit
+    generator._fetch_images = lambda base_url, prompt_id: [prompt_id.encode()]
+    jobs = [(f"prompt {i}", tmp_path / f"{i}.png") for i in range(5)]
+
+    paths = asyncio.run(generator.generate_many(jobs))
+    assert paths == [str(tmp_path / f"{i}.png") for i in range(5)]
+    assert sorted(submitted) == [f"prompt {i}" for i in range(5)]
+    assert peak['value'] <= 2
+
+def test_latent_batch_merges_identical_prompts(tmp_path):
+    """测试相同提示词合并为一次提交并按顺序分配图像"""
+    generator = make_generator(tmp_path, latent_batch=True, max_latent_batch=4)
+    batch_sizes = []
+
+    def submit(base_url, workflow):
+        batch_sizes.append(workflow["5"]["inputs"]["batch_size"])
+        return "id"
+
+    generator._submit_workflow = submit
+    generator._fetch_images = lambda base_url, prompt_id: [b"first", b"second"]
+    jobs = [("same", tmp_path / "a.png"), ("same", tmp_path / "b.png")]
+
+    asyncio.run(generator.generate_many(jobs))
+    assert batch_sizes == [2]
+    assert (tmp_path / "a.png").read_bytes() == b"first"
+    assert (tmp_path / "b.png").read_bytes() == b"second"
+
+def test_generate_many_failure(tmp_path):
+    """测试提交失败时的异常处理"""
+    generator = make_generator(tmp_path)
+    generator._submit_workflow = lambda base_url, workflow: None
+    with pytest.raises(Exception):
+        asyncio.run(generator.generate_many([("p", tmp_path / "x.png")]))
+    results = asyncio.run(generator.generate_many([("p", tmp_path / "x.png")], return_exceptions=True))
+    assert isinstance(results[0], Exception)
+
+class StubComfyHandler(BaseHTTPRequestHandler):
+    """最小的ComfyUI接口：/prompt、/history/{id}、/view，提交后立即完成"""
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, content_type='application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        json.loads(self.rfile.read(length))
+        server = self.server
+        if server.fail:
+            self._send(500, b'{"error": "down"}')
+            return
+        with server.lock:
+            server.count += 1
+            prompt_id = f"{server.name}-{server.count}"
+        self._send(200, json.dumps({'prompt_id': prompt_id}).encode())
+
+    def do_GET(self):
+        if self.path.startswith('/history/'):
+            prompt_id = self.path.split('/')[-1]
+            entry = {prompt_id: {'status': {'status_str': 'success'}, 'outputs': {
+                '9': {'images': [{'filename': f'{prompt_id}.png', 'subfolder': '', 'type': 'output'}]}
+            }}}
+            self._send(200, json.dumps(entry).encode())
+        elif self.path.startswith('/view'):
+            self._send(200, self.server.name.encode(), 'image/png')
+        else:
+            self._send(404, b'{}')
+
+def start_stub_server(name, fail=False):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubComfyHandler)
+    server.name, server.fail, server.count, server.lock = name, fail, 0, threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def test_backend_pool_routes_to_healthy_servers(tmp_path):
+    """测试多个后端间分配任务，连续失败的后端被摘除"""
+    servers = [start_stub_server('a'), start_stub_server('b'), start_stub_server('bad', fail=True)]
+    urls = [f"http://127.0.0.1:{server.server_address[1]}" for server in servers]
+    try:
+        generator = make_generator(tmp_path, api_urls=urls, target_queue_depth=1, backend_max_failures=1)
+        for backend in generator.backend_pool.backends:
+            # 使用真实的分发器，没有WebSocket时通过 /history 兜底
+            backend._dispatcher = None
+            backend.dispatcher.history_interval = 0.05
+        jobs = [(f"prompt {i}", tmp_path / f"{i}.png") for i in range(12)]
+        results = asyncio.run(generator.generate_many(jobs, return_exceptions=True))
+
+        bad = generator.backend_pool.get(urls[2])
+        assert not bad.is_available()
+        assert sum(isinstance(result, Exception) for result in results) == 1
+        contents = {open(result, 'rb').read() for result in results if not isinstance(result, Exception)}
+        assert contents == {b'a', b'b'}
+        assert servers[0].count + servers[1].count == 11
+    finally:
+        for server in servers:
+            server.shutdown()
+
+def test_image_cache_skips_comfyui(tmp_path):
+    """测试相同提示词和种子第二次直接命中缓存，不提交ComfyUI"""
+    from modules.cache import FileCache
+    generator = make_generator(tmp_path)
+    generator.cache = FileCache(tmp_path / "cache", max_bytes=1024 * 1024)
+    submitted = []
+
+    def submit(base_url, workflow):
+        submitted.append(workflow["3"]["inputs"]["seed"])
+        return f"id-{len(submitted)}"
+
+    generator._submit_workflow = submit
+    generator._fetch_images = lambda base_url, prompt_id: [prompt_id.encode()]
+
+    first = asyncio.run(generator.generate_many([("cat", tmp_path / "a.png"), ("dog", tmp_path / "b.png")]))
+    second = asyncio.run(generator.generate_many([("cat", tmp_path / "c.png")]))
+    assert len(submitted) == 2
+    # 种子由提示词推导，与工作流中原有的种子无关
+    assert submitted[0] != 1
+    assert open(second[0], 'rb').read() == open(first[0], 'rb').read()
+    assert generator.cache.stats()['hits'] == 1
+    assert generator.gpu_seconds_saved >= 0
+
+    # 修改负向提示词后工作流变化，不再命中
+    generator.comfy_config['negative_prompt'] = "blurry"
+    asyncio.run(generator.generate_many([("cat", tmp_path / "d.png")]))
+    assert len(submitted) == 3
+
+def test_random_seed_disables_cache(tmp_path):
+    """测试开启随机种子时不使用缓存"""
+    from modules.cache import FileCache
+    generator = make_generator(tmp_path, use_random_seed=True)
+    generator.cache = FileCache(tmp_path / "cache", max_bytes=1024 * 1024)
+    generator._submit_workflow = lambda base_url, workflow: "id"
+    generator._fetch_images = lambda base_url, prompt_id: [b"img"]
+    for name in ("a", "b"):
+        asyncio.run(generator.generate_many([("cat", tmp_path / f"{name}.png")]))
+    assert generator.cache.stats()['entries'] == 0
@@ -0,0 +1,55 @@
+import json
+import os
+from modules.manifest import WordManifest, atomic_write_json, hash_inputs
+
+def test_manifest_round_trip(tmp_path):
+    """测试阶段完成后可以从result.json恢复，原有结果字段保持在顶层"""
+    image = tmp_path / "word_image.png"
+    image.write_bytes(b'png')
+    manifest = WordManifest(tmp_path / "result.json")
+    inputs = hash_inputs(prompts=['a cat'])
+    results = {'word': 'cat', 'word_image_path': str(image)}
+    manifest.record('image', inputs, {'word_image_path': str(image)}, results)
+
+    data = json.loads((tmp_path / "result.json").read_text(encoding='utf-8'))
+    assert data['word'] == 'cat'
+    assert data['stages']['image']['status'] == 'done'
+    assert not (tmp_path / "result.json.tmp").exists()
+
+    reloaded = WordManifest(tmp_path / "result.json")
+    assert reloaded.results == results
+    assert reloaded.completed('image', inputs) == {'word_image_path': str(image)}
+    # 输入变化时需要重做
+    assert reloaded.completed('image', hash_inputs(prompts=['a dog'])) is None
+    assert reloaded.completed('audio', inputs) is None
+
+def test_manifest_rejects_changed_or_partial_outputs(tmp_path):
+    """测试输出文件被改写、截断或删除后阶段不再视为完成"""
+    video = tmp_path / "word_video.mp4"
+    video.write_bytes(b'complete video')
+    manifest = WordManifest(tmp_path / "result.json")
+    inputs = hash_inputs(audio=[1, 2])
+    manifest.record('video', inputs, {'word_video_path': str(video)}, {})
+    assert manifest.completed('video', inputs) is not None
+
+    # 中途被打断的重新编码留下了半截文件
+    video.write_bytes(b'partial')
+    assert manifest.completed('video', inputs) is None
+
+    video.unlink()
+    assert manifest.completed('video', inputs) is None
+
+    # 失败的阶段不会被恢复
+    manifest.fail('video', inputs, "boom", {})
+    assert manifest.completed('video', inputs) is None
+    assert manifest.stages['video']['error'] == "boom"
+
+def test_corrupt_manifest_starts_over(tmp_path):
+    """测试无法解析的清单视为空，并可被原子覆盖"""
+    path = tmp_path / "result.json"
+    path.write_text('{"word": "cat", "sta', encoding='utf-8')
+    manifest = WordManifest(path)
+    assert manifest.stages == {}
+    atomic_write_json(path, {'word': 'cat'})
+    assert json.loads(path.read_text(encoding='utf-8')) == {'word': 'cat'}
+    assert os.listdir(tmp_path) == ['result.json']
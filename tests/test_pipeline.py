@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+from modules.pipeline import ProviderLimiter, Stage, StagePipeline
+
+def test_results_keep_input_order():
+    """测试结果顺序与输入顺序一致"""
+    async def slow_first(x):
+        await asyncio.sleep(0.02 if x == 0 else 0)
+        return x * 10
+
+    pipeline = StagePipeline([Stage('a', slow_first, workers=3)], max_inflight=2)
+    results = asyncio.run(pipeline.run([0, 1, 2, 3]))
+    assert results == [0, 10, 20, 30]
+
+def test_failed_item_skips_later_stages():
+    """测试失败的任务不会进入后续阶段"""
+    seen = []
+
+    async def fail_on_two(x):
+        if x == 2:
+            raise RuntimeError("boom")
+        return x
+
+    async def record(x):
+        seen.append(x)
+        return x
+
+    pipeline = StagePipeline([Stage('a', fail_on_two), Stage('b', record)])
+    results = asyncio.run(pipeline.run([1, 2, 3]))
+    assert results == [1, None, 3]
+    assert seen == [1, 3]
+
+def test_stages_overlap_with_bounded_inflight():
+    """测试不同任务可同时处于不同阶段，且驻留任务数有上限"""
+    active = {'count': 0, 'max': 0}
+    overlap = []
+
+    async def enter(x):
+        active['count'] += 1
+        active['max'] = max(active['max'], active['count'])
+        return x
+
+    async def first(x):
+        await asyncio.sleep(0.01)
+        return x
+
+    async def second(x):
+        overlap.append(x)
+        await asyncio.sleep(0.01)
+        return x
+
+    async def leave(x):
+        active['count'] -= 1
+        return x
+
+    pipeline = StagePipeline([
+        Stage('enter', enter),
+        Stage('first', first),
+        Stage('second', second),
+        Stage('leave', leave),
+    ], max_inflight=1)
+    asyncio.run(pipeline.run(list(range(20))))
+    # 每个阶段最多1个处理中 + 1个排队，驻留总量不随输入规模增长
+    assert active['max'] <= 8
+    assert overlap == list(range(20))
+
+def test_on_result_called_for_every_item():
+    """测试每个任务完成后都会回调"""
+    done = []
+
+    async def identity(x):
+        return x
+
+    async def on_result(index, payload):
+        done.append((index, payload))
+
+    pipeline = StagePipeline([Stage('a', identity, workers=2)])
+    asyncio.run(pipeline.run(['x', 'y'], on_result=on_result))
+    assert sorted(done) == [(0, 'x'), (1, 'y')]
+
+def test_provider_limiter_caps_concurrency():
+    """测试每个提供方的并发数受限，不同提供方互不影响"""
+    lock = threading.Lock()
+    active = {'ali': 0, 'tencent': 0}
+    peak = {'ali': 0, 'tencent': 0}
+
+    def call(provider):
+        with lock:
+            active[provider] += 1
+            peak[provider] = max(peak[provider], active[provider])
+        time.sleep(0.02)
+        with lock:
+            active[provider] -= 1
+        return provider
+
+    async def main():
+        limiter = ProviderLimiter({'ali': 1, 'tencent': 3})
+        calls = [limiter.run(p, call, p) for p in ['ali'] * 4 + ['tencent'] * 6]
+        results = await asyncio.gather(*calls)
+        limiter.shutdown()
+        return results
+
+    results = asyncio.run(main())
+    assert results.count('ali') == 4
+    assert peak['ali'] == 1
+    assert 1 < peak['tencent'] <= 3
+
+def test_batch_stage_groups_items():
+    """测试批处理阶段一次接收多个任务，失败任务不进入批次"""
+    batches = []
+
+    async def fail_on_one(x):
+        if x == 1:
+            raise RuntimeError("boom")
+        return x
+
+    async def batch_handler(items):
+        batches.append(list(items))
+        return [x * 2 for x in items]
+
+    pipeline = StagePipeline([
+        Stage('a', fail_on_one),
+        Stage('batch', batch_handler, batch_size=3, batch_wait=0.05),
+    ], max_inflight=1)
+    results = asyncio.run(pipeline.run([0, 1, 2, 3, 4]))
+    assert results == [0, None, 4, 6, 8]
+    assert all(len(batch) <= 3 for batch in batches)
+    assert any(len(batch) > 1 for batch in batches)
+    assert sorted(x for batch in batches for x in batch) == [0, 2, 3, 4]
@@ -1,3 +1,4 @@
+import json
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 from modules.prompt import PromptGenerator
@@ -91,4 +92,47 @@ async def test_template_not_found():
         with pytest.raises(ValueError) as exc_info:
             await generator.generate("test", "invalid_template")
         
-        assert "No image template found" in str(exc_info.value) 
\ No newline at end of file
+        assert "No image template found" in str(exc_info.value) 
+
+
+def _record(word):
+    return {
+        'word': word, 'word_zh': f'{word}-zh', 'word_prompt': f'{word} prompt',
+        'phrase': f'{word} phrase', 'phrase_zh': f'{word} 短语', 'phrase_prompt': f'{word} phrase prompt'
+    }
+
+
+@pytest.mark.asyncio
+@patch('modules.prompt.AsyncAzureOpenAI')
+async def test_generate_batch_retries_missing_words(MockAzureClient, mock_azure_config, tmp_path):
+    # 准备提示词模板文件
+    prompts_file = tmp_path / "prompts.json"
+    prompts_file.write_text(json.dumps({'system_prompt': 'sys', 'assistant_prompt': _record('duck')}), encoding='utf-8')
+    azure_config = dict(mock_azure_config, prompts_file=str(prompts_file), batch_size=3)
+
+    # 批量结果缺少 pear，且 plum 的记录不完整
+    batch_response = MagicMock()
+    batch_response.choices = [MagicMock(message=MagicMock(content=json.dumps(
+        {'items': [_record('Apple'), {'word': 'plum'}]})))]
+    single_responses = []
+    for word in ('pear', 'plum'):
+        response = MagicMock()
+        response.choices = [MagicMock(message=MagicMock(content=json.dumps(_record(word))))]
+        single_responses.append(response)
+
+    mock_client = AsyncMock()
+    mock_client.chat.completions.create = AsyncMock(side_effect=[batch_response] + single_responses)
+    MockAzureClient.return_value = mock_client
+
+    mock_config_manager = MagicMock(spec=ConfigManager)
+    mock_config_manager.get_azure_config.return_value = azure_config
+
+    with patch('modules.prompt.ConfigManager', return_value=mock_config_manager):
+        generator = PromptGenerator()
+        results = await generator.generate_batch(['apple', 'pear', 'plum'])
+
+    assert set(results) == {'apple', 'pear', 'plum'}
+    assert json.loads(results['apple'])['word_zh'] == 'Apple-zh'
+    assert json.loads(results['plum'])['word'] == 'plum'
+    # 一次批量请求 + 两次单独重试
+    assert mock_client.chat.completions.create.await_count == 3
@@ -0,0 +1,41 @@
+from modules.srt import SubtitleTrackBuilder, format_timestamp
+
+def test_format_timestamp():
+    """测试SRT和WebVTT的时间格式，毫秒四舍五入"""
+    assert format_timestamp(2.6) == "00:00:02,600"
+    assert format_timestamp(3723.0456, '.') == "01:02:03.046"
+
+def test_combined_track_offsets(tmp_path):
+    """测试各片段按合并顺序累计偏移，英文和中文各输出SRT和WebVTT"""
+    builder = SubtitleTrackBuilder()
+    builder.add_clip(2.6, [[0.3, 1.3], [1.5, 2.0]], text="apple", text_zh="苹果")
+    builder.add_clip(3.0, [[0.3, 2.5]], text="an apple a day")
+    builder.add_clip(1.0, [], text="silent")
+    builder.add_clip(2.0, [[0.3, 1.1]], text="", text_zh="香蕉")
+    paths = builder.write(tmp_path / "combined.mp4")
+
+    assert sorted(paths) == ['en_srt', 'en_vtt', 'zh_srt', 'zh_vtt']
+    with open(paths['en_srt'], encoding='utf-8') as f:
+        assert f.read() == (
+            "1\n00:00:00,300 --> 00:00:02,000\napple\n\n"
+            "2\n00:00:02,900 --> 00:00:05,100\nan apple a day\n"
+        )
+    with open(paths['zh_vtt'], encoding='utf-8') as f:
+        assert f.read() == (
+            "WEBVTT\n\n"
+            "00:00:00.300 --> 00:00:02.000\n苹果\n\n"
+            "00:00:06.900 --> 00:00:07.700\n香蕉\n"
+        )
+    assert paths['zh_srt'].endswith("combined_zh.srt")
+
+def test_generate_returns_paths(tmp_path, write_wav):
+    """测试单词字幕返回英文和中文SRT路径，没有文本的语言为None"""
+    from unittest.mock import MagicMock, patch
+    from modules.srt import SrtGenerator
+    write_wav(tmp_path / "en.wav", 1.0)
+    with patch('modules.srt.ConfigManager', return_value=MagicMock()):
+        paths = SrtGenerator().generate(str(tmp_path / "en.wav"), text="apple", lead_silence=0.3,
+                                        output_path=tmp_path / "apple.srt")
+    assert paths == {'en': str(tmp_path / "apple_en.srt"), 'zh': None}
+    with open(paths['en'], encoding='utf-8') as f:
+        assert "00:00:00,300 --> 00:00:01,300" in f.read()
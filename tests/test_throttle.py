@@ -0,0 +1,75 @@
+import asyncio
+import time
+from unittest.mock import patch
+import pytest
+from modules.throttle import RetryPolicy, TokenBucket, backoff_delay
+
+def test_token_bucket_limits_rate():
+    """测试令牌桶用完容量后按rate补充"""
+    bucket = TokenBucket(rate=50, burst=5)
+    start = time.monotonic()
+    for _ in range(15):
+        bucket.acquire()
+    # 前5个立即取得，其余10个按每秒50个补充
+    assert time.monotonic() - start >= 0.18
+
+    async def main():
+        bucket = TokenBucket(rate=100, burst=1)
+        start = time.monotonic()
+        await asyncio.gather(*[bucket.acquire_async() for _ in range(6)])
+        return time.monotonic() - start
+
+    assert asyncio.run(main()) >= 0.045
+
+def test_backoff_delay_is_jittered_and_capped():
+    """测试退避时间随重试次数增长，且不超过上限"""
+    delays = [backoff_delay(10, base=0.5, cap=2.0) for _ in range(200)]
+    assert max(delays) <= 2.0
+    assert len(set(delays)) > 1
+    assert all(backoff_delay(0, base=0.1) < 0.1 for _ in range(50))
+
+class Throttled(Exception):
+    pass
+
+def fail(error, calls=None):
+    if calls is not None:
+        calls.append(1)
+    raise error
+
+def test_retry_policy_retries_only_retryable_errors():
+    """测试可重试的错误按退避重试，其他错误直接抛出"""
+    policy = RetryPolicy(lambda e: isinstance(e, Throttled), max_attempts=3, base_delay=0.001)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise Throttled("limit")
+        return "ok"
+
+    assert policy.call(flaky) == "ok"
+    assert policy.retries == 2
+
+    calls.clear()
+    with pytest.raises(Throttled):
+        policy.call(fail, Throttled("limit"), calls)
+    assert len(calls) == 3
+
+    with pytest.raises(ValueError):
+        policy.call(fail, ValueError("bad"))
+
+def test_retry_policy_async():
+    """测试异步重试不阻塞事件循环"""
+    policy = RetryPolicy(lambda e: isinstance(e, Throttled), max_attempts=4, base_delay=0.001,
+                         limiter=TokenBucket(rate=1000))
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise Throttled("limit")
+        return len(attempts)
+
+    with patch('modules.throttle.backoff_delay', return_value=0.01) as mock_delay:
+        assert asyncio.run(policy.call_async(flaky)) == 2
+        mock_delay.assert_called_once_with(0, 0.001, 10.0)
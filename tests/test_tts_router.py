@@ -0,0 +1,151 @@
+import asyncio
+import os
+import threading
+import pytest
+from modules.cache import CachedAudioGenerator, FileCache
+from modules.tts_router import TtsRouter
+
+class FakeProvider:
+    """按设定的耗时写出音频，或抛出异常"""
+
+    def __init__(self, name, delay=0.0, error=None, cached=False):
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.cached = cached
+        self.calls = 0
+
+    async def generate_async(self, text, type="word", language="en", output_path=None):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(f"{self.name}:{text}")
+        return str(output_path)
+
+class CachedProvider(FakeProvider):
+    """带缓存的服务，记录缓存查找所在的线程"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lookup_threads = []
+
+    def contains(self, text, language):
+        self.lookup_threads.append(threading.current_thread())
+        return self.cached
+
+    def fetch(self, text, language, output_path):
+        self.lookup_threads.append(threading.current_thread())
+        if self.cached:
+            with open(output_path, 'w', encoding='utf-8') as f:
+                f.write(f"cache-{self.name}:{text}")
+        return self.cached
+
+    async def generate_async(self, text, type="word", language="en", output_path=None, check_cache=True):
+        assert check_cache is False
+        return await super().generate_async(text, type, language, output_path)
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+def test_rank_uses_preferences_then_latency_and_errors():
+    """测试样本不足时按偏好排序，之后按p95耗时和错误率排序"""
+    router = TtsRouter({'a': FakeProvider('a'), 'b': FakeProvider('b'), 'c': FakeProvider('c')},
+                       {'en': ['a', 'b', 'c'], 'zh': ['c', 'a', 'missing']}, min_samples=3)
+    assert router.rank('en') == ['a', 'b', 'c']
+    assert router.rank('zh') == ['c', 'a']
+
+    for _ in range(5):
+        router.stats['a'].record(3.0)
+        router.stats['b'].record(0.2)
+    assert router.rank('en') == ['b', 'c', 'a']
+
+    # 错误率过高的服务排到最后
+    for _ in range(10):
+        router.stats['b'].record(ok=False)
+    assert router.rank('en') == ['c', 'a', 'b']
+
+def test_hedged_request_wins(tmp_path):
+    """测试首选服务过慢时发出对冲请求，取先返回的结果并清理落后的输出"""
+    slow, fast = FakeProvider('slow', delay=0.3), FakeProvider('fast', delay=0.01)
+    router = TtsRouter({'slow': slow, 'fast': fast}, {'en': ['slow', 'fast']}, hedge_delay=0.05)
+    output = tmp_path / "word_audio.wav"
+
+    async def main():
+        path = await router.generate("apple", output_path=output)
+        # 等落后的请求结束
+        await asyncio.sleep(0.4)
+        return path
+
+    path = asyncio.run(main())
+    assert read(path) == "fast:apple"
+    assert router.hedges == 1 and router.secondary_wins == 1
+    assert sorted(os.listdir(tmp_path)) == ["word_audio.wav"]
+    assert router.stats['slow'].completed == 1
+
+def test_failover_without_waiting(tmp_path):
+    """测试首选服务失败时立即改用下一个服务，全部失败时抛出异常"""
+    broken = FakeProvider('broken', error=RuntimeError("throttled"))
+    backup = FakeProvider('backup')
+    router = TtsRouter({'broken': broken, 'backup': backup}, {'zh': ['broken', 'backup']}, hedge_delay=10)
+
+    path = asyncio.run(router.generate("苹果", language='zh', output_path=tmp_path / "zh.wav"))
+    assert read(path) == "backup:苹果"
+    assert router.hedges == 0
+    assert router.stats['broken'].error_rate == 1.0
+
+    # 错误率过高的服务排到后面，全部失败时报告每个服务的错误
+    backup.error = RuntimeError("down")
+    with pytest.raises(Exception, match="backup: down; broken: throttled"):
+        asyncio.run(router.generate("香蕉", language='zh', output_path=tmp_path / "zh2.wav"))
+
+def test_cache_hit_from_any_provider(tmp_path):
+    """测试任一服务命中缓存时不发送请求"""
+    first, second = CachedProvider('first'), CachedProvider('second', cached=True)
+    router = TtsRouter({'first': first, 'second': second}, {'en': ['first', 'second']})
+    path = asyncio.run(router.generate("apple", output_path=tmp_path / "a.wav"))
+    assert read(path) == "cache-second:apple"
+    assert first.calls == second.calls == 0
+
+    second.cached = False
+    path = asyncio.run(router.generate("pear", output_path=tmp_path / "b.wav"))
+    assert read(path) == "first:pear"
+    # 缓存查找不在事件循环线程中执行
+    assert first.lookup_threads and second.lookup_threads
+    assert threading.main_thread() not in first.lookup_threads + second.lookup_threads
+
+class VoiceGenerator:
+    """模拟被缓存包装的语音生成器"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def get_voice_params(self, language="en"):
+        return {'voice': f'{self.name}-{language}'}
+
+    async def generate_async(self, text, type="word", language="en", output_path=None):
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(f"{self.name}:{text}")
+        return str(output_path)
+
+def test_cache_lookup_counts_only_chosen_provider(tmp_path):
+    """测试路由只对选中的服务查找缓存，其余服务不记未命中"""
+    caches = {name: FileCache(tmp_path / "cache" / name, max_bytes=1024) for name in ('first', 'second')}
+    providers = {name: CachedAudioGenerator(VoiceGenerator(name), name, cache) for name, cache in caches.items()}
+    router = TtsRouter(providers, {'en': ['first', 'second']})
+
+    asyncio.run(router.generate("apple", output_path=tmp_path / "a.wav"))
+    assert caches['first'].stats()['misses'] == 1
+    assert caches['second'].stats()['misses'] == 0
+
+    # 只有第二个服务缓存了该文本时直接命中，第一个服务不记未命中
+    src = tmp_path / "pear.wav"
+    src.write_text("cache-second:pear", encoding='utf-8')
+    caches['second'].put(providers['second'].cache_key("pear", 'en'), src)
+    path = asyncio.run(router.generate("pear", output_path=tmp_path / "b.wav"))
+    assert read(path) == "cache-second:pear"
+    assert caches['first'].stats()['misses'] == 1
+    assert caches['second'].stats()['hits'] == 1
+    assert caches['second'].stats()['misses'] == 0
@@ -0,0 +1,157 @@
+import re
+import shutil
+import subprocess
+import pytest
+from unittest.mock import patch
+
+def test_audio_filter_graph(video_gen):
+    """测试前导静音、段间间隔和结尾静置在同一个滤镜图中完成"""
+    graph = video_gen.build_audio_filter(2, lead_silence_duration=0.3, audio_gap=0.5, end_pause=1)
+    assert graph == (
+        "[1:a]aformat=sample_rates=44100:channel_layouts=stereo,apad=pad_dur=0.5[a0];"
+        "[2:a]aformat=sample_rates=44100:channel_layouts=stereo[a1];"
+        "[a0][a1]concat=n=2:v=0:a=1,adelay=delays=300:all=1,apad=pad_dur=1[aout]"
+    )
+    # 时长为0的部分不加滤镜，避免apad无限补齐
+    assert "apad" not in video_gen.build_audio_filter(1, 0, 0, 0)
+
+def test_single_ffmpeg_invocation(video_gen, tmp_path, write_wav):
+    """测试只调用一次FFmpeg，音频附带输出可选"""
+    write_wav(tmp_path / "a.wav", 0.5)
+    with patch('modules.video.subprocess.run') as mock_run:
+        video_gen.generate("img.png", str(tmp_path / "a.wav"), output_video_path=tmp_path / "out.mp4", still=False)
+        assert mock_run.call_count == 1
+        command = mock_run.call_args[0][0]
+        assert command.count('-i') == 2
+        assert '[aside]' not in command
+
+        video_gen.generate("img.png", str(tmp_path / "a.wav"), output_video_path=tmp_path / "out.mp4",
+                           output_audio_path=tmp_path / "out.aac", still=False)
+        command = mock_run.call_args[0][0]
+        assert command[-1] == str(tmp_path / "out.aac")
+
+def test_still_mode_prescales_and_aligns(video_gen, tmp_path, write_wav):
+    """测试静态图模式预先缩放图像，并把时长补齐到整帧"""
+    from PIL import Image
+    Image.new('RGB', (1001, 700), 'white').save(tmp_path / "img.png")
+    write_wav(tmp_path / "a.wav", 0.55)
+    scaled_sizes = []
+
+    def run(command, **kwargs):
+        image_path = command[command.index('-i') + 1]
+        with Image.open(image_path) as image:
+            scaled_sizes.append(image.size)
+
+    with patch('modules.video.subprocess.run', side_effect=run) as mock_run:
+        video_gen.generate(str(tmp_path / "img.png"), str(tmp_path / "a.wav"), lead_silence_duration=0,
+                           audio_gap=0, end_pause=0, output_video_path=tmp_path / "out.mp4", still=True)
+        command = mock_run.call_args[0][0]
+    assert scaled_sizes == [(1544, 1080)]
+    assert command[command.index('-framerate') + 1] == '5'
+    assert command[command.index('-t') + 1] == '0.600'
+    assert 'scale' not in command[command.index('-filter_complex') + 1]
+    # 临时文件已清理
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['a.wav', 'img.png']
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="需要ffmpeg")
+def test_generate_duration(video_gen, tmp_path, write_wav):
+    """测试生成视频的时长等于各段音频、静音和间隔之和"""
+    from PIL import Image
+    Image.new('RGB', (64, 64), 'white').save(tmp_path / "img.png")
+    audio_en = write_wav(tmp_path / "en.wav", 1.0)
+    audio_zh = write_wav(tmp_path / "zh.wav", 0.5, sample_rate=24000)
+
+    output = video_gen.generate(str(tmp_path / "img.png"), audio_en, audio_zh, quality='low',
+                                lead_silence_duration=0.3, audio_gap=0.2, end_pause=0.5,
+                                output_video_path=tmp_path / "out.mp4", still=False)
+    probe = subprocess.run(['ffmpeg', '-i', output], capture_output=True, text=True).stderr
+    duration = probe.split("Duration: ")[1].split(",")[0]
+    hours, minutes, seconds = duration.split(":")
+    assert abs(float(seconds) - 2.5) < 0.1
+
+    # 静态图模式下音频和视频时长一致
+    still = video_gen.generate(str(tmp_path / "img.png"), audio_en, audio_zh, quality='low',
+                               lead_silence_duration=0.3, audio_gap=0.2, end_pause=0.55,
+                               output_video_path=tmp_path / "still.mp4", still=True)
+    probe = subprocess.run(['ffmpeg', '-i', still], capture_output=True, text=True).stderr
+    assert "Duration: 00:00:02.60" in probe
+
+def test_timeline_matches_encode(video_gen, tmp_path, write_wav):
+    """测试时间轴与编码时的音频位置和对齐后的总时长一致"""
+    audio_en = write_wav(tmp_path / "en.wav", 1.0)
+    audio_zh = write_wav(tmp_path / "zh.wav", 0.5)
+    timeline = video_gen.timeline(audio_en, audio_zh, lead_silence_duration=0.3, audio_gap=0.2,
+                                  end_pause=0.55, still=True)
+    assert timeline['segments'] == [[0.3, 1.3], [1.5, 2.0]]
+    assert abs(timeline['duration'] - 2.6) < 1e-9
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="需要FFmpeg")
+def test_subtitles_muxed_in_encode(video_gen, tmp_path, write_wav):
+    """测试字幕在同一次编码中封装为带语言标记的mov_text流"""
+    from PIL import Image
+    Image.new('RGB', (64, 64), 'white').save(tmp_path / "img.png")
+    audio_en = write_wav(tmp_path / "en.wav", 1.0)
+    srt_en = tmp_path / "apple_en.srt"
+    srt_en.write_text("1\n00:00:00,300 --> 00:00:01,300\napple\n", encoding='utf-8')
+    srt_zh = tmp_path / "apple_zh.srt"
+    srt_zh.write_text("1\n00:00:00,300 --> 00:00:01,300\n苹果\n", encoding='utf-8')
+
+    with patch('modules.video.subprocess.run', wraps=subprocess.run) as mock_run:
+        output = video_gen.generate(str(tmp_path / "img.png"), audio_en, quality='low',
+                                    lead_silence_duration=0.3, audio_gap=0.2, end_pause=0.2,
+                                    output_video_path=tmp_path / "out.mp4", still=True,
+                                    subtitles=[(str(srt_en), 'eng'), (str(srt_zh), 'chi')])
+    assert mock_run.call_count == 1
+    probe = subprocess.run(['ffmpeg', '-i', output], capture_output=True, text=True).stderr
+    assert re.search(r"Stream #0:2\S*\(eng\): Subtitle: mov_text", probe)
+    assert re.search(r"Stream #0:3\S*\(chi\): Subtitle: mov_text", probe)
+
+def test_segments_single_command(video_gen, tmp_path, write_wav):
+    """测试多个片段在一条命令中编码，音轨经标准输入传入，各段按整帧截齐"""
+    from PIL import Image
+    Image.new('RGB', (64, 64), 'white').save(tmp_path / "a.png")
+    Image.new('RGB', (96, 64), 'black').save(tmp_path / "b.png")
+    segments = [
+        {'image_path': str(tmp_path / "a.png"), 'audio': [write_wav(tmp_path / "en.wav", 1.0)],
+         'lead_silence_duration': 0.3, 'audio_gap': 0.2, 'end_pause': 0.45},
+        {'image_path': str(tmp_path / "b.png"), 'audio': [write_wav(tmp_path / "zh.wav", 0.5)],
+         'lead_silence_duration': 0.3, 'audio_gap': 0.2, 'end_pause': 0},
+    ]
+    timeline = video_gen.segment_timeline(segments, still=True)
+    assert [segment['start'] for segment in timeline] == [0.0, 1.8]
+    assert [segment['duration'] for segment in timeline] == [1.8, 0.8]
+
+    with patch('modules.video.subprocess.run') as mock_run:
+        video_gen.generate_segments(segments, output_video_path=tmp_path / "out.mp4", still=True)
+    assert mock_run.call_count == 1
+    command = mock_run.call_args[0][0]
+    assert command.count('-i') == 3 and 'pipe:0' in command
+    assert command[command.index('-force_key_frames') + 1] == "1.800000"
+    # 统一为44.1kHz立体声16位
+    assert len(mock_run.call_args[1]['input']) == round(2.6 * 44100) * 2 * 2
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="需要FFmpeg")
+def test_segments_duration(video_gen, tmp_path, write_wav):
+    """测试分段编码的总时长等于各段整帧时长之和，滤镜图拼接时也一致"""
+    from PIL import Image
+    Image.new('RGB', (64, 64), 'white').save(tmp_path / "a.png")
+    Image.new('RGB', (64, 64), 'black').save(tmp_path / "b.png")
+    segments = [
+        {'image_path': str(tmp_path / "a.png"), 'audio': [write_wav(tmp_path / "en.wav", 1.0),
+                                                          write_wav(tmp_path / "zh.wav", 0.5, sample_rate=24000)],
+         'lead_silence_duration': 0.3, 'audio_gap': 0.2, 'end_pause': 0.5},
+        {'image_path': str(tmp_path / "b.png"), 'audio': [write_wav(tmp_path / "p.wav", 1.23)],
+         'lead_silence_duration': 0.3, 'audio_gap': 0.2, 'end_pause': 0.5},
+    ]
+    output = video_gen.generate_segments(segments, quality='low', output_video_path=tmp_path / "out.mp4", still=True)
+    probe = subprocess.run(['ffmpeg', '-i', output], capture_output=True, text=True).stderr
+    assert "Duration: 00:00:04.80" in probe
+    assert "44100 Hz, stereo" in probe
+
+    with patch.object(video_gen.assembler, 'available', return_value=False):
+        output = video_gen.generate_segments(segments, quality='low', output_video_path=tmp_path / "fallback.mp4",
+                                             still=True)
+    probe = subprocess.run(['ffmpeg', '-i', output], capture_output=True, text=True).stderr
+    assert "Duration: 00:00:04.80" in probe
+    # 两种拼接方式输出相同的音频格式，片段可以直接拼接
+    assert "44100 Hz, stereo" in probe